@@ -33,6 +33,20 @@
  *
  * Kirsch and Mitzenmacher found that only two hash functions were needed:
  * https://www.eecs.harvard.edu/~michaelm/postscripts/rsa2008.pdf
+ *
+ * The bloom_* functions take 64-bit hash values from any hash engine, see
+ * illume.filter.hashing, and set or test their k bits directly on the buffer
+ * of a bit array. Indexes are derived from the hash value by the probing
+ * scheme of the filter, see Probe, which is passed as an integer where
+ * True and False select the legacy and default schemes of earlier releases.
+ * The *_many variants probe a whole batch of values, without holding the
+ * GIL once the batch reaches GIL_RELEASE_THRESHOLD.
+ *
+ * The cuckoo_* and xor_* functions implement the fingerprint tables of
+ * cuckoo filters (Fan et al., "Cuckoo Filter: Practically Better Than
+ * Bloom", CoNEXT 2014) and xor filters (Graf and Lemire, "Xor Filters:
+ * Faster and Smaller Than Bloom and Cuckoo Filters", JEA 2020). Both store
+ * f-bit fingerprints packed in a byte buffer, see FingerprintTable.
 **/
 
 
@@ -42,6 +56,48 @@
 
 
 #define ONES_64 0xFFFFFFFFLL
+#define GIL_RELEASE_THRESHOLD 64
+/* Probing schemes, see Probe. */
+#define PROBE_DOUBLE 0
+#define PROBE_LEGACY 1
+#define PROBE_BLOCKED 2
+#define BLOCK_BITS 512
+/* 9-bit indexes within a block taken from a 64-bit hash. */
+#define BLOCK_SLICE_BITS 9
+#define BLOCK_SLICES 7
+/* Blocked lookups prefetched ahead of being tested. */
+#define PREFETCH_GROUP 8
+#define CUCKOO_BUCKET_SIZE 4
+#define CUCKOO_MAX_KICKS 500
+/* Bytes past the last fingerprint, fields are read as 64-bit words. */
+#define TABLE_PADDING 8
+
+
+/**
+ * BitBuffer - Writable view of the bytes of a bit array.
+ */
+typedef struct {
+    Py_buffer view;
+    int has_view;
+    unsigned char *bits;
+    Py_ssize_t size;
+    int big_endian;
+    int atomic;
+} BitBuffer;
+
+
+typedef unsigned long long Hash64;
+
+
+/**
+ * FingerprintTable - Writable view of a table of f-bit fingerprints.
+ */
+typedef struct {
+    Py_buffer view;
+    unsigned char *bytes;
+    Hash64 slots;
+    int f;
+} FingerprintTable;
 
 
 static PyObject * fnv1a64_composite_from_str(PyObject* self, PyObject* args);
@@ -50,6 +106,23 @@ static PyObject * digest_composite_fnv1a64(char *content, int k, int m);
 Fnv32_t get_composite(Fnv64_t hashval, int i, int m);
 Fnv32_t get_upper(Fnv64_t hashval);
 Fnv32_t get_lower(Fnv64_t hashval);
+static PyObject * fnv1_64(PyObject* self, PyObject* item);
+static PyObject * fnv1a64(PyObject* self, PyObject* item);
+static PyObject * hash_indexes(PyObject* self, PyObject* args);
+static PyObject * bloom_add(PyObject* self, PyObject* args);
+static PyObject * bloom_contains(PyObject* self, PyObject* args);
+static PyObject * bloom_add_many(PyObject* self, PyObject* args);
+static PyObject * bloom_contains_many(PyObject* self, PyObject* args);
+static PyObject * atomic_add(PyObject* self, PyObject* args);
+static PyObject * cuckoo_add(PyObject* self, PyObject* args);
+static PyObject * cuckoo_contains(PyObject* self, PyObject* args);
+static PyObject * cuckoo_remove(PyObject* self, PyObject* args);
+static PyObject * cuckoo_add_many(PyObject* self, PyObject* args);
+static PyObject * cuckoo_contains_many(PyObject* self, PyObject* args);
+static PyObject * sort_unique(PyObject* self, PyObject* args);
+static PyObject * xor_build(PyObject* self, PyObject* args);
+static PyObject * xor_contains(PyObject* self, PyObject* args);
+static PyObject * xor_contains_many(PyObject* self, PyObject* args);
 
 
 /**
@@ -136,13 +209,1638 @@ static PyObject * fnv1a64_composite_from_str(PyObject* self, PyObject* args) {
 }
 
 
-static PyMethodDef Methods[] = {
-    {
-        "fnv1a64_composite", 
-        fnv1a64_composite_from_str, 
-        METH_VARARGS,
-        "Get a composite fnv1a64 hash"
+/**
+ * get_data - Get the bytes of a str, as UTF-8, or of a buffer object.
+ * @ item - Object to hash.
+ * @ view - Output, released with release_data.
+ * @ data - Output.
+ * @ size - Output.
+ */
+static int get_data(PyObject *item, Py_buffer *view, const char **data,
+                    Py_ssize_t *size) {
+    view->obj = NULL;
+
+    if (PyUnicode_Check(item)) {
+        *data = PyUnicode_AsUTF8AndSize(item, size);
+
+        return *data == NULL ? -1 : 0;
+    }
+
+    if (PyObject_GetBuffer(item, view, PyBUF_SIMPLE) < 0) {
+        return -1;
+    }
+
+    *data = view->buf;
+    *size = view->len;
+
+    return 0;
+}
+
+
+/**
+ * release_data - Release the buffer of get_data, if any.
+ */
+static void release_data(Py_buffer *view) {
+    if (view->obj != NULL) {
+        PyBuffer_Release(view);
+    }
+}
+
+
+/**
+ * fnv1_64 - FNV-1 64-bit hash of a str or buffer.
+ *
+ * Equal to the hash the composite functions compute for NUL-free strings.
+ */
+static PyObject * fnv1_64(PyObject* self, PyObject* item) {
+    Py_buffer view;
+    const char *data;
+    Py_ssize_t size;
+    Fnv64_t hashval;
+
+    if (get_data(item, &view, &data, &size) < 0) {
+        return NULL;
+    }
+
+    hashval = fnv_64_buf((void *) data, size, FNV1_64_INIT);
+    release_data(&view);
+
+    return PyLong_FromUnsignedLongLong(hashval);
+}
+
+
+/**
+ * fnv1a64 - FNV-1a 64-bit hash of a str or buffer.
+ */
+static PyObject * fnv1a64(PyObject* self, PyObject* item) {
+    Py_buffer view;
+    const char *data;
+    Py_ssize_t size;
+    Fnv64_t hashval;
+
+    if (get_data(item, &view, &data, &size) < 0) {
+        return NULL;
+    }
+
+    hashval = fnv_64a_buf((void *) data, size, FNV1A_64_INIT);
+    release_data(&view);
+
+    return PyLong_FromUnsignedLongLong(hashval);
+}
+
+
+/**
+ * mix64 - The splitmix64 finalizer, a bijection with full avalanche.
+ */
+static inline Hash64 mix64(Hash64 x) {
+    x ^= x >> 30;
+    x *= 0xbf58476d1ce4e5b9ULL;
+    x ^= x >> 27;
+    x *= 0x94d049bb133111ebULL;
+
+    return x ^ (x >> 31);
+}
+
+
+/**
+ * Probe - Bit indexes of a 64-bit hash value.
+ *
+ * The default scheme, PROBE_DOUBLE, is enhanced double hashing over the whole
+ * 64-bit range: h1 is the hash value, h2 its mix64, and i^2 is added as an
+ * integer, all in wrapping 64-bit arithmetic, so m is only limited by memory.
+ * PROBE_LEGACY is get_composite, which keeps filters built by
+ * fnv1a64_composite valid but caps m to 32 bits.
+ *
+ * PROBE_BLOCKED confines the k bits to one block of BLOCK_BITS, a 64-byte
+ * cache line, selected by the hash value. Bits within the block are 9-bit
+ * slices of h2, then of mix64(h2 + j) for the j-th following group of
+ * BLOCK_SLICES bits. Independent slices keep the error rate of the model in
+ * get_optimal_bloom_m, double hashing within a block would not. A lookup
+ * touches a single cache line when the bit array is aligned instead of k of
+ * them.
+ */
+typedef struct {
+    Hash64 h1;
+    Hash64 h2;
+    Hash64 base;
+    Hash64 m;
+    int scheme;
+} Probe;
+
+
+static inline void init_probe(Probe *probe, Hash64 hashval, Hash64 m,
+                              int scheme) {
+    probe->h1 = hashval;
+    probe->base = 0;
+    probe->m = m;
+    probe->scheme = scheme;
+
+    if (scheme == PROBE_LEGACY) {
+        probe->h2 = 0;
+    } else if (scheme == PROBE_BLOCKED) {
+        probe->h2 = mix64(hashval);
+        probe->base = (hashval % (m / BLOCK_BITS)) * BLOCK_BITS;
+    } else {
+        probe->h2 = mix64(hashval) | 1;
+    }
+}
+
+
+static inline Hash64 get_index(Probe *probe, Hash64 i) {
+    if (probe->scheme == PROBE_LEGACY) {
+        return get_composite(probe->h1, (int) i, (int) probe->m);
+    }
+
+    if (probe->scheme == PROBE_BLOCKED) {
+        Hash64 group = i / BLOCK_SLICES;
+        Hash64 bits = group ? mix64(probe->h2 + group) : probe->h2;
+
+        return probe->base +
+            ((bits >> (BLOCK_SLICE_BITS * (i % BLOCK_SLICES))) &
+             (BLOCK_BITS - 1));
+    }
+
+    return (probe->h1 + i * probe->h2 + i * i) % probe->m;
+}
+
+
+/**
+ * get_bit_buffer - Get the bytes of a bit array of at least m bits.
+ * @ bit_array - Object exporting a writable buffer, or a bitarray.
+ * @ m - Number of bits that will be addressed.
+ * @ big_endian - Bit order of the bit array.
+ * @ buffer - Output.
+ */
+static int get_bit_buffer(PyObject *bit_array, Hash64 m, int big_endian,
+                          BitBuffer *buffer) {
+    PyObject *info;
+
+    buffer->has_view = 0;
+    buffer->big_endian = big_endian;
+    buffer->atomic = 0;
+
+    if (PyObject_GetBuffer(bit_array, &buffer->view, PyBUF_WRITABLE) == 0) {
+        buffer->has_view = 1;
+        buffer->bits = buffer->view.buf;
+        buffer->size = buffer->view.len;
+    } else {
+        /* Older bitarray releases only expose their address through
+         * buffer_info(). Bloom filter bit arrays are never resized, so the
+         * address stays valid while a reference to the array is held. */
+        PyErr_Clear();
+        info = PyObject_CallMethod(bit_array, "buffer_info", NULL);
+
+        if (info == NULL) {
+            return -1;
+        }
+
+        buffer->bits = PyLong_AsVoidPtr(PyTuple_GetItem(info, 0));
+        buffer->size = PyLong_AsSsize_t(PyTuple_GetItem(info, 1));
+        Py_DECREF(info);
+
+        if (PyErr_Occurred()) {
+            return -1;
+        }
+    }
+
+    if (m == 0 || (Hash64) buffer->size < (m + 7) / 8) {
+        if (buffer->has_view) {
+            PyBuffer_Release(&buffer->view);
+        }
+
+        PyErr_SetString(PyExc_ValueError, "Bit array is smaller than m");
+        return -1;
+    }
+
+    return 0;
+}
+
+
+/**
+ * release_bit_buffer - Release a buffer from get_bit_buffer.
+ */
+static void release_bit_buffer(BitBuffer *buffer) {
+    if (buffer->has_view) {
+        PyBuffer_Release(&buffer->view);
+    }
+}
+
+
+/**
+ * bit_mask - Mask of bit i within its byte.
+ */
+static inline unsigned char bit_mask(BitBuffer *buffer, Hash64 i) {
+    return buffer->big_endian ? 0x80 >> (i & 7) : 1 << (i & 7);
+}
+
+
+/**
+ * add_hash - Set the k bits of a hash value, return 1 if any was unset.
+ */
+static int add_hash(BitBuffer *buffer, Hash64 hashval, int k, Hash64 m,
+                    int scheme) {
+    unsigned char *byte;
+    unsigned char mask;
+    Hash64 index;
+    Probe probe;
+    int added = 0;
+    int i;
+
+    init_probe(&probe, hashval, m, scheme);
+
+    for (i = 0; i < k; i++) {
+        index = get_index(&probe, i);
+        byte = buffer->bits + (index >> 3);
+        mask = bit_mask(buffer, index);
+
+        if (buffer->atomic) {
+            added |= !(__atomic_fetch_or(byte, mask, __ATOMIC_RELAXED) & mask);
+        } else {
+            added |= !(*byte & mask);
+            *byte |= mask;
+        }
+    }
+
+    return added;
+}
+
+
+/**
+ * contains_hash - Return 1 if the k bits of a hash value are set.
+ */
+static int contains_hash(BitBuffer *buffer, Hash64 hashval, int k, Hash64 m,
+                         int scheme) {
+    Hash64 index;
+    Probe probe;
+    int i;
+
+    init_probe(&probe, hashval, m, scheme);
+
+    for (i = 0; i < k; i++) {
+        index = get_index(&probe, i);
+
+        if (!(buffer->bits[index >> 3] & bit_mask(buffer, index))) {
+            return 0;
+        }
+    }
+
+    return 1;
+}
+
+
+/**
+ * contains_block - Return 1 if the k bits of a blocked probe are set.
+ *
+ * The bits are gathered into a mask of the block, which is then compared
+ * with the block a 64-bit word at a time without branching, a loop
+ * compilers turn into vector instructions.
+ */
+static inline int contains_block(BitBuffer *buffer, Probe *probe, int k) {
+    unsigned char mask[BLOCK_BITS / 8] = {0};
+    const unsigned char *block = buffer->bits + (probe->base >> 3);
+    Hash64 index, word, bits, missing = 0;
+    int i;
+
+    for (i = 0; i < k; i++) {
+        index = get_index(probe, i) - probe->base;
+        mask[index >> 3] |= bit_mask(buffer, index);
+    }
+
+    for (i = 0; i < BLOCK_BITS / 8; i += 8) {
+        memcpy(&bits, mask + i, 8);
+        memcpy(&word, block + i, 8);
+        missing |= (word & bits) ^ bits;
+    }
+
+    return !missing;
+}
+
+
+/**
+ * contains_blocked - Check a batch of hash values against a blocked bit
+ * array.
+ *
+ * Blocks of PREFETCH_GROUP values are prefetched before any of them is
+ * tested, so their cache misses overlap instead of being paid one by one.
+ */
+static void contains_blocked(BitBuffer *buffer, Hash64 *values,
+                             Py_ssize_t count, int k, Hash64 m,
+                             char *found) {
+    Probe probes[PREFETCH_GROUP];
+    Py_ssize_t start, size, i;
+    const unsigned char *block;
+
+    for (start = 0; start < count; start += PREFETCH_GROUP) {
+        size = count - start < PREFETCH_GROUP ? count - start : PREFETCH_GROUP;
+
+        for (i = 0; i < size; i++) {
+            init_probe(&probes[i], values[start + i], m, PROBE_BLOCKED);
+            block = buffer->bits + (probes[i].base >> 3);
+            __builtin_prefetch(block);
+            __builtin_prefetch(block + BLOCK_BITS / 8 - 1);
+        }
+
+        for (i = 0; i < size; i++) {
+            found[start + i] = contains_block(buffer, &probes[i], k);
+        }
+    }
+}
+
+
+/**
+ * contains_many - Check a batch of hash values against a bit array.
+ */
+static void contains_many(BitBuffer *buffer, Hash64 *values,
+                          Py_ssize_t count, int k, Hash64 m, int scheme,
+                          char *found) {
+    Py_ssize_t i;
+
+    if (scheme == PROBE_BLOCKED) {
+        contains_blocked(buffer, values, count, k, m, found);
+        return;
+    }
+
+    for (i = 0; i < count; i++) {
+        found[i] = contains_hash(buffer, values[i], k, m, scheme);
+    }
+}
+
+
+/**
+ * bit_map - Pack an array of flags into a bitmap.
+ *
+ * Flag i is bit i & 7 of byte i >> 3, least significant bit first.
+ */
+static PyObject * bit_map(const char *flags, Py_ssize_t count) {
+    PyObject *results = PyBytes_FromStringAndSize(NULL, (count + 7) / 8);
+    unsigned char *bits;
+    Py_ssize_t i;
+
+    if (results == NULL) {
+        return NULL;
+    }
+
+    bits = (unsigned char *) PyBytes_AS_STRING(results);
+    memset(bits, 0, (count + 7) / 8);
+
+    for (i = 0; i < count; i++) {
+        bits[i >> 3] |= (unsigned char) ((flags[i] != 0) << (i & 7));
+    }
+
+    return results;
+}
+
+
+/**
+ * get_hash_values - Get every hash value of an iterable of integers.
+ *
+ * Returns NULL with an exception set on failure, the array is freed with
+ * PyMem_Free.
+ */
+static Hash64 * get_hash_values(PyObject *hashvals, Py_ssize_t *count) {
+    PyObject *sequence = PySequence_Fast(hashvals, "hashes must be iterable");
+    Hash64 *values;
+    Py_ssize_t i;
+
+    if (sequence == NULL) {
+        return NULL;
+    }
+
+    *count = PySequence_Fast_GET_SIZE(sequence);
+    values = PyMem_Malloc(sizeof(Hash64) * (*count ? *count : 1));
+
+    if (values == NULL) {
+        Py_DECREF(sequence);
+        PyErr_NoMemory();
+        return NULL;
+    }
+
+    for (i = 0; i < *count; i++) {
+        values[i] = PyLong_AsUnsignedLongLong(
+            PySequence_Fast_GET_ITEM(sequence, i)
+        );
+
+        if (values[i] == (Hash64) -1 && PyErr_Occurred()) {
+            PyMem_Free(values);
+            Py_DECREF(sequence);
+            return NULL;
+        }
+    }
+
+    Py_DECREF(sequence);
+
+    return values;
+}
+
+
+/**
+ * check_params - Validate the number of hashes and the size of the filter.
+ */
+static int check_params(int k, Hash64 m, int scheme) {
+    if (k <= 0) {
+        PyErr_SetString(PyExc_ValueError, "Value of k must be greater than 0");
+        return -1;
+    }
+
+    if (scheme < PROBE_DOUBLE || scheme > PROBE_BLOCKED) {
+        PyErr_SetString(PyExc_ValueError, "Unknown probing scheme");
+        return -1;
+    }
+
+    if (scheme == PROBE_LEGACY && m > INT_MAX) {
+        PyErr_SetString(PyExc_OverflowError, "Legacy hashing caps m to 2^31");
+        return -1;
+    }
+
+    if (scheme == PROBE_BLOCKED && (m == 0 || m % BLOCK_BITS)) {
+        PyErr_SetString(PyExc_ValueError, "Blocked m must be whole blocks");
+        return -1;
+    }
+
+    return 0;
+}
+
+
+/**
+ * hash_indexes - Bit indexes of a hash value.
+ *
+ * Python signature: hash_indexes(hashval, k, m, scheme), returns a list.
+ */
+static PyObject * hash_indexes(PyObject* self, PyObject* args) {
+    PyObject *indexes;
+    Hash64 hashval, m;
+    Probe probe;
+    int k, scheme, i;
+
+    if (!PyArg_ParseTuple(args, "KiKi", &hashval, &k, &m, &scheme)) {
+        return NULL;
+    }
+
+    if (check_params(k, m, scheme) < 0) {
+        return NULL;
+    }
+
+    if (m == 0) {
+        PyErr_SetString(PyExc_ValueError, "Value of m must be greater than 0");
+        return NULL;
+    }
+
+    indexes = PyList_New(k);
+    init_probe(&probe, hashval, m, scheme);
+
+    for (i = 0; indexes != NULL && i < k; i++) {
+        PyList_SET_ITEM(
+            indexes,
+            i,
+            PyLong_FromUnsignedLongLong(get_index(&probe, i))
+        );
+    }
+
+    return indexes;
+}
+
+
+/**
+ * bloom_add - Add a hash value to a bit array.
+ *
+ * Python signature: bloom_add(bit_array, hashval, k, m, big_endian, scheme,
+ * atomic=False), returns True if the value was not in the bit array yet.
+ * Bits are set with atomic operations when atomic is set, for bit arrays
+ * other processes update at the same time.
+ */
+static PyObject * bloom_add(PyObject* self, PyObject* args) {
+    PyObject *bit_array;
+    BitBuffer buffer;
+    Hash64 hashval, m;
+    int k, big_endian, scheme, added;
+    int atomic = 0;
+
+    if (!PyArg_ParseTuple(args, "OKiKpi|p", &bit_array, &hashval, &k, &m,
+                          &big_endian, &scheme, &atomic)) {
+        return NULL;
+    }
+
+    if (check_params(k, m, scheme) < 0) {
+        return NULL;
+    }
+
+    if (get_bit_buffer(bit_array, m, big_endian, &buffer) < 0) {
+        return NULL;
+    }
+
+    buffer.atomic = atomic;
+    added = add_hash(&buffer, hashval, k, m, scheme);
+    release_bit_buffer(&buffer);
+
+    return PyBool_FromLong(added);
+}
+
+
+/**
+ * bloom_contains - Check if a hash value is in a bit array.
+ *
+ * Python signature: bloom_contains(bit_array, hashval, k, m, big_endian,
+ * scheme).
+ */
+static PyObject * bloom_contains(PyObject* self, PyObject* args) {
+    PyObject *bit_array;
+    BitBuffer buffer;
+    Hash64 hashval, m;
+    int k, big_endian, scheme, found;
+
+    if (!PyArg_ParseTuple(args, "OKiKpi", &bit_array, &hashval, &k, &m,
+                          &big_endian, &scheme)) {
+        return NULL;
+    }
+
+    if (check_params(k, m, scheme) < 0) {
+        return NULL;
+    }
+
+    if (get_bit_buffer(bit_array, m, big_endian, &buffer) < 0) {
+        return NULL;
     }
+
+    found = contains_hash(&buffer, hashval, k, m, scheme);
+    release_bit_buffer(&buffer);
+
+    return PyBool_FromLong(found);
+}
+
+
+/**
+ * bloom_add_many - Add every hash value of an iterable to a bit array.
+ *
+ * Python signature: bloom_add_many(bit_array, hashvals, k, m, big_endian,
+ * scheme, atomic=False), returns the number of values that were not in the
+ * bit array yet.
+ */
+static PyObject * bloom_add_many(PyObject* self, PyObject* args) {
+    PyObject *bit_array;
+    PyObject *hashvals;
+    Hash64 *values;
+    Hash64 m;
+    BitBuffer buffer;
+    Py_ssize_t count, i, added = 0;
+    int k, big_endian, scheme;
+    int atomic = 0;
+
+    if (!PyArg_ParseTuple(args, "OOiKpi|p", &bit_array, &hashvals, &k, &m,
+                          &big_endian, &scheme, &atomic)) {
+        return NULL;
+    }
+
+    if (check_params(k, m, scheme) < 0) {
+        return NULL;
+    }
+
+    values = get_hash_values(hashvals, &count);
+
+    if (values == NULL) {
+        return NULL;
+    }
+
+    if (get_bit_buffer(bit_array, m, big_endian, &buffer) < 0) {
+        PyMem_Free(values);
+        return NULL;
+    }
+
+    buffer.atomic = atomic;
+
+    if (count >= GIL_RELEASE_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < count; i++) {
+            added += add_hash(&buffer, values[i], k, m, scheme);
+        }
+        Py_END_ALLOW_THREADS
+    } else {
+        for (i = 0; i < count; i++) {
+            added += add_hash(&buffer, values[i], k, m, scheme);
+        }
+    }
+
+    release_bit_buffer(&buffer);
+    PyMem_Free(values);
+
+    return PyLong_FromSsize_t(added);
+}
+
+
+/**
+ * bloom_contains_many - Check every hash value of an iterable against a bit
+ * array.
+ *
+ * Python signature: bloom_contains_many(bit_array, hashvals, k, m,
+ * big_endian, scheme), returns a bitmap of the results as bytes, the
+ * result of hash value i being bit i & 7 of byte i >> 3.
+ */
+static PyObject * bloom_contains_many(PyObject* self, PyObject* args) {
+    PyObject *bit_array;
+    PyObject *hashvals;
+    PyObject *results = NULL;
+    Hash64 *values;
+    Hash64 m;
+    char *found;
+    BitBuffer buffer;
+    Py_ssize_t count;
+    int k, big_endian, scheme;
+
+    if (!PyArg_ParseTuple(args, "OOiKpi", &bit_array, &hashvals, &k, &m,
+                          &big_endian, &scheme)) {
+        return NULL;
+    }
+
+    if (check_params(k, m, scheme) < 0) {
+        return NULL;
+    }
+
+    values = get_hash_values(hashvals, &count);
+
+    if (values == NULL) {
+        return NULL;
+    }
+
+    found = PyMem_Malloc(count ? count : 1);
+
+    if (found == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    if (get_bit_buffer(bit_array, m, big_endian, &buffer) < 0) {
+        goto done;
+    }
+
+    if (count >= GIL_RELEASE_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        contains_many(&buffer, values, count, k, m, scheme, found);
+        Py_END_ALLOW_THREADS
+    } else {
+        contains_many(&buffer, values, count, k, m, scheme, found);
+    }
+
+    release_bit_buffer(&buffer);
+    results = bit_map(found, count);
+
+done:
+    PyMem_Free(found);
+    PyMem_Free(values);
+
+    return results;
+}
+
+
+/**
+ * atomic_add - Atomically add to a 64-bit counter in a writable buffer.
+ *
+ * Python signature: atomic_add(buffer, offset, delta), returns the new value.
+ * The offset must be a multiple of 8.
+ */
+static PyObject * atomic_add(PyObject* self, PyObject* args) {
+    PyObject *object;
+    Py_buffer view;
+    Py_ssize_t offset;
+    long long delta;
+    Hash64 value;
+
+    if (!PyArg_ParseTuple(args, "OnL", &object, &offset, &delta)) {
+        return NULL;
+    }
+
+    if (PyObject_GetBuffer(object, &view, PyBUF_WRITABLE) < 0) {
+        return NULL;
+    }
+
+    if (offset < 0 || offset % 8 || offset + 8 > view.len) {
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_ValueError, "Invalid counter offset");
+        return NULL;
+    }
+
+    value = __atomic_add_fetch(
+        (Hash64 *) ((char *) view.buf + offset),
+        (Hash64) delta,
+        __ATOMIC_SEQ_CST
+    );
+    PyBuffer_Release(&view);
+
+    return PyLong_FromUnsignedLongLong(value);
+}
+
+
+/**
+ * get_fingerprint_table - Get a table of slots f-bit fingerprints.
+ * @ object - Object exporting a writable buffer.
+ * @ slots - Number of fingerprints.
+ * @ f - Fingerprint size in bits, from 1 to 32.
+ * @ table - Output.
+ *
+ * Fingerprint i occupies bits i * f to (i + 1) * f - 1, least significant
+ * first, and the buffer extends TABLE_PADDING bytes past the last one.
+ */
+static int get_fingerprint_table(PyObject *object, Hash64 slots, int f,
+                                 FingerprintTable *table) {
+    if (f < 1 || f > 32) {
+        PyErr_SetString(PyExc_ValueError, "Value of f must be from 1 to 32");
+        return -1;
+    }
+
+    if (slots == 0) {
+        PyErr_SetString(PyExc_ValueError, "Table must have slots");
+        return -1;
+    }
+
+    if (PyObject_GetBuffer(object, &table->view, PyBUF_WRITABLE) < 0) {
+        return -1;
+    }
+
+    if ((Hash64) table->view.len < (slots * f + 7) / 8 + TABLE_PADDING) {
+        PyBuffer_Release(&table->view);
+        PyErr_SetString(PyExc_ValueError, "Table is smaller than its slots");
+        return -1;
+    }
+
+    table->bytes = table->view.buf;
+    table->slots = slots;
+    table->f = f;
+
+    return 0;
+}
+
+
+/**
+ * load_word - Read 8 bytes as a little endian integer.
+ */
+static inline Hash64 load_word(const unsigned char *bytes) {
+    Hash64 word = 0;
+    int i;
+
+    for (i = 7; i >= 0; i--) {
+        word = (word << 8) | bytes[i];
+    }
+
+    return word;
+}
+
+
+/**
+ * store_word - Write a little endian integer to 8 bytes.
+ */
+static inline void store_word(unsigned char *bytes, Hash64 word) {
+    int i;
+
+    for (i = 0; i < 8; i++) {
+        bytes[i] = word & 0xFF;
+        word >>= 8;
+    }
+}
+
+
+static inline Hash64 field_mask(int f) {
+    return (1ULL << f) - 1;
+}
+
+
+/**
+ * get_field - Get the fingerprint in slot i.
+ */
+static inline Hash64 get_field(FingerprintTable *table, Hash64 i) {
+    Hash64 bit = i * table->f;
+
+    return (load_word(table->bytes + (bit >> 3)) >> (bit & 7)) &
+        field_mask(table->f);
+}
+
+
+/**
+ * set_field - Set the fingerprint in slot i.
+ */
+static inline void set_field(FingerprintTable *table, Hash64 i,
+                             Hash64 value) {
+    Hash64 bit = i * table->f;
+    unsigned char *bytes = table->bytes + (bit >> 3);
+    Hash64 mask = field_mask(table->f) << (bit & 7);
+    Hash64 word = load_word(bytes);
+
+    store_word(bytes, (word & ~mask) | ((value << (bit & 7)) & mask));
+}
+
+
+/**
+ * Cuckoo filter - Buckets of CUCKOO_BUCKET_SIZE fingerprints.
+ *
+ * A hash value has a non-zero fingerprint taken from its upper 32 bits and
+ * two candidate buckets, i1 from its mix64 and i2 = alt(i1, fingerprint).
+ * alt(i, fp) = (mix64(fp) - i) mod buckets is its own inverse, so a
+ * fingerprint can be moved to its other bucket without the item, for any
+ * number of buckets. Empty slots hold 0.
+ */
+static inline Hash64 cuckoo_fingerprint(Hash64 hashval, int f) {
+    Hash64 fp = (hashval >> 32) & field_mask(f);
+
+    return fp ? fp : 1;
+}
+
+
+static inline Hash64 cuckoo_alt(Hash64 bucket, Hash64 fp, Hash64 buckets) {
+    Hash64 h = mix64(fp) % buckets;
+
+    return h >= bucket ? h - bucket : h + buckets - bucket;
+}
+
+
+/**
+ * bucket_find - Slot of a fingerprint in a bucket, or -1.
+ */
+static inline long long bucket_find(FingerprintTable *table, Hash64 bucket,
+                                    Hash64 fp) {
+    Hash64 slot = bucket * CUCKOO_BUCKET_SIZE;
+    int i;
+
+    for (i = 0; i < CUCKOO_BUCKET_SIZE; i++) {
+        if (get_field(table, slot + i) == fp) {
+            return slot + i;
+        }
+    }
+
+    return -1;
+}
+
+
+/**
+ * bucket_put - Put a fingerprint in an empty slot, return 1 if there was one.
+ */
+static inline int bucket_put(FingerprintTable *table, Hash64 bucket,
+                             Hash64 fp) {
+    long long slot = bucket_find(table, bucket, 0);
+
+    if (slot < 0) {
+        return 0;
+    }
+
+    set_field(table, slot, fp);
+
+    return 1;
+}
+
+
+/**
+ * cuckoo_insert - Insert a hash value, return 0 if the table is full.
+ *
+ * When both buckets are full, fingerprints are evicted to their other bucket
+ * up to CUCKOO_MAX_KICKS times. If no free slot is found the evictions are
+ * undone, so a failed insert leaves the table unchanged.
+ */
+static int cuckoo_insert(FingerprintTable *table, Hash64 hashval) {
+    Hash64 buckets = table->slots / CUCKOO_BUCKET_SIZE;
+    Hash64 fp = cuckoo_fingerprint(hashval, table->f);
+    Hash64 bucket = mix64(hashval) % buckets;
+    Hash64 slots[CUCKOO_MAX_KICKS];
+    Hash64 evicted[CUCKOO_MAX_KICKS];
+    Hash64 state = hashval;
+    int kicks;
+
+    if (bucket_put(table, bucket, fp)) {
+        return 1;
+    }
+
+    bucket = cuckoo_alt(bucket, fp, buckets);
+
+    if (bucket_put(table, bucket, fp)) {
+        return 1;
+    }
+
+    for (kicks = 0; kicks < CUCKOO_MAX_KICKS; kicks++) {
+        state = mix64(state + kicks);
+        slots[kicks] = bucket * CUCKOO_BUCKET_SIZE +
+            state % CUCKOO_BUCKET_SIZE;
+        evicted[kicks] = get_field(table, slots[kicks]);
+        set_field(table, slots[kicks], fp);
+        fp = evicted[kicks];
+        bucket = cuckoo_alt(bucket, fp, buckets);
+
+        if (bucket_put(table, bucket, fp)) {
+            return 1;
+        }
+    }
+
+    while (kicks--) {
+        set_field(table, slots[kicks], evicted[kicks]);
+    }
+
+    return 0;
+}
+
+
+/**
+ * cuckoo_lookup - Slot of the fingerprint of a hash value, or -1.
+ */
+static long long cuckoo_lookup(FingerprintTable *table, Hash64 hashval) {
+    Hash64 buckets = table->slots / CUCKOO_BUCKET_SIZE;
+    Hash64 fp = cuckoo_fingerprint(hashval, table->f);
+    Hash64 bucket = mix64(hashval) % buckets;
+    long long slot = bucket_find(table, bucket, fp);
+
+    if (slot < 0) {
+        slot = bucket_find(table, cuckoo_alt(bucket, fp, buckets), fp);
+    }
+
+    return slot;
+}
+
+
+/**
+ * get_cuckoo_table - Get the table of a cuckoo filter of some buckets.
+ */
+static int get_cuckoo_table(PyObject *object, int f, Hash64 buckets,
+                            FingerprintTable *table) {
+    if (buckets == 0) {
+        PyErr_SetString(PyExc_ValueError, "Filter must have buckets");
+        return -1;
+    }
+
+    return get_fingerprint_table(
+        object,
+        buckets * CUCKOO_BUCKET_SIZE,
+        f,
+        table
+    );
+}
+
+
+/**
+ * cuckoo_add - Add a hash value to a cuckoo filter table.
+ *
+ * Python signature: cuckoo_add(table, hashval, f, buckets), returns False if
+ * the table is full. A value may be added more than once, every copy takes
+ * a slot.
+ */
+static PyObject * cuckoo_add(PyObject* self, PyObject* args) {
+    PyObject *object;
+    FingerprintTable table;
+    Hash64 hashval, buckets;
+    int f, added;
+
+    if (!PyArg_ParseTuple(args, "OKiK", &object, &hashval, &f, &buckets)) {
+        return NULL;
+    }
+
+    if (get_cuckoo_table(object, f, buckets, &table) < 0) {
+        return NULL;
+    }
+
+    added = cuckoo_insert(&table, hashval);
+    PyBuffer_Release(&table.view);
+
+    return PyBool_FromLong(added);
+}
+
+
+/**
+ * cuckoo_contains - Check if a hash value is in a cuckoo filter table.
+ *
+ * Python signature: cuckoo_contains(table, hashval, f, buckets).
+ */
+static PyObject * cuckoo_contains(PyObject* self, PyObject* args) {
+    PyObject *object;
+    FingerprintTable table;
+    Hash64 hashval, buckets;
+    int f, found;
+
+    if (!PyArg_ParseTuple(args, "OKiK", &object, &hashval, &f, &buckets)) {
+        return NULL;
+    }
+
+    if (get_cuckoo_table(object, f, buckets, &table) < 0) {
+        return NULL;
+    }
+
+    found = cuckoo_lookup(&table, hashval) >= 0;
+    PyBuffer_Release(&table.view);
+
+    return PyBool_FromLong(found);
+}
+
+
+/**
+ * cuckoo_remove - Remove a hash value from a cuckoo filter table.
+ *
+ * Python signature: cuckoo_remove(table, hashval, f, buckets), returns False
+ * if the value was not found. Removing a value that was never added may
+ * remove the fingerprint of another one.
+ */
+static PyObject * cuckoo_remove(PyObject* self, PyObject* args) {
+    PyObject *object;
+    FingerprintTable table;
+    Hash64 hashval, buckets;
+    long long slot;
+    int f;
+
+    if (!PyArg_ParseTuple(args, "OKiK", &object, &hashval, &f, &buckets)) {
+        return NULL;
+    }
+
+    if (get_cuckoo_table(object, f, buckets, &table) < 0) {
+        return NULL;
+    }
+
+    slot = cuckoo_lookup(&table, hashval);
+
+    if (slot >= 0) {
+        set_field(&table, slot, 0);
+    }
+
+    PyBuffer_Release(&table.view);
+
+    return PyBool_FromLong(slot >= 0);
+}
+
+
+/**
+ * cuckoo_add_many - Add every hash value of an iterable to a cuckoo filter
+ * table.
+ *
+ * Python signature: cuckoo_add_many(table, hashvals, f, buckets), returns the
+ * number of values added, values after the first that did not fit are not
+ * added. The GIL is held since concurrent inserts would corrupt the table.
+ */
+static PyObject * cuckoo_add_many(PyObject* self, PyObject* args) {
+    PyObject *object;
+    PyObject *hashvals;
+    FingerprintTable table;
+    Hash64 *values;
+    Hash64 buckets;
+    Py_ssize_t count, i;
+    int f;
+
+    if (!PyArg_ParseTuple(args, "OOiK", &object, &hashvals, &f, &buckets)) {
+        return NULL;
+    }
+
+    values = get_hash_values(hashvals, &count);
+
+    if (values == NULL) {
+        return NULL;
+    }
+
+    if (get_cuckoo_table(object, f, buckets, &table) < 0) {
+        PyMem_Free(values);
+        return NULL;
+    }
+
+    for (i = 0; i < count && cuckoo_insert(&table, values[i]); i++);
+
+    PyBuffer_Release(&table.view);
+    PyMem_Free(values);
+
+    return PyLong_FromSsize_t(i);
+}
+
+
+/**
+ * bool_list - Build a list of booleans from an array of flags.
+ */
+static PyObject * bool_list(const char *flags, Py_ssize_t count) {
+    PyObject *results = PyList_New(count);
+    Py_ssize_t i;
+
+    for (i = 0; results != NULL && i < count; i++) {
+        PyList_SET_ITEM(results, i, PyBool_FromLong(flags[i]));
+    }
+
+    return results;
+}
+
+
+/**
+ * cuckoo_contains_many - Check every hash value of an iterable against a
+ * cuckoo filter table.
+ *
+ * Python signature: cuckoo_contains_many(table, hashvals, f, buckets),
+ * returns a list of booleans.
+ */
+static PyObject * cuckoo_contains_many(PyObject* self, PyObject* args) {
+    PyObject *object;
+    PyObject *hashvals;
+    PyObject *results = NULL;
+    FingerprintTable table;
+    Hash64 *values;
+    Hash64 buckets;
+    char *found;
+    Py_ssize_t count, i;
+    int f;
+
+    if (!PyArg_ParseTuple(args, "OOiK", &object, &hashvals, &f, &buckets)) {
+        return NULL;
+    }
+
+    values = get_hash_values(hashvals, &count);
+
+    if (values == NULL) {
+        return NULL;
+    }
+
+    found = PyMem_Malloc(count ? count : 1);
+
+    if (found == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    if (get_cuckoo_table(object, f, buckets, &table) < 0) {
+        goto done;
+    }
+
+    for (i = 0; i < count; i++) {
+        found[i] = cuckoo_lookup(&table, values[i]) >= 0;
+    }
+
+    PyBuffer_Release(&table.view);
+    results = bool_list(found, count);
+
+done:
+    PyMem_Free(found);
+    PyMem_Free(values);
+
+    return results;
+}
+
+
+static int compare_hashes(const void *a, const void *b) {
+    Hash64 x = *(const Hash64 *) a;
+    Hash64 y = *(const Hash64 *) b;
+
+    return (x > y) - (x < y);
+}
+
+
+/**
+ * get_hash_buffer - Get a writable buffer of 64-bit hash values.
+ */
+static int get_hash_buffer(PyObject *object, Py_buffer *view,
+                           Py_ssize_t *count) {
+    if (PyObject_GetBuffer(object, view, PyBUF_WRITABLE) < 0) {
+        return -1;
+    }
+
+    if (view->len % sizeof(Hash64)) {
+        PyBuffer_Release(view);
+        PyErr_SetString(PyExc_ValueError, "Buffer of 64-bit values required");
+        return -1;
+    }
+
+    *count = view->len / sizeof(Hash64);
+
+    return 0;
+}
+
+
+/**
+ * sort_unique - Sort a buffer of 64-bit hash values and move every distinct
+ * value to its start.
+ *
+ * Python signature: sort_unique(hashes), such as an array("Q"), returns the
+ * number of distinct values.
+ */
+static PyObject * sort_unique(PyObject* self, PyObject* args) {
+    PyObject *object;
+    Py_buffer view;
+    Hash64 *values;
+    Py_ssize_t count, i, unique = 0;
+
+    if (!PyArg_ParseTuple(args, "O", &object)) {
+        return NULL;
+    }
+
+    if (get_hash_buffer(object, &view, &count) < 0) {
+        return NULL;
+    }
+
+    values = view.buf;
+
+    Py_BEGIN_ALLOW_THREADS
+    qsort(values, count, sizeof(Hash64), compare_hashes);
+
+    for (i = 0; i < count; i++) {
+        if (i == 0 || values[i] != values[unique - 1]) {
+            values[unique++] = values[i];
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+
+    return PyLong_FromSsize_t(unique);
+}
+
+
+/**
+ * Xor filter - Three segments of fingerprints.
+ *
+ * A hash value is mixed with the seed of the filter into h, which selects one
+ * slot in each segment and a fingerprint. The table is built so that the xor
+ * of the three slots is the fingerprint of every value it holds.
+ */
+typedef struct {
+    Hash64 slots[3];
+    Hash64 fp;
+} XorProbe;
+
+
+static inline Hash64 rotl64(Hash64 x, int r) {
+    return (x << r) | (x >> (64 - r));
+}
+
+
+/**
+ * reduce32 - Map a 32-bit value to [0, n) without a division.
+ */
+static inline Hash64 reduce32(Hash64 x, Hash64 n) {
+    return ((x & ONES_64) * n) >> 32;
+}
+
+
+static inline void init_xor_probe(XorProbe *probe, Hash64 hashval, int f,
+                                  Hash64 segment, Hash64 seed) {
+    Hash64 h = mix64(hashval + seed);
+
+    probe->slots[0] = reduce32(h, segment);
+    probe->slots[1] = reduce32(rotl64(h, 21), segment) + segment;
+    probe->slots[2] = reduce32(rotl64(h, 42), segment) + 2 * segment;
+    probe->fp = (h ^ (h >> 32)) & field_mask(f);
+}
+
+
+static inline int xor_lookup(FingerprintTable *table, Hash64 hashval,
+                             Hash64 segment, Hash64 seed) {
+    XorProbe probe;
+
+    init_xor_probe(&probe, hashval, table->f, segment, seed);
+
+    return probe.fp == (
+        get_field(table, probe.slots[0]) ^
+        get_field(table, probe.slots[1]) ^
+        get_field(table, probe.slots[2])
+    );
+}
+
+
+/**
+ * get_xor_table - Get the table of a xor filter of some segment size.
+ */
+static int get_xor_table(PyObject *object, int f, Hash64 segment,
+                         FingerprintTable *table) {
+    if (segment == 0 || segment > ONES_64) {
+        PyErr_SetString(PyExc_ValueError, "Segment size must fit 32 bits");
+        return -1;
+    }
+
+    return get_fingerprint_table(object, 3 * segment, f, table);
+}
+
+
+/**
+ * peel - Fill a xor filter table, return 0 if the seed does not allow it.
+ *
+ * Every value is counted in its three slots, whose xors accumulate the values.
+ * Slots counting a single value are peeled from the table repeatedly, which
+ * orders the values so that assigning them in reverse sets one slot of each
+ * while its two others are final.
+ */
+static int peel(FingerprintTable *table, Hash64 *values, Py_ssize_t count,
+                Hash64 segment, Hash64 seed) {
+    Hash64 size = 3 * segment;
+    unsigned int *counts = calloc(size, sizeof(unsigned int));
+    Hash64 *xors = calloc(size, sizeof(Hash64));
+    Hash64 *queue = malloc(size * sizeof(Hash64));
+    Hash64 *stack = malloc(2 * (count ? count : 1) * sizeof(Hash64));
+    Hash64 slot, value, fp;
+    Py_ssize_t i, head = 0, tail = 0, peeled = 0;
+    XorProbe probe;
+    int j, result = -1;
+
+    if (counts == NULL || xors == NULL || queue == NULL || stack == NULL) {
+        goto done;
+    }
+
+    for (i = 0; i < count; i++) {
+        init_xor_probe(&probe, values[i], table->f, segment, seed);
+
+        for (j = 0; j < 3; j++) {
+            counts[probe.slots[j]]++;
+            xors[probe.slots[j]] ^= values[i];
+        }
+    }
+
+    for (slot = 0; slot < size; slot++) {
+        if (counts[slot] == 1) {
+            queue[tail++] = slot;
+        }
+    }
+
+    while (head < tail) {
+        slot = queue[head++];
+
+        if (counts[slot] != 1) {
+            continue;
+        }
+
+        value = xors[slot];
+        stack[2 * peeled] = value;
+        stack[2 * peeled + 1] = slot;
+        peeled++;
+        init_xor_probe(&probe, value, table->f, segment, seed);
+
+        for (j = 0; j < 3; j++) {
+            counts[probe.slots[j]]--;
+            xors[probe.slots[j]] ^= value;
+
+            if (counts[probe.slots[j]] == 1) {
+                queue[tail++] = probe.slots[j];
+            }
+        }
+    }
+
+    result = peeled == count;
+
+    if (!result) {
+        goto done;
+    }
+
+    memset(table->bytes, 0, table->view.len);
+
+    while (peeled--) {
+        value = stack[2 * peeled];
+        slot = stack[2 * peeled + 1];
+        init_xor_probe(&probe, value, table->f, segment, seed);
+        fp = probe.fp;
+
+        for (j = 0; j < 3; j++) {
+            fp ^= get_field(table, probe.slots[j]);
+        }
+
+        set_field(table, slot, fp);
+    }
+
+done:
+    free(counts);
+    free(xors);
+    free(queue);
+    free(stack);
+
+    return result;
+}
+
+
+/**
+ * xor_build - Build a xor filter table from distinct hash values.
+ *
+ * Python signature: xor_build(table, hashes, f, segment, seed), where hashes
+ * is a buffer of distinct 64-bit values such as an array("Q") passed through
+ * sort_unique. Returns False if the values can't be placed with this seed,
+ * in which case another seed should be tried. The table is 3 * segment
+ * slots, segment should be at least (1.23 * len(hashes) + 32) / 3.
+ */
+static PyObject * xor_build(PyObject* self, PyObject* args) {
+    PyObject *object;
+    PyObject *hashes;
+    FingerprintTable table;
+    Py_buffer view;
+    Hash64 segment, seed;
+    Py_ssize_t count;
+    int f, built;
+
+    if (!PyArg_ParseTuple(args, "OOiKK", &object, &hashes, &f, &segment,
+                          &seed)) {
+        return NULL;
+    }
+
+    if (get_xor_table(object, f, segment, &table) < 0) {
+        return NULL;
+    }
+
+    if (get_hash_buffer(hashes, &view, &count) < 0) {
+        PyBuffer_Release(&table.view);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    built = peel(&table, view.buf, count, segment, seed);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    PyBuffer_Release(&table.view);
+
+    if (built < 0) {
+        return PyErr_NoMemory();
+    }
+
+    return PyBool_FromLong(built);
+}
+
+
+/**
+ * xor_contains - Check if a hash value is in a xor filter table.
+ *
+ * Python signature: xor_contains(table, hashval, f, segment, seed).
+ */
+static PyObject * xor_contains(PyObject* self, PyObject* args) {
+    PyObject *object;
+    FingerprintTable table;
+    Hash64 hashval, segment, seed;
+    int f, found;
+
+    if (!PyArg_ParseTuple(args, "OKiKK", &object, &hashval, &f, &segment,
+                          &seed)) {
+        return NULL;
+    }
+
+    if (get_xor_table(object, f, segment, &table) < 0) {
+        return NULL;
+    }
+
+    found = xor_lookup(&table, hashval, segment, seed);
+    PyBuffer_Release(&table.view);
+
+    return PyBool_FromLong(found);
+}
+
+
+/**
+ * xor_contains_many - Check every hash value of an iterable against a xor
+ * filter table.
+ *
+ * Python signature: xor_contains_many(table, hashvals, f, segment, seed),
+ * returns a list of booleans.
+ */
+static PyObject * xor_contains_many(PyObject* self, PyObject* args) {
+    PyObject *object;
+    PyObject *hashvals;
+    PyObject *results = NULL;
+    FingerprintTable table;
+    Hash64 *values;
+    Hash64 segment, seed;
+    char *found;
+    Py_ssize_t count, i;
+    int f;
+
+    if (!PyArg_ParseTuple(args, "OOiKK", &object, &hashvals, &f, &segment,
+                          &seed)) {
+        return NULL;
+    }
+
+    values = get_hash_values(hashvals, &count);
+
+    if (values == NULL) {
+        return NULL;
+    }
+
+    found = PyMem_Malloc(count ? count : 1);
+
+    if (found == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    if (get_xor_table(object, f, segment, &table) < 0) {
+        goto done;
+    }
+
+    /* Tables are never modified once built. */
+    if (count >= GIL_RELEASE_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < count; i++) {
+            found[i] = xor_lookup(&table, values[i], segment, seed);
+        }
+        Py_END_ALLOW_THREADS
+    } else {
+        for (i = 0; i < count; i++) {
+            found[i] = xor_lookup(&table, values[i], segment, seed);
+        }
+    }
+
+    PyBuffer_Release(&table.view);
+    results = bool_list(found, count);
+
+done:
+    PyMem_Free(found);
+    PyMem_Free(values);
+
+    return results;
+}
+
+
+static PyMethodDef Methods[] = {
+    {
+        "fnv1a64_composite", 
+        fnv1a64_composite_from_str, 
+        METH_VARARGS,
+        "Get a composite fnv1a64 hash"
+    },
+    {
+        "fnv1_64",
+        fnv1_64,
+        METH_O,
+        "Get the FNV-1 64-bit hash of a str or buffer"
+    },
+    {
+        "fnv1a64",
+        fnv1a64,
+        METH_O,
+        "Get the FNV-1a 64-bit hash of a str or buffer"
+    },
+    {
+        "hash_indexes",
+        hash_indexes,
+        METH_VARARGS,
+        "Get the bloom filter bit indexes of a hash value"
+    },
+    {
+        "bloom_add",
+        bloom_add,
+        METH_VARARGS,
+        "Add a hash value to a bloom filter bit array"
+    },
+    {
+        "bloom_contains",
+        bloom_contains,
+        METH_VARARGS,
+        "Check if a hash value is in a bloom filter bit array"
+    },
+    {
+        "bloom_add_many",
+        bloom_add_many,
+        METH_VARARGS,
+        "Add hash values to a bloom filter bit array"
+    },
+    {
+        "atomic_add",
+        atomic_add,
+        METH_VARARGS,
+        "Atomically add to a 64-bit counter in a buffer"
+    },
+    {
+        "bloom_contains_many",
+        bloom_contains_many,
+        METH_VARARGS,
+        "Check if hash values are in a bloom filter bit array, returns a "
+        "bitmap of the results"
+    },
+    {
+        "cuckoo_add",
+        cuckoo_add,
+        METH_VARARGS,
+        "Add a hash value to a cuckoo filter table"
+    },
+    {
+        "cuckoo_contains",
+        cuckoo_contains,
+        METH_VARARGS,
+        "Check if a hash value is in a cuckoo filter table"
+    },
+    {
+        "cuckoo_remove",
+        cuckoo_remove,
+        METH_VARARGS,
+        "Remove a hash value from a cuckoo filter table"
+    },
+    {
+        "cuckoo_add_many",
+        cuckoo_add_many,
+        METH_VARARGS,
+        "Add hash values to a cuckoo filter table"
+    },
+    {
+        "cuckoo_contains_many",
+        cuckoo_contains_many,
+        METH_VARARGS,
+        "Check if hash values are in a cuckoo filter table"
+    },
+    {
+        "sort_unique",
+        sort_unique,
+        METH_VARARGS,
+        "Sort a buffer of 64-bit hash values and deduplicate them"
+    },
+    {
+        "xor_build",
+        xor_build,
+        METH_VARARGS,
+        "Build a xor filter table from distinct hash values"
+    },
+    {
+        "xor_contains",
+        xor_contains,
+        METH_VARARGS,
+        "Check if a hash value is in a xor filter table"
+    },
+    {
+        "xor_contains_many",
+        xor_contains_many,
+        METH_VARARGS,
+        "Check if hash values are in a xor filter table"
+    },
+    {NULL, NULL, 0, NULL}
 };
 
 
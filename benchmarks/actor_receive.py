@@ -0,0 +1,75 @@
+"""
+Actor receive path benchmark.
+
+Measures messages per second consumed by an actor from an asyncio queue using
+the stop-watcher receive path, compared against the previous receive path that
+raced inbox.get() against the stop event with get_first_completed.
+
+Usage:
+    python benchmarks/actor_receive.py [message count]
+"""
+
+
+from asyncio import Queue, new_event_loop
+from illume.actor import Actor
+from illume.task import get_first_completed
+from sys import argv
+from time import perf_counter
+
+
+class CountingActor(Actor):
+
+    """Stops itself after receiving a fixed number of messages."""
+
+    count = 0
+    received = 0
+
+    async def on_message(self, data):
+        self.received += 1
+
+        if self.received == self.count:
+            await self.stop()
+
+
+class LegacyCountingActor(CountingActor):
+
+    """Receives through the task-per-message get_first_completed race."""
+
+    async def _receive(self):
+        pending = {self.inbox.get(), self._stop_event.wait()}
+
+        return await get_first_completed(pending, self._loop)
+
+
+def run(Actor, count):
+    """Return messages per second consumed by an actor class."""
+    loop = new_event_loop()
+    inbox = Queue(loop=loop)
+    actor = Actor(inbox, None, loop=loop)
+    actor.count = count
+
+    for n in range(count):
+        inbox.put_nowait(n)
+
+    start = perf_counter()
+    loop.run_until_complete(actor.start())
+    elapsed = perf_counter() - start
+    loop.close()
+
+    return count / elapsed
+
+
+def main():
+    count = int(argv[1]) if len(argv) > 1 else 100000
+
+    before = run(LegacyCountingActor, count)
+    after = run(CountingActor, count)
+
+    print("messages:          {}".format(count))
+    print("before (msgs/sec): {:.0f}".format(before))
+    print("after  (msgs/sec): {:.0f}".format(after))
+    print("speedup:           {:.2f}x".format(after / before))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Blocked bloom filter benchmark.
+
+Compares classic and blocked bloom filters sized for the same item count and
+error rate: bits per item, hash count, add and lookup throughput, and the
+false positive rate measured on items that were never added. Lookups are
+measured one at a time and in batches, where blocked filters prefetch the
+blocks of a batch. Pick an item count whose filters exceed the CPU caches to
+see the cost of cache misses.
+
+Usage:
+    python benchmarks/blocked_bloom.py [item count] [error rate]
+"""
+
+
+from illume.filter.bloom import BloomFilter
+from sys import argv
+from time import perf_counter
+
+
+BATCH_SIZE = 1000
+HASH_ENGINE = "xxh64"
+
+
+def batches(items):
+    for n in range(0, len(items), BATCH_SIZE):
+        yield items[n:n + BATCH_SIZE]
+
+
+def measure(fn, items):
+    """Return items per second and the results of fn for every batch."""
+    start = perf_counter()
+    results = [fn(batch) for batch in batches(items)]
+
+    return len(items) / (perf_counter() - start), results
+
+
+def contains(bloom_filter):
+    def run(items):
+        return [item in bloom_filter for item in items]
+
+    return run
+
+
+def main():
+    count = int(argv[1]) if len(argv) > 1 else 2000000
+    p = float(argv[2]) if len(argv) > 2 else .01
+    items = ["http://example{}.com/page/{}".format(n % 97, n)
+             for n in range(count)]
+    others = ["http://example{}.com/other/{}".format(n % 97, n)
+              for n in range(count)]
+
+    header = "{:<8} {:>9} {:>3} {:>11} {:>12} {:>15} {:>9}"
+    row = "{:<8} {:>9.2f} {:>3} {:>11.0f} {:>12.0f} {:>15.0f} {:>9.5f}"
+
+    print("{} items, p = {}".format(count, p))
+    print(header.format(
+        "layout",
+        "bits/key",
+        "k",
+        "adds/s",
+        "contains/s",
+        "contains_many/s",
+        "fp rate"
+    ))
+
+    for name, blocked in (("classic", False), ("blocked", True)):
+        bloom_filter = BloomFilter(count, p, HASH_ENGINE, blocked=blocked)
+        add_rate, _ = measure(bloom_filter.add_many, items)
+        contains_rate, _ = measure(contains(bloom_filter), others)
+        batch_rate, found = measure(bloom_filter.contains_many, others)
+        false_positives = sum(sum(batch) for batch in found)
+
+        print(row.format(
+            name,
+            bloom_filter.m / count,
+            bloom_filter.k,
+            add_rate,
+            contains_rate,
+            batch_rate,
+            false_positives / len(others)
+        ))
+
+
+if __name__ == "__main__":
+    main()
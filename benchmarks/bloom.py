@@ -0,0 +1,94 @@
+"""
+Bloom filter benchmark.
+
+Compares setting and testing bits from Python with the composite hash
+indexes, as BloomFilter did before, against the single item and batch
+operations of the hashes extension, with batch results either as a list of
+booleans or as the bitmap the extension returns.
+
+Usage:
+    python benchmarks/bloom.py [item count] [batch size]
+"""
+
+
+from illume.filter.bloom import BloomFilter
+from sys import argv
+from time import perf_counter
+
+
+def python_add(bloom_filter, items):
+    for item in items:
+        bloom_filter.check_bounds()
+
+        for index in bloom_filter._get_hashes(item):
+            bloom_filter.bit_array[index] = 1
+
+
+def python_contains(bloom_filter, items):
+    for item in items:
+        all(bloom_filter.bit_array[i] for i in bloom_filter._get_hashes(item))
+
+
+def native_add(bloom_filter, items):
+    for item in items:
+        bloom_filter.add(item)
+
+
+def native_contains(bloom_filter, items):
+    for item in items:
+        item in bloom_filter
+
+
+def batched(fn, batch_size):
+    def run(bloom_filter, items):
+        for n in range(0, len(items), batch_size):
+            fn(bloom_filter, items[n:n + batch_size])
+
+    return run
+
+
+def measure(fn, bloom_filter, items):
+    """Return operations per second."""
+    start = perf_counter()
+    fn(bloom_filter, items)
+
+    return len(items) / (perf_counter() - start)
+
+
+def main():
+    count = int(argv[1]) if len(argv) > 1 else 200000
+    batch_size = int(argv[2]) if len(argv) > 2 else 1000
+    items = ["http://example{}.com/page/{}".format(n % 97, n)
+             for n in range(count)]
+    rows = [
+        ("python", python_add, python_contains),
+        ("add/contains", native_add, native_contains),
+        (
+            "add_many/contains_many",
+            batched(BloomFilter.add_many, batch_size),
+            batched(BloomFilter.contains_many, batch_size)
+        ),
+        (
+            "add_many/contains_bitmap",
+            batched(BloomFilter.add_many, batch_size),
+            batched(BloomFilter.contains_bitmap, batch_size)
+        )
+    ]
+
+    print("{} items, batches of {}".format(count, batch_size))
+    print("{:<26} {:>12} {:>14}".format("method", "adds/s", "contains/s"))
+
+    for name, add, contains in rows:
+        bloom_filter = BloomFilter(count, .01, "xxh64", blocked=False)
+        add_rate = measure(add, bloom_filter, items)
+        contains_rate = measure(contains, bloom_filter, items)
+
+        print("{:<26} {:>12.0f} {:>14.0f}".format(
+            name,
+            add_rate,
+            contains_rate
+        ))
+
+
+if __name__ == "__main__":
+    main()
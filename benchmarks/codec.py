@@ -0,0 +1,87 @@
+"""
+Socket queue codec benchmark.
+
+Reports bytes on the wire and encode/decode throughput of every codec for a
+FileAnalyzer message carrying a page worth of extracted URLs, next to the
+newline delimited JSON framing used before codecs were negotiated.
+
+Usage:
+    python benchmarks/codec.py [url count] [iterations]
+"""
+
+
+from illume.queues.codec import CODECS, FRAME_HEADER, JSONCodec
+from sys import argv
+from time import perf_counter
+
+
+def analyzer_message(url_count):
+    """Build a message shaped like the ones FileAnalyzer publishes."""
+    domains = ["example{}.com".format(n) for n in range(url_count // 10 + 1)]
+
+    return {
+        "url": "http://example.com/wiki/Web_crawler",
+        "domain": "example.com",
+        "path": "/var/lib/illume/fetcher-0-1500000000-1234-42",
+        "success": True,
+        "md5": "9e107d9d372bb6826bd81d3542a419d6",
+        "http_code": 200,
+        "urls": [
+            {
+                "url": "http://{}/wiki/Article_{}".format(
+                    domains[n % len(domains)],
+                    n
+                ),
+                "domain": domains[n % len(domains)]
+            }
+            for n in range(url_count)
+        ]
+    }
+
+
+def measure(codec, message, iterations, framed=True):
+    """Return wire size, encodes per second and decodes per second."""
+    payload = codec.encode(message)
+    overhead = FRAME_HEADER.size if framed else 1
+
+    start = perf_counter()
+
+    for n in range(iterations):
+        codec.encode(message)
+
+    encode_rate = iterations / (perf_counter() - start)
+    start = perf_counter()
+
+    for n in range(iterations):
+        codec.decode(payload)
+
+    decode_rate = iterations / (perf_counter() - start)
+
+    return len(payload) + overhead, encode_rate, decode_rate
+
+
+def main():
+    url_count = int(argv[1]) if len(argv) > 1 else 300
+    iterations = int(argv[2]) if len(argv) > 2 else 2000
+    message = analyzer_message(url_count)
+    rows = [("json-lines",) + measure(JSONCodec(), message, iterations, False)]
+
+    for name, Codec in CODECS.items():
+        rows.append((name,) + measure(Codec(), message, iterations))
+
+    print("{} urls per message, {} iterations".format(url_count, iterations))
+    print("{:<12} {:>10} {:>14} {:>14}".format(
+        "codec", "bytes", "encode msg/s", "decode msg/s"
+    ))
+
+    for name, size, encode_rate, decode_rate in rows:
+        print("{:<12} {:>10} {:>14.0f} {:>14.0f}".format(
+            name,
+            size,
+            encode_rate,
+            decode_rate
+        ))
+
+
+if __name__ == "__main__":
+    main()
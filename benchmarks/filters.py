@@ -0,0 +1,102 @@
+"""
+Approximate membership filter benchmark.
+
+Reports add and lookup throughput of every backend, the bytes they take per
+item, and the false positive rate measured on items that were never added
+next to the rate the filter was sized for. Xor filters are built from every
+item at once, frozen filters are measured by their xor filter alone.
+
+Usage:
+    python benchmarks/filters.py [item count] [error rate]...
+"""
+
+
+from illume.filter.bloom import BloomFilter
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.xor import build_xor_filter
+from sys import argv
+from time import perf_counter
+
+
+BATCH_SIZE = 1000
+HASH_ENGINE = "xxh64"
+
+
+def batches(items):
+    for n in range(0, len(items), BATCH_SIZE):
+        yield items[n:n + BATCH_SIZE]
+
+
+def measure(fn, items):
+    """Return items per second and the results of fn for every batch."""
+    start = perf_counter()
+    results = [fn(batch) for batch in batches(items)]
+
+    return len(items) / (perf_counter() - start), results
+
+
+def add_bloom(items, p):
+    bloom_filter = BloomFilter(len(items), p, HASH_ENGINE, blocked=False)
+    rate, _ = measure(bloom_filter.add_many, items)
+
+    return bloom_filter, rate
+
+
+def add_cuckoo(items, p):
+    cuckoo_filter = CuckooFilter(len(items), p, HASH_ENGINE)
+    rate, _ = measure(cuckoo_filter.add_many, items)
+
+    return cuckoo_filter, rate
+
+
+def build_xor(items, p):
+    start = perf_counter()
+    xor_filter = build_xor_filter(items, p, HASH_ENGINE)
+
+    return xor_filter, len(items) / (perf_counter() - start)
+
+
+BACKENDS = [
+    ("bloom", add_bloom),
+    ("cuckoo", add_cuckoo),
+    ("xor", build_xor)
+]
+
+
+def main():
+    count = int(argv[1]) if len(argv) > 1 else 200000
+    rates = [float(p) for p in argv[2:]] or [.01, .001, .0001]
+    items = ["http://example{}.com/page/{}".format(n % 97, n)
+             for n in range(count)]
+    others = ["http://example{}.com/other/{}".format(n % 97, n)
+              for n in range(count)]
+
+    print("{} items".format(count))
+    print("{:<8} {:>8} {:>12} {:>14} {:>10} {:>10}".format(
+        "backend",
+        "p",
+        "adds/s",
+        "contains/s",
+        "bytes/key",
+        "fp rate"
+    ))
+
+    for p in rates:
+        for name, add in BACKENDS:
+            membership_filter, add_rate = add(items, p)
+            contains_rate, _ = measure(membership_filter.contains_many, items)
+            _, found = measure(membership_filter.contains_many, others)
+            false_positives = sum(sum(batch) for batch in found)
+
+            print("{:<8} {:>8} {:>12.0f} {:>14.0f} {:>10.3f} {:>10.5f}".format(
+                name,
+                p,
+                add_rate,
+                contains_rate,
+                membership_filter.nbytes / count,
+                false_positives / len(others)
+            ))
+
+
+if __name__ == "__main__":
+    main()
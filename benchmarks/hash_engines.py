@@ -0,0 +1,70 @@
+"""
+Bloom filter hash engine benchmark.
+
+Reports hashing, add_many and contains_many throughput of every hash engine,
+and the false positive rate measured on items that were never added next to
+the rate the filter was sized for.
+
+Usage:
+    python benchmarks/hash_engines.py [item count] [error rate]
+"""
+
+
+from illume.filter.bloom import BloomFilter
+from illume.filter.hashing import ENGINES
+from sys import argv
+from time import perf_counter
+
+
+BATCH_SIZE = 1000
+
+
+def batches(items):
+    for n in range(0, len(items), BATCH_SIZE):
+        yield items[n:n + BATCH_SIZE]
+
+
+def measure(fn, items):
+    """Return items per second and the results of fn for every batch."""
+    start = perf_counter()
+    results = [fn(batch) for batch in batches(items)]
+
+    return len(items) / (perf_counter() - start), results
+
+
+def main():
+    count = int(argv[1]) if len(argv) > 1 else 200000
+    p = float(argv[2]) if len(argv) > 2 else .01
+    items = ["http://example{}.com/page/{}".format(n % 97, n)
+             for n in range(count)]
+    others = ["http://example{}.com/other/{}".format(n % 97, n)
+              for n in range(count)]
+
+    print("{} items, p = {}".format(count, p))
+    print("{:<12} {:>12} {:>12} {:>14} {:>10}".format(
+        "engine",
+        "hashes/s",
+        "adds/s",
+        "contains/s",
+        "fp rate"
+    ))
+
+    for name, engine in ENGINES.items():
+        bloom_filter = BloomFilter(count, p, name, blocked=False)
+        hash_rate, _ = measure(engine.hash_many, items)
+        add_rate, _ = measure(bloom_filter.add_many, items)
+        contains_rate, _ = measure(bloom_filter.contains_many, items)
+        _, found = measure(bloom_filter.contains_many, others)
+        false_positives = sum(sum(batch) for batch in found)
+
+        print("{:<12} {:>12.0f} {:>12.0f} {:>14.0f} {:>10.5f}".format(
+            name,
+            hash_rate,
+            add_rate,
+            contains_rate,
+            false_positives / len(others)
+        ))
+
+
+if __name__ == "__main__":
+    main()
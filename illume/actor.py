@@ -5,8 +5,11 @@ Base classes and methods for actors.
 
 
 from asyncio import coroutine, Queue, get_event_loop, Lock, wait, Event
-from asyncio import FIRST_COMPLETED
-from illume.task import get_first_completed
+from asyncio import FIRST_COMPLETED, QueueEmpty, TimeoutError, Semaphore
+from asyncio import Task, ensure_future, gather, sleep
+from collections import OrderedDict
+from illume.log import log
+from illume.task import StopWatcher, timeout
 
 
 class Actor(object):
@@ -14,6 +17,16 @@ class Actor(object):
     """
     Main actor model.
 
+    Setting batch_size above 1 enables batch mode: messages that are already
+    queued in the inbox are collected, waiting up to batch_linger seconds for
+    more, and handed to on_message_batch as a list. Messages delivered
+    through handle, as pooled actors receive them, are batched the same way.
+
+    Setting max_concurrency above 1 keeps up to that many on_message
+    coroutines in flight. When ordered is set, messages published by in-flight
+    coroutines are held back and released in the order their input messages
+    were received.
+
     Args:
         inbox (GeneratorQueue): Inbox to consume from.
         outbox (GeneratorQueue): Outbox to publish to.
@@ -23,16 +36,36 @@ class Actor(object):
     running = False
     _force_stop = False
 
+    # Maximum number of messages passed to on_message_batch.
+    batch_size = 1
+    # Seconds to wait for a batch to fill after the first message arrives.
+    batch_linger = 0
+    # Maximum number of on_message coroutines in flight.
+    max_concurrency = 1
+    # Publish results of concurrent messages in order of receipt.
+    ordered = False
+
     def __init__(self, inbox, outbox, loop=None):
         self.inbox = inbox
         self.outbox = outbox
 
+        if hasattr(outbox, "add_producer"):
+            outbox.add_producer(self)
+
         if not loop:
             loop = get_event_loop()
 
         self._loop = loop
         self._pause_lock = Lock(loop=self._loop)
         self._stop_event = Event(loop=self._loop)
+        self._stop_watcher = StopWatcher(self._stop_event, self._loop)
+        self._flush_lock = Lock(loop=self._loop)
+        self._in_flight = OrderedDict()
+        self._batch = []
+        self._batch_handle = None
+        self._linger_task = None
+        self._slots = None
+        self._task_error = None
         self._test = None
         self.__testy = None
 
@@ -43,6 +76,11 @@ class Actor(object):
         """Indicate if actor is paused."""
         return self._pause_lock.locked()
 
+    @property
+    def in_flight(self):
+        """Number of messages currently being handled concurrently."""
+        return len(self._in_flight)
+
     async def start(self):
         """Main public entry point to start the actor."""
         await self.initialize()
@@ -50,6 +88,8 @@ class Actor(object):
 
     async def initialize(self):
         """Initialize the actor before starting."""
+        self._slots = Semaphore(self.max_concurrency, loop=self._loop)
+
         await self.on_start()
 
         if self._force_stop:
@@ -63,7 +103,16 @@ class Actor(object):
         try:
             await self._run()
         finally:
-            await self.on_stop()
+            await self.finalize()
+
+    async def finalize(self):
+        """Wait for in-flight messages to settle and call on_stop."""
+        if self._linger_task is not None:
+            await gather(self._linger_task, loop=self._loop,
+                         return_exceptions=True)
+
+        await self._join_in_flight()
+        await self.on_stop()
 
     async def resume(self):
         """Resume the actor."""
@@ -79,7 +128,7 @@ class Actor(object):
         """Block on the pause lock."""
         if self.paused:
             await self._pause_lock.acquire()
-            await self._pause_lock.release()
+            self._pause_lock.release()
 
     async def _run(self):
         """Main event loop."""
@@ -88,8 +137,19 @@ class Actor(object):
 
             await self._process()
 
+        if self._task_error is not None:
+            raise self._task_error
+
     async def publish(self, data):
         """Push data to the outbox."""
+        if self.ordered:
+            task = Task.current_task(loop=self._loop)
+            held = self._in_flight.get(task, None)
+
+            if held is not None:
+                held.append(data)
+                return
+
         await self.outbox.put(data)
 
     async def stop(self):
@@ -100,27 +160,249 @@ class Actor(object):
         self._force_stop = True
 
         self._stop_event.set()
+        self._cancel_in_flight()
+
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
 
         try:
             self._pause_lock.release()
         except RuntimeError:
             pass
 
+        await self._stop_watcher.close()
+
+    async def handle(self, message):
+        """
+        Handle a message delivered from outside of the run loop.
+
+        Messages are dropped once the actor stopped running, such as after
+        an in-flight task failed.
+        """
+        await self._block_if_paused()
+
+        if not self.running:
+            return
+
+        if self.batch_size > 1:
+            self._batch.append(message)
+
+            if len(self._batch) >= self.batch_size:
+                await self.flush_batch()
+            elif self._batch_handle is None:
+                self._batch_handle = self._loop.call_later(
+                    self.batch_linger,
+                    self._on_batch_linger
+                )
+        elif self.max_concurrency > 1:
+            await self._slots.acquire()
+
+            if not self.running:
+                self._slots.release()
+                return
+
+            self._spawn(self.on_message(message))
+        else:
+            await self.on_message(message)
+
+    async def flush_batch(self):
+        """Hand messages batched by handle to on_message_batch."""
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
+
+        batch, self._batch = self._batch, []
+
+        if not batch or not self.running:
+            return
+
+        # The slot also keeps lingered batches from overlapping.
+        await self._slots.acquire()
+
+        if self.max_concurrency > 1:
+            self._spawn(self.on_message_batch(batch))
+            return
+
+        try:
+            await self.on_message_batch(batch)
+        finally:
+            self._slots.release()
+
+    def _on_batch_linger(self):
+        """Flush a batch that did not fill within batch_linger."""
+        self._batch_handle = None
+        self._linger_task = ensure_future(self.flush_batch(), loop=self._loop)
+        self._linger_task.add_done_callback(self._on_linger_done)
+
+    def _on_linger_done(self, task):
+        """Surface the failure of a lingered batch."""
+        if not task.cancelled() and task.exception() is not None:
+            self._on_task_error(task.exception())
+
+    async def wait_in_flight(self):
+        """Wait until every in-flight message has been handled."""
+        tasks = [t for t in self._in_flight if not t.done()]
+
+        if tasks:
+            await wait(tasks, loop=self._loop)
+
     async def _process(self):
         """Process incoming messages."""
         if not self.inbox:
             return
 
-        pending = {self.inbox.get(), self._stop_event.wait()}
-        result = await get_first_completed(pending, self._loop)
+        concurrent = self.max_concurrency > 1
+
+        if concurrent:
+            await self._slots.acquire()
+
+            if not self.inbox:
+                self._slots.release()
+                return
+
+        result = await self._receive()
+
+        if not self.running:
+            if concurrent:
+                self._slots.release()
+
+            return
+
+        if self.batch_size > 1:
+            batch = await self._fill_batch([result])
+            coro = self.on_message_batch(batch)
+        else:
+            coro = self.on_message(result)
+
+        if concurrent:
+            self._spawn(coro)
+        else:
+            await coro
+
+    def _spawn(self, coro):
+        """Run a message handler as an in-flight task holding a slot."""
+        task = ensure_future(coro, loop=self._loop)
+        self._in_flight[task] = [] if self.ordered else None
+        task.add_done_callback(self._on_task_done)
+
+        return task
+
+    def _on_task_done(self, task):
+        """Release the slot of a finished task and surface its failure."""
+        if not task.cancelled() and task.exception() is not None:
+            self._on_task_error(task.exception())
+
+        if self.ordered:
+            ensure_future(self._flush_completed(), loop=self._loop)
+        else:
+            self._in_flight.pop(task, None)
+            self._slots.release()
+
+    def _on_task_error(self, exc):
+        """Stop the run loop after an in-flight task failed."""
+        log.error("{} task failed with {!r}".format(
+            self.__class__.__name__,
+            exc
+        ))
+
+        if self._task_error is None:
+            self._task_error = exc
+
+        self.running = False
+        self._stop_event.set()
+
+    async def _flush_completed(self):
+        """Publish held messages of finished tasks in order of receipt."""
+        async with self._flush_lock:
+            while self._in_flight:
+                task = next(iter(self._in_flight))
+
+                if not task.done():
+                    break
+
+                held = self._in_flight.pop(task)
+                self._slots.release()
+
+                if task.cancelled() or task.exception() is not None:
+                    continue
 
-        if self.running:
-            await self.on_message(result)
+                for data in held:
+                    if self.outbox is not None:
+                        await self.outbox.put(data)
+
+    def _cancel_in_flight(self):
+        """Cancel in-flight tasks other than the caller's own."""
+        current = Task.current_task(loop=self._loop)
+
+        for task in list(self._in_flight):
+            if task is not current:
+                task.cancel()
+
+    async def _join_in_flight(self):
+        """Wait for cancelled and finishing in-flight tasks to settle."""
+        current = Task.current_task(loop=self._loop)
+        tasks = [t for t in self._in_flight if t is not current]
+
+        if tasks:
+            await gather(*tasks, loop=self._loop, return_exceptions=True)
+
+    async def _receive(self):
+        """Get the next message from the inbox, or None once stopped."""
+        get_nowait = getattr(self.inbox, "get_nowait", None)
+
+        if get_nowait is not None:
+            try:
+                message = get_nowait()
+            except QueueEmpty:
+                pass
+            else:
+                # Yield to other tasks as a suspending get would.
+                await sleep(0, loop=self._loop)
+
+                return message
+
+        return await self._stop_watcher.run(self.inbox.get())
+
+    async def _fill_batch(self, batch):
+        """Extend a batch with queued messages until full or lingered out."""
+        deadline = self._loop.time() + self.batch_linger
+        get_nowait = getattr(self.inbox, "get_nowait", None)
+
+        while len(batch) < self.batch_size:
+            if get_nowait is not None:
+                try:
+                    batch.append(get_nowait())
+                    continue
+                except QueueEmpty:
+                    pass
+
+            remaining = deadline - self._loop.time()
+
+            if remaining <= 0:
+                break
+
+            try:
+                result = await timeout(self._receive(), remaining, self._loop)
+            except TimeoutError:
+                break
+
+            if self._stop_event.is_set():
+                break
+
+            batch.append(result)
+
+        return batch
 
     async def on_message(self, data):
         """Called when the actor receives a message."""
         raise NotImplementedError
 
+    async def on_message_batch(self, messages):
+        """Called with a list of messages when batch mode is enabled."""
+        for message in messages:
+            await self.on_message(message)
+
     def on_init(self):
         """Called after the actor class is instantiated."""
         pass
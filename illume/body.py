@@ -0,0 +1,92 @@
+"""Storage of fetched response bodies."""
+
+
+from illume import config
+from illume.error import FileNotFound
+from illume.util import remove_or_ignore_file
+from os import scandir
+from os.path import exists, isdir
+from time import time
+
+
+# Body kept on disk in the fetcher output directory.
+DISK = "disk"
+# Body kept in shared memory until the analyzer consumed it.
+MEMORY = "memory"
+# Prefix of the file names of fetched bodies.
+BODY_PREFIX = "fetcher-"
+
+
+def get_shared_memory_directory():
+    """Directory holding bodies in shared memory, None if unavailable."""
+    if config.get("FETCHER_BODY_STORE") != MEMORY:
+        return None
+
+    directory = config.get("FETCHER_SHARED_MEMORY_DIRECTORY")
+
+    return directory if isdir(directory) else None
+
+
+def open_body(message):
+    """
+    Open the body referenced by a fetcher message as a text stream.
+
+    Bodies are decoded as UTF-8, replacing invalid bytes, whatever the
+    locale. Bodies in shared memory are read straight from their tmpfs
+    file, which is removed as soon as it is opened. The pages are freed
+    once the stream is closed, so each body has a single consumer and a
+    second one gets FileNotFound, e.g. several analyzers behind a
+    broadcasting queue.
+    """
+    path = message.get("path", None)
+
+    if message.get("body_store", DISK) != MEMORY:
+        if not exists(path):
+            raise FileNotFound(path)
+
+        return open(path, encoding="UTF-8", errors="replace")
+
+    try:
+        stream = open(path, encoding="UTF-8", errors="replace")
+    except FileNotFoundError:
+        raise FileNotFound(path)
+
+    remove_or_ignore_file(path)
+
+    return stream
+
+
+def sweep_bodies(directory, ttl, now=None):
+    """
+    Remove bodies no consumer opened within ttl seconds.
+
+    Args:
+        directory (str): Directory holding the bodies.
+        ttl (float): Seconds since the last write after which bodies expire.
+        now (float): Current time, defaults to time().
+
+    Returns:
+        int: Number of removed bodies.
+    """
+    if now is None:
+        now = time()
+
+    count = 0
+
+    with scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.startswith(BODY_PREFIX):
+                continue
+            elif not entry.is_file(follow_symlinks=False):
+                continue
+
+            try:
+                expired = entry.stat().st_mtime + ttl < now
+            except FileNotFoundError:
+                continue
+
+            if expired:
+                remove_or_ignore_file(entry.path)
+                count += 1
+
+    return count
@@ -18,6 +18,23 @@ shard_path = lambda s: in_data("{}-{}".format(s, SHARD_ID))
 
 FILTER_HASHER = xxh64
 FILTER_HASHER_KEY_SIZE = FILTER_HASHER().digest_size
+# One of illume.filter.hashing.ENGINES.
+FILTER_BLOOM_HASH_ENGINE = "xxh64"
+# Confine the bits of an item to one cache line of the bit array, which
+# takes more bits for the same error rate but one cache miss per lookup.
+FILTER_BLOOM_BLOCKED = False
+# Size and error rate ratios of consecutive scalable bloom filters.
+FILTER_BLOOM_GROWTH = 2
+FILTER_BLOOM_TIGHTENING = .85
+# Seconds between bloom filter snapshots, 0 disables them.
+FILTER_BLOOM_SNAPSHOT_SECONDS = 300
+# Generations of expiring bloom filters.
+FILTER_BLOOM_GENERATIONS = 4
+# Share of max_n the delta filter of xor backends holds until reindexed.
+FILTER_XOR_DELTA_RATIO = .1
+FILTER_BLOOM_REINDEX_PROCESSES = NUM_CPUS
+# Rowids of the persistent key filter hashed by a reindex task.
+FILTER_BLOOM_REINDEX_CHUNK_SIZE = 100000
 
 
 FRONTIER_KEY_FILTER_DB_PATH = shard_path("frontier")
@@ -25,21 +42,98 @@ FRONTIER_URL_BLOOM_MAX_N = 100000000
 FRONTIER_URL_BLOOM_P = .01
 FRONTIER_DOMAIN_BLOOM_MAX_N = 10000000
 FRONTIER_DOMAIN_BLOOM_P = .01
+# One of illume.filter.backends.BACKENDS. FRONTIER_BLOOM_SCALABLE and
+# FRONTIER_BLOOM_SHARED only apply to bloom filters.
+FRONTIER_URL_FILTER_BACKEND = "bloom"
+FRONTIER_DOMAIN_FILTER_BACKEND = "bloom"
+# Start bloom filters at the initial sizes and grow them with the crawl
+# instead of allocating them at their maximum size.
+FRONTIER_BLOOM_SCALABLE = True
+FRONTIER_URL_BLOOM_INITIAL_N = 1000000
+FRONTIER_DOMAIN_BLOOM_INITIAL_N = 100000
+FRONTIER_URL_BLOOM_SNAPSHOT_PATH = shard_path("url-bloom")
+FRONTIER_DOMAIN_BLOOM_SNAPSHOT_PATH = shard_path("domain-bloom")
+# Share fixed size bloom filters between the filter actors of a host. Takes
+# precedence over FRONTIER_BLOOM_SCALABLE.
+FRONTIER_BLOOM_SHARED = False
+FRONTIER_URL_BLOOM_SHARED_PATH = "/dev/shm/illume-url-bloom-{}".format(
+    SHARD_ID
+)
+FRONTIER_DOMAIN_BLOOM_SHARED_PATH = "/dev/shm/illume-domain-bloom-{}".format(
+    SHARD_ID
+)
+# Seconds a filter actor waits for another to populate shared bloom filters.
+FRONTIER_BLOOM_SHARED_WAIT_SECONDS = 600
+# Known URLs not published for this many seconds are published again as
+# recrawls, 0 disables recrawls. Sizes are per generation.
+FRONTIER_RECRAWL_WINDOW_SECONDS = 0
+FRONTIER_RECRAWL_BLOOM_MAX_N = 10000000
+FRONTIER_RECRAWL_BLOOM_P = .01
 FRONTIER_DOMAIN_WHITELIST = [
     i for i in environ.get("ILLUME_DOMAIN_WHITELIST", "").split(',') if i
 ]
+FRONTIER_BATCH_SIZE = 1
+FRONTIER_QUEUE_MAX_SIZE = 100000
+FRONTIER_DEFAULT_PRIORITY = 5
+# Number of queued messages a single fetch priority level is worth.
+FRONTIER_PRIORITY_AGING = 1000
+FRONTIER_SPILL_DIRECTORY = shard_path("spill")
+FRONTIER_SPILL_MEMORY_SIZE = 100000
+FRONTIER_SPILL_BUCKETS = 64
+FRONTIER_SPILL_SEGMENT_SIZE = 67108864 # 64 megabytes
+FRONTIER_BATCH_LINGER_SECONDS = 0
 
 FETCHER_USER_AGENT = "illume"
 FETCHER_TIMEOUT_SECONDS = 10
 FETCHER_OUTPUT_DIRECTORY = shard_path("fetcher")
 FETCHER_MAX_RESPONSE_SIZE = 10485760 # ~10 megabytes
 FETCHER_HEADER_MAX_SIZE = 524288 # ~500 kilobytes
+FETCHER_MAX_CONCURRENCY = 100
+FETCHER_ORDERED = False
+FETCHER_HOST_DELAY_SECONDS = 1
+FETCHER_HOST_CONCURRENCY = 2
+FETCHER_HOST_QUEUE_MAX_SIZE = 100000
+# "disk" keeps bodies in FETCHER_OUTPUT_DIRECTORY, "memory" hands them to the
+# analyzer through shared memory and falls back to disk without a tmpfs.
+# A body in memory is read by a single analyzer, do not broadcast it.
+FETCHER_BODY_STORE = "disk"
+FETCHER_SHARED_MEMORY_DIRECTORY = "/dev/shm"
+# Bodies in memory no analyzer opened within this many seconds are removed.
+FETCHER_SHARED_MEMORY_TTL_SECONDS = 600
 
 GRAPH_LOGGER_PATH = shard_path("graph")
+LOGGER_BATCH_SIZE = 1
+LOGGER_BATCH_LINGER_SECONDS = 0
 
 PARSER_DROP_FRAGMENTS = True
 PARSER_DROP_QUERY = False
 
+ANALYZER_BATCH_SIZE = 1
+ANALYZER_BATCH_LINGER_SECONDS = 0
+# Publish extracted urls as a columnar url_batch instead of a list of dicts.
+ANALYZER_URL_BATCH = False
+
 
 TEMP_PREFIX = "illume-"
 QUEUE_ENCODING_TYPE = "UTF-8"
+# Unix socket write buffer watermarks in bytes.
+QUEUE_HIGH_WATERMARK = 1048576 # 1 megabyte
+QUEUE_LOW_WATERMARK = 262144 # 256 kilobytes
+QUEUE_FLUSH_BYTES = 65536 # 64 kilobytes
+QUEUE_FLUSH_LINGER_SECONDS = 0 # Flush on the next event loop tick
+# broadcast, round-robin, least-outstanding or work-stealing.
+QUEUE_DISPATCH_POLICY = "broadcast"
+# Unacknowledged messages a work-stealing client may hold.
+QUEUE_DISPATCH_PREFETCH = 100
+# Messages buffered per child of a broadcasting CompoundQueue.
+QUEUE_BROADCAST_FEED_SIZE = 1000
+# Seconds a stopping CompoundQueue waits for broadcasts to be delivered.
+QUEUE_BROADCAST_STOP_SECONDS = 1
+# TCP queues between nodes.
+TCP_CONNECT_RETRIES = 5
+TCP_RETRY_DELAY_SECONDS = 0.5 # Doubled after every failed attempt
+TCP_COMPRESSION = False
+# Shared memory ring buffer queues.
+QUEUE_RING_LANES = 16 # Maximum producers per ring
+QUEUE_RING_LANE_SIZE = 4194304 # 4 megabytes
+QUEUE_RING_POLL_SECONDS = 0.01
@@ -15,10 +15,15 @@ in_data = lambda *a: join(DATA_DIR, *a)
 
 
 FRONTIER_KEY_FILTER_DB_PATH = "{}-{}".format(in_data("frontier"), SHARD_ID)
+FRONTIER_URL_BLOOM_SNAPSHOT_PATH = shard_path("url-bloom")
+FRONTIER_DOMAIN_BLOOM_SNAPSHOT_PATH = shard_path("domain-bloom")
+FILTER_BLOOM_SNAPSHOT_SECONDS = 0
 TEMP_PREFIX = "illume-test-"
 
 FETCHER_OUTPUT_DIRECTORY = shard_path("fetcher")
 FETCHER_PROGRESS_DIR = shard_path("progress")
 
+FRONTIER_SPILL_DIRECTORY = shard_path("spill")
+
 
 GRAPH_DB_PATH = "{}-{}".format(in_data("graph"), SHARD_ID)
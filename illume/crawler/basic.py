@@ -5,8 +5,9 @@ from illume.log import log
 from illume.workers.analyzer import FileAnalyzer
 from illume.workers.filter import KeyFilter
 from illume.workers.logger import CrawlLogger
-from illume.workers.http_fetcher import HTTPFetcher
+from illume.workers.http_fetcher import PoliteHTTPFetcher
 from illume.queues.compound import CompoundQueue
+from illume.queues.priority import PooledUnixSocketPriorityServerQueue
 from illume.queues.unix import UnixSocketClient, get_unix_pooled_actor
 from illume.util import get_temp_file_name
 from multiprocessing import Pool
@@ -17,9 +18,10 @@ def catch(e):
     raise e
 
 
-def _init_actor(Actor, inbox_path, outbox_ref):
+def _init_actor(Actor, inbox_path, outbox_ref, queue_class=None):
     loop = new_event_loop()
-    pooled_actor = get_unix_pooled_actor(Actor, inbox_path, loop)
+    pooled_actor = get_unix_pooled_actor(Actor, inbox_path, loop,
+                                         queue_class)
     outbox_type = type(outbox_ref)
 
     if outbox_type is str:
@@ -76,7 +78,8 @@ class BasicCrawler:
         filter_outbox = fetcher_inbox
 
         self.init_actor(CrawlLogger, logger_inbox, logger_outbox)
-        self.init_actor(HTTPFetcher, fetcher_inbox, fetcher_outbox)
+        self.init_actor(PoliteHTTPFetcher, fetcher_inbox, fetcher_outbox,
+                        PooledUnixSocketPriorityServerQueue)
         self.init_actor(KeyFilter, filter_inbox, filter_outbox)
         self.init_actor(FileAnalyzer, analyzer_inbox, analyzer_outbox)
         self.seed_fetcher(fetcher_inbox)
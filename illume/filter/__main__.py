@@ -0,0 +1,89 @@
+"""Filter commands.
+
+Usage:
+    python -m illume.filter reindex [-h] [--env ENV] [--url-max-n N]
+        [--url-p P] [--domain-max-n N] [--domain-p P] [--processes N]
+        [path]
+"""
+
+
+from argparse import ArgumentParser
+from illume import config
+from logging import basicConfig, INFO
+
+
+def reindex(args):
+    """Rebuild the URL and domain filter snapshots of the filter actor."""
+    from illume.filter.backends import BLOOM, create_filter
+    from illume.filter.reindex import reindex_bloom_filter, reindex_like
+    from illume.filter.snapshot import save_snapshot
+    from illume.log import log
+
+    path = args.path or config.get("FRONTIER_KEY_FILTER_DB_PATH")
+    targets = [
+        (
+            "url",
+            config.get("FRONTIER_URL_FILTER_BACKEND"),
+            args.url_max_n or config.get("FRONTIER_URL_BLOOM_MAX_N"),
+            args.url_p or config.get("FRONTIER_URL_BLOOM_P"),
+            config.get("FRONTIER_URL_BLOOM_SNAPSHOT_PATH")
+        ),
+        (
+            "domain",
+            config.get("FRONTIER_DOMAIN_FILTER_BACKEND"),
+            args.domain_max_n or config.get("FRONTIER_DOMAIN_BLOOM_MAX_N"),
+            args.domain_p or config.get("FRONTIER_DOMAIN_BLOOM_P"),
+            config.get("FRONTIER_DOMAIN_BLOOM_SNAPSHOT_PATH")
+        )
+    ]
+
+    for column, backend, max_n, p, snapshot_path in targets:
+        if backend == BLOOM:
+            bloom_filter, rowid = reindex_bloom_filter(
+                path,
+                column,
+                max_n,
+                p,
+                processes=args.processes
+            )
+        else:
+            bloom_filter, rowid = reindex_like(
+                path,
+                column,
+                create_filter(backend, max_n, p)
+            )
+
+        save_snapshot(bloom_filter, snapshot_path, {"rowid": rowid})
+        log.info("Saved {} {} filter of {} elements to {}".format(
+            column,
+            backend,
+            bloom_filter.n,
+            snapshot_path
+        ))
+
+
+def main():
+    parser = ArgumentParser(prog="python -m illume.filter")
+    parser.add_argument("--env", default="base", help="Config environment.")
+    commands = parser.add_subparsers(dest="command")
+    command = commands.add_parser("reindex", help=reindex.__doc__)
+    command.add_argument("path", nargs="?", help="Persistent key filter.")
+    command.add_argument("--url-max-n", type=int)
+    command.add_argument("--url-p", type=float)
+    command.add_argument("--domain-max-n", type=int)
+    command.add_argument("--domain-p", type=float)
+    command.add_argument("--processes", type=int)
+    command.set_defaults(run=reindex)
+    args = parser.parse_args()
+
+    if args.command is None:
+        parser.error("A command is required.")
+
+    # Modules read the config on import.
+    config.setenv(args.env)
+    basicConfig(level=INFO)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
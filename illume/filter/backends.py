@@ -0,0 +1,79 @@
+"""Approximate membership filter backends.
+
+Creates empty filters by backend name, sized for max_n items at error rate
+p. Backends are:
+
+    bloom: BloomFilter, the most items per byte at error rates of 0.3% and
+        more.
+    cuckoo: CuckooFilter, smaller below that, supports removal.
+    xor: FrozenFilter, a XorFilter of frozen items, smallest of all, and a
+        CuckooFilter of items added since it was frozen.
+"""
+
+
+from collections import OrderedDict
+from illume import config
+from illume.error import BloomFilterError
+from illume.filter.bloom import BloomFilter
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.xor import FrozenFilter, XorFilter
+from math import ceil
+
+
+BLOOM = "bloom"
+CUCKOO = "cuckoo"
+XOR = "xor"
+
+
+def create_bloom_filter(max_n, p, hash_engine=None):
+    """Create a bloom filter."""
+    return BloomFilter(max_n, p, hash_engine)
+
+
+def create_cuckoo_filter(max_n, p, hash_engine=None):
+    """Create a cuckoo filter."""
+    return CuckooFilter(max_n, p, hash_engine)
+
+
+def create_frozen_filter(max_n, p, hash_engine=None):
+    """
+    Create a frozen filter with nothing frozen yet.
+
+    Both filters get half of p, the delta filter holds
+    FILTER_XOR_DELTA_RATIO of max_n items until the filter is reindexed.
+    """
+    delta_n = max(ceil(max_n * config.get("FILTER_XOR_DELTA_RATIO")), 1)
+
+    return FrozenFilter(
+        XorFilter(0, p / 2, hash_engine),
+        CuckooFilter(delta_n, p / 2, hash_engine)
+    )
+
+
+BACKENDS = OrderedDict()
+BACKENDS[BLOOM] = create_bloom_filter
+BACKENDS[CUCKOO] = create_cuckoo_filter
+BACKENDS[XOR] = create_frozen_filter
+
+
+def create_filter(backend, max_n, p, hash_engine=None):
+    """
+    Create an empty filter.
+
+    Args:
+        backend (str): Name of the backend.
+        max_n (int): Element size.
+        p (float): Desired error rate.
+        hash_engine (str): Name of the hash engine, defaults to
+            FILTER_BLOOM_HASH_ENGINE.
+
+    Returns:
+        MembershipFilter: Filter of the backend.
+    """
+    try:
+        create = BACKENDS[backend]
+    except KeyError:
+        err = "Unknown filter backend {}, available backends are {}."
+        raise BloomFilterError(err.format(backend, ", ".join(BACKENDS)))
+
+    return create(max_n, p, hash_engine)
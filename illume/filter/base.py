@@ -0,0 +1,60 @@
+"""Approximate membership filter interface."""
+
+
+class MembershipFilter:
+
+    """
+    Approximate membership filter.
+
+    Tells whether an item was added, without false negatives and with false
+    positives at a rate of at most p while the filter holds at most max_n
+    items. Backends implement add and __contains__, and usually add_many and
+    contains_many for whole batches, and report their memory in nbytes.
+
+    Attributes:
+        backend (str): Name of the backend, see illume.filter.backends.
+        n (int): Number of items added.
+        max_n (int): Number of items the filter is sized for.
+        p (float): Desired error rate.
+    """
+
+    backend = None
+    n = 0
+    max_n = 0
+    p = 0
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the filter."""
+        raise NotImplementedError
+
+    @property
+    def bits_per_key(self):
+        """Bits taken per item the filter is sized for."""
+        return self.nbytes * 8 / max(self.max_n, 1)
+
+    @property
+    def full(self):
+        """Indicate that one more item would exceed max_n."""
+        return self.n >= self.max_n
+
+    def add(self, item):
+        """Add an item."""
+        raise NotImplementedError
+
+    def add_many(self, items):
+        """Add several items."""
+        for item in items:
+            self.add(item)
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        return [item in self for item in items]
+
+    def __len__(self):
+        """Count of elements inserted."""
+        return self.n
+
+    def __contains__(self, item):
+        """Item was probably added."""
+        raise NotImplementedError
@@ -1,73 +1,240 @@
 """Bloom filter.
 
-Implements a bloom filter using the FNV1a 64-bit hash.
+Implements a bloom filter over a selectable 64-bit hash engine, either
+classic, with bits spread over the whole bit array, or blocked as described
+by Putze et al., "Cache-, Hash- and Space-Efficient Bloom Filters", WEA 2007,
+with the bits of an item confined to one cache line.
 """
 
 
 from bitarray import bitarray
 from decimal import Decimal
-from hashes import fnv1a64_composite
-from illume.error import BloomFilterSizeOverflow, BloomFilterExceedsErrorRate
+from hashes import bloom_add, bloom_add_many, hash_indexes
+from hashes import bloom_contains, bloom_contains_many
+from illume import config
+from illume.error import BloomFilterError, BloomFilterSizeOverflow
+from illume.error import BloomFilterExceedsErrorRate
+from illume.filter.base import MembershipFilter
+from illume.filter.hashing import get_hash_engine
 from illume.util import check_alloc_size
-from math import log, e
+from math import ceil, exp, lgamma, log, e, sqrt
 
 
-def get_optimal_bloom_m(n, p):
-    """Compute the optimal bloom filter size."""
-    return -((n * log(p)) / pow(log(2), 2))
+# Largest m the legacy composite hash can address.
+LEGACY_MAX_M = 2 ** 31 - 1
 
+# Probing schemes of the hashes extension.
+PROBE_DOUBLE = 0
+PROBE_LEGACY = 1
+PROBE_BLOCKED = 2
 
-def get_optimal_bloom_k(m, n, p):
-    """Compute the optimal hash function count for a bloom filter."""
-    return (m / n) * log(2)
+# Bits of a block of blocked filters, a 64 byte cache line.
+BLOCK_BITS = 512
+# Growth of m while sizing blocked filters.
+BLOCKED_M_STEP = 1.01
 
 
-def get_bloom_error_rate(m, k, n):
+def get_optimal_bloom_m(n, p, blocked=False):
+    """
+    Compute the optimal bloom filter size.
+
+    Items of blocked filters are unevenly spread over blocks, so they need
+    more bits for the same error rate. Their size is the smallest number of
+    blocks, grown by BLOCKED_M_STEP from the size of a classic filter, whose
+    error rate is at most p.
+    """
+    m = -((n * log(p)) / pow(log(2), 2))
+
+    if not blocked:
+        return m
+
+    blocks = max(ceil(m / BLOCK_BITS), 1)
+
+    while True:
+        m = blocks * BLOCK_BITS
+        k = get_optimal_bloom_k(m, n, p, True)
+
+        if get_bloom_error_rate(m, k, n, True) <= p:
+            return m
+
+        blocks = max(ceil(blocks * BLOCKED_M_STEP), blocks + 1)
+
+
+def get_optimal_bloom_k(m, n, p, blocked=False):
+    """
+    Compute the optimal hash function count for a bloom filter.
+
+    Crowded blocks favor fewer hash functions, so the count of blocked
+    filters is the one with the lowest error rate up to the classic count.
+    """
+    k = (m / n) * log(2)
+
+    if not blocked:
+        return k
+
+    return min(
+        range(1, max(int(k), 1) + 1),
+        key=lambda i: get_bloom_error_rate(m, i, n, True)
+    )
+
+
+def get_bloom_error_rate(m, k, n, blocked=False):
     """Return the probability that a certain bit is set to 1."""
+    if blocked:
+        return get_blocked_bloom_error_rate(m, k, n)
+
     return pow(1 - pow(e, -k * (n + .5) / (m - 1)), k)
 
 
+def get_blocked_bloom_error_rate(m, k, n):
+    """
+    Error rate of a blocked bloom filter.
+
+    The error rate of a block of BLOCK_BITS holding i items, averaged over
+    the Poisson distribution of the number of items per block.
+    """
+    load = n / max(m // BLOCK_BITS, 1)
+
+    if load <= 0:
+        return 0.0
+
+    spread = 10 * sqrt(load) + 10
+    p = 0.0
+
+    for i in range(max(int(load - spread), 0), int(load + spread) + 1):
+        weight = exp(i * log(load) - load - lgamma(i + 1))
+        p += weight * pow(1 - pow(1 - 1 / BLOCK_BITS, k * i), k)
+
+    return p
+
+
 def alloc_bitarray(m, name=None):
-    """Create a bitarray."""
+    """Create a bitarray with every bit unset."""
     check_alloc_size(m, name)
 
-    return bitarray(m)
+    array = bitarray(m)
+    array.setall(False)
+
+    return array
+
+
+def is_big_endian(array):
+    """Indicate that a bitarray stores the most significant bit first."""
+    endian = array.endian
 
+    # Newer bitarray releases turned endian() into a property.
+    return (endian() if callable(endian) else endian) == "big"
 
-class BloomFilter:
+
+class BloomFilter(MembershipFilter):
 
     """
-    Implements a bloom filter using the FNV1a 64-bit hash.
+    Implements a bloom filter over a selectable 64-bit hash engine.
+
+    Items are hashed once by the engine, then the hashes extension derives
+    the k bit indexes and sets or tests them directly on the buffer of the
+    bit array, add_many and contains_many do so for a whole batch in a
+    single call. Filters may exceed 2^31 bits unless the legacy engine is
+    used.
+
+    Blocked filters set the k bits of an item in one block of BLOCK_BITS,
+    so a lookup misses the cache once instead of k times, and contains_many
+    prefetches the blocks of a batch ahead of testing them. They take more
+    bits for the same error rate, see get_optimal_bloom_m.
 
     Args:
         max_n (int): Bloom filter element size.
         p (float): Desired error rate
+        hash_engine (str): Name of the hash engine, defaults to
+            FILTER_BLOOM_HASH_ENGINE.
+        bit_array (bitarray.bitarray): Existing bit array of m bits, such
+            as one loaded from a snapshot.
+        blocked (bool): Confine the bits of an item to one block, defaults
+            to FILTER_BLOOM_BLOCKED.
     """
 
-    def __init__(self, max_n, p):
+    backend = "bloom"
+
+    def __init__(self, max_n, p, hash_engine=None, bit_array=None,
+                 blocked=None):
+        self.init_params(max_n, p, hash_engine, blocked)
+
+        # Number of elements in the bloom filter.
+        self.n = 0
+
+        # Bit array
+        if bit_array is None:
+            bit_array = alloc_bitarray(self.m, "BloomFilter.bit_array")
+        elif len(bit_array) != self.m:
+            err = "Bit array of {} bits, {} expected."
+            raise BloomFilterError(err.format(len(bit_array), self.m))
+
+        self.bit_array = bit_array
+        self.big_endian = is_big_endian(self.bit_array)
+
+    def init_params(self, max_n, p, hash_engine, blocked=None):
+        """Compute the size of the filter and select its hash engine."""
+        if hash_engine is None:
+            hash_engine = config.get("FILTER_BLOOM_HASH_ENGINE")
+
+        if blocked is None:
+            blocked = config.get("FILTER_BLOOM_BLOCKED")
+
         # Desired maximum value of n.
         self.max_n = max_n
         # Desired error rate
         self.p = p
-        # Number of elements in the bloom filter.
-        self.n = 0
         # Decimal precision of p
         self.p_digits = Decimal(str(p)).as_tuple().exponent * -1
+        # Bits of an item are confined to one block.
+        self.blocked = bool(blocked)
         # Size of the bloom filter.
-        self.m_float = get_optimal_bloom_m(self.max_n, self.p)
+        self.m_float = get_optimal_bloom_m(self.max_n, self.p, self.blocked)
         self.m = int(self.m_float)
 
         # Number of hash functions.
-        self.k_float = get_optimal_bloom_k(self.m, self.max_n, self.p)
+        self.k_float = get_optimal_bloom_k(
+            self.m,
+            self.max_n,
+            self.p,
+            self.blocked
+        )
         self.k = int(self.k_float)
 
-        # Bit array
-        self.bit_array = alloc_bitarray(self.m, "BloomFilter.bit_array")
+        # Hash engine.
+        self.hash_engine = get_hash_engine(hash_engine)
+        self.legacy = self.hash_engine.legacy
+
+        if self.legacy and self.blocked:
+            err = "The {} engine can't be used by blocked filters."
+            raise BloomFilterError(err.format(hash_engine))
+
+        if self.legacy and self.m > LEGACY_MAX_M:
+            err = "The {} engine can't address {} bits."
+            raise BloomFilterError(err.format(hash_engine, self.m))
+
+        # Probing scheme of the hashes extension.
+        if self.blocked:
+            self.scheme = PROBE_BLOCKED
+        elif self.legacy:
+            self.scheme = PROBE_LEGACY
+        else:
+            self.scheme = PROBE_DOUBLE
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the bit array."""
+        return (self.m + 7) // 8
 
     @property
     def current_p_float(self):
         """Current error rate."""
-        return get_bloom_error_rate(self.m_float, self.k_float, self.n)
+        return get_bloom_error_rate(
+            self.m_float,
+            self.k_float,
+            self.n,
+            self.blocked
+        )
 
     @property
     def current_p(self):
@@ -87,12 +254,69 @@ class BloomFilter:
         slow it down, but we can always implement it later.
         """
         self.check_bounds()
-
-        for index in self._get_hashes(item):
-            self.bit_array[index] = 1
+        bloom_add(
+            self.bit_array,
+            self.hash_engine.hash(item),
+            self.k,
+            self.m,
+            self.big_endian,
+            self.scheme
+        )
 
         self.n += 1
 
+    def add_many(self, items):
+        """
+        Add several items to the bloom filter.
+
+        Bounds are checked once for the whole batch, which is rejected as a
+        whole if it would take n past max_n.
+        """
+        items = items if isinstance(items, (list, tuple)) else list(items)
+
+        self.check_bounds()
+
+        if self.n + len(items) > self.max_n:
+            raise BloomFilterSizeOverflow(self.error_params)
+
+        bloom_add_many(
+            self.bit_array,
+            self.hash_engine.hash_many(items),
+            self.k,
+            self.m,
+            self.big_endian,
+            self.scheme
+        )
+
+        self.n += len(items)
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        return self.contains_bitmap(items).tolist()
+
+    def contains_bitmap(self, items):
+        """
+        Check several items, returns a bitarray of the results.
+
+        The extension packs the results into a bitmap, bit i being the
+        result of item i, which saves building a boolean per item.
+        """
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        results = bitarray(endian="little")
+
+        results.frombytes(bloom_contains_many(
+            self.bit_array,
+            self.hash_engine.hash_many(items),
+            self.k,
+            self.m,
+            self.big_endian,
+            self.scheme
+        ))
+
+        del results[len(items):]
+
+        return results
+
     @property
     def error_params(self):
         """Exception parameters."""
@@ -104,16 +328,33 @@ class BloomFilter:
             "k": self.k
         }
 
+    @property
+    def exceeds_p(self):
+        """
+        Indicate that the current error rate is above p.
+
+        Blocked filters are sized for p at max_n, and their error rate is a
+        sum too slow to compute on every add, so only n is checked.
+        """
+        return not self.blocked and self.current_p > self.p
+
+    @property
+    def full(self):
+        """Indicate that one more item would exceed max_n or p."""
+        return self.n >= self.max_n or self.exceeds_p
+
     def check_bounds(self):
         """Check error rate and size parameters."""
         if self.n == self.max_n:
             raise BloomFilterSizeOverflow(self.error_params)
-        elif self.current_p > self.p:
+        elif self.exceeds_p:
             raise BloomFilterExceedsErrorRate(self.error_params)
 
     def _get_hashes(self, content):
-        """Get hashes from native C call."""
-        for index in fnv1a64_composite(content, self.k, self.m):
+        """Get the bit indexes of content from native C call."""
+        hashval = self.hash_engine.hash(content)
+
+        for index in hash_indexes(hashval, self.k, self.m, self.scheme):
             yield index
 
     def __len__(self):
@@ -122,8 +363,11 @@ class BloomFilter:
 
     def __contains__(self, item):
         """Bloom filter coantains values in addresses of the param's hash."""
-        for index in self._get_hashes(item):
-            if not self.bit_array[index]:
-                return False
-
-        return True
+        return bloom_contains(
+            self.bit_array,
+            self.hash_engine.hash(item),
+            self.k,
+            self.m,
+            self.big_endian,
+            self.scheme
+        )
@@ -0,0 +1,186 @@
+"""Cuckoo filter.
+
+Implements the cuckoo filter of Fan et al., "Cuckoo Filter: Practically
+Better Than Bloom", CoNEXT 2014, over a selectable 64-bit hash engine.
+"""
+
+
+from hashes import cuckoo_add, cuckoo_add_many, cuckoo_contains
+from hashes import cuckoo_contains_many, cuckoo_remove
+from illume import config
+from illume.error import BloomFilterError, BloomFilterSizeOverflow
+from illume.filter.base import MembershipFilter
+from illume.filter.hashing import get_hash_engine
+from illume.util import check_alloc_size
+from math import ceil, log2
+
+
+# Fingerprints per bucket.
+BUCKET_SIZE = 4
+# Share of the slots filled at max_n, inserts start failing around 95%.
+MAX_LOAD = .94
+# Bytes past the last fingerprint, see FingerprintTable in hashes.c.
+TABLE_PADDING = 8
+
+
+def get_fingerprint_size(p):
+    """Compute the fingerprint size in bits of a cuckoo filter."""
+    return min(max(ceil(log2(2 * BUCKET_SIZE / p)), 1), 32)
+
+
+def get_table_size(slots, f):
+    """Bytes of a table of slots f-bit fingerprints."""
+    return (slots * f + 7) // 8 + TABLE_PADDING
+
+
+def get_cuckoo_error_rate(f, load):
+    """Probability that an item matches a fingerprint of its buckets."""
+    return 1 - pow(1 - pow(2, -f), 2 * BUCKET_SIZE * load)
+
+
+class CuckooFilter(MembershipFilter):
+
+    """
+    Cuckoo filter over a selectable 64-bit hash engine.
+
+    Items are stored as f-bit fingerprints in one of two buckets of
+    BUCKET_SIZE slots, so a lookup reads two buckets whatever the error
+    rate. Fingerprints grow by one bit when p halves, where a bloom filter
+    grows by 1.44 bits per key, which makes cuckoo filters smaller for error
+    rates below about 0.3%. Items can be removed.
+
+    Adding an item twice stores it twice, check for it first when that may
+    happen.
+
+    Args:
+        max_n (int): Element size.
+        p (float): Desired error rate.
+        hash_engine (str): Name of the hash engine, defaults to
+            FILTER_BLOOM_HASH_ENGINE.
+        table (bytearray): Existing table, such as one loaded from a
+            snapshot.
+    """
+
+    backend = "cuckoo"
+
+    def __init__(self, max_n, p, hash_engine=None, table=None):
+        if hash_engine is None:
+            hash_engine = config.get("FILTER_BLOOM_HASH_ENGINE")
+
+        self.max_n = max_n
+        self.p = p
+        self.n = 0
+        self.f = get_fingerprint_size(p)
+        self.buckets = max(ceil(max_n / (BUCKET_SIZE * MAX_LOAD)), 1)
+        self.hash_engine = get_hash_engine(hash_engine)
+        size = get_table_size(self.buckets * BUCKET_SIZE, self.f)
+
+        if table is None:
+            check_alloc_size(size, "CuckooFilter.table")
+            table = bytearray(size)
+        elif len(table) != size:
+            err = "Table of {} bytes, {} expected."
+            raise BloomFilterError(err.format(len(table), size))
+
+        self.table = table
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the table."""
+        return len(self.table)
+
+    @property
+    def current_p_float(self):
+        """Current error rate."""
+        load = self.n / (self.buckets * BUCKET_SIZE)
+
+        return get_cuckoo_error_rate(self.f, load)
+
+    @property
+    def error_params(self):
+        """Exception parameters."""
+        return {
+            "max_n": self.max_n,
+            "n": self.n,
+            "desired_p": self.p,
+            "current_p_float": self.current_p_float,
+            "f": self.f
+        }
+
+    def add(self, item):
+        """Add an item to the cuckoo filter."""
+        if self.n >= self.max_n:
+            raise BloomFilterSizeOverflow(self.error_params)
+
+        added = cuckoo_add(
+            self.table,
+            self.hash_engine.hash(item),
+            self.f,
+            self.buckets
+        )
+
+        if not added:
+            raise BloomFilterSizeOverflow(self.error_params)
+
+        self.n += 1
+
+    def add_many(self, items):
+        """
+        Add several items to the cuckoo filter.
+
+        The batch is rejected as a whole if it would take n past max_n. If
+        the table fills up first, the items before the one that did not fit
+        stay added.
+        """
+        items = items if isinstance(items, (list, tuple)) else list(items)
+
+        if self.n + len(items) > self.max_n:
+            raise BloomFilterSizeOverflow(self.error_params)
+
+        added = cuckoo_add_many(
+            self.table,
+            self.hash_engine.hash_many(items),
+            self.f,
+            self.buckets
+        )
+        self.n += added
+
+        if added < len(items):
+            raise BloomFilterSizeOverflow(self.error_params)
+
+    def remove(self, item):
+        """
+        Remove an item, returns False if it was not found.
+
+        Only remove items that were added, removing another one may remove
+        the fingerprint of an item that collides with it.
+        """
+        removed = cuckoo_remove(
+            self.table,
+            self.hash_engine.hash(item),
+            self.f,
+            self.buckets
+        )
+
+        if removed:
+            self.n -= 1
+
+        return removed
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        return cuckoo_contains_many(
+            self.table,
+            self.hash_engine.hash_many(items),
+            self.f,
+            self.buckets
+        )
+
+    def __contains__(self, item):
+        """Cuckoo filter holds the fingerprint of item."""
+        return cuckoo_contains(
+            self.table,
+            self.hash_engine.hash(item),
+            self.f,
+            self.buckets
+        )
@@ -0,0 +1,144 @@
+"""Expiring bloom filter."""
+
+
+from collections import deque
+from illume import config
+from illume.filter.bloom import BloomFilter
+from illume.log import log
+from time import monotonic
+
+
+class ExpiringBloomFilter:
+
+    """
+    Bloom filter whose items expire after a time window.
+
+    Items are added to the newest of a ring of generations, each a
+    BloomFilter, and looked up in all of them. Every window / (generations -
+    1) seconds the oldest generation is cleared and becomes the newest, so
+    an item is remembered for at least window and at most window *
+    generations / (generations - 1) seconds. Memory is that of the
+    generations whatever the number of items added, and a lookup probes k
+    bits of each generation.
+
+    Generations are sized for max_n items each with an error rate of p /
+    generations, which bounds the compound error rate by p. A generation
+    that fills up before its time is rotated early, items then expire
+    sooner instead of the error rate growing.
+
+    Args:
+        max_n (int): Element size of a generation.
+        p (float): Maximum compound error rate.
+        window (float): Seconds items are remembered for.
+        generations (int): Number of generations, at least 2, defaults to
+            FILTER_BLOOM_GENERATIONS.
+        hash_engine (str): Name of the hash engine.
+        clock (callable): Returns the current time in seconds.
+    """
+
+    def __init__(self, max_n, p, window, generations=None, hash_engine=None,
+                 clock=monotonic):
+        if generations is None:
+            generations = config.get("FILTER_BLOOM_GENERATIONS")
+
+        if generations < 2:
+            raise ValueError("At least 2 generations are required.")
+
+        self.max_n = max_n
+        self.p = p
+        self.window = window
+        self.span = window / (generations - 1)
+        self.clock = clock
+        self.generations = deque(
+            BloomFilter(max_n, p / generations, hash_engine)
+            for _ in range(generations)
+        )
+        self.created = self.rotated = clock()
+
+    @property
+    def age(self):
+        """Seconds since the filter was created."""
+        return self.clock() - self.created
+
+    @property
+    def n(self):
+        """Number of elements in every generation."""
+        return sum(g.n for g in self.generations)
+
+    def rotate(self):
+        """Clear the oldest generation and make it the newest."""
+        oldest = self.generations.popleft()
+        oldest.bit_array.setall(False)
+        oldest.n = 0
+        self.generations.append(oldest)
+        self.rotated = self.clock()
+
+    def expire(self):
+        """Rotate every generation whose time is up."""
+        now = self.clock()
+        elapsed = now - self.rotated
+        count = min(int(elapsed // self.span), len(self.generations))
+
+        for _ in range(count):
+            self.rotate()
+
+        if count:
+            # Keep rotations on a fixed schedule.
+            self.rotated = now - elapsed % self.span
+
+    def current(self):
+        """Generation to add to."""
+        self.expire()
+        newest = self.generations[-1]
+
+        if newest.full:
+            log.warning("Rotating a full bloom filter generation early.")
+            self.rotate()
+            newest = self.generations[-1]
+
+        return newest
+
+    def add(self, item):
+        """Add an item, or renew it if it is already present."""
+        self.current().add(item)
+
+    def add_many(self, items):
+        """Add several items."""
+        items = items if isinstance(items, (list, tuple)) else list(items)
+
+        while items:
+            newest = self.current()
+            space = newest.max_n - newest.n
+            newest.add_many(items[:space])
+            items = items[space:]
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        self.expire()
+
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        results = [False] * len(items)
+        pending = list(range(len(items)))
+
+        for generation in reversed(self.generations):
+            if not pending:
+                break
+
+            found = generation.contains_many([items[i] for i in pending])
+
+            for i, f in zip(pending, found):
+                results[i] = f
+
+            pending = [i for i, f in zip(pending, found) if not f]
+
+        return results
+
+    def __len__(self):
+        """Count of elements in every generation."""
+        return self.n
+
+    def __contains__(self, item):
+        """Item was added less than window seconds ago."""
+        self.expire()
+
+        return any(item in g for g in reversed(self.generations))
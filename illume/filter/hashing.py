@@ -0,0 +1,81 @@
+"""Hash engines.
+
+64-bit hash functions used to derive bloom filter bit indexes.
+"""
+
+
+from collections import OrderedDict
+from hashes import fnv1_64, fnv1a64
+from illume.error import BloomFilterError
+import xxhash
+
+
+# Hashes of the FNV-1 engine are probed with the original composite scheme.
+LEGACY = "fnv1-legacy"
+
+
+class HashEngine:
+
+    """
+    Named 64-bit hash function.
+
+    Items may be str, hashed as UTF-8, or any object exporting a buffer such
+    as bytes, bytearray or memoryview.
+
+    Args:
+        name (str): Engine name.
+        function (callable): Hashes bytes into an unsigned 64-bit integer.
+        legacy (bool): Probe bit indexes with the original composite scheme.
+    """
+
+    def __init__(self, name, function, legacy=False):
+        self.name = name
+        self.function = function
+        self.legacy = legacy
+
+    def hash(self, item):
+        """Hash an item."""
+        if isinstance(item, str):
+            item = item.encode("UTF-8")
+
+        return self.function(item)
+
+    def hash_many(self, items):
+        """Hash several items."""
+        function = self.function
+
+        return [
+            function(i.encode("UTF-8") if isinstance(i, str) else i)
+            for i in items
+        ]
+
+    def __repr__(self):
+        return "HashEngine({!r})".format(self.name)
+
+
+def _xxh64(data):
+    # Releases before xxh64_intdigest only accept bytes and str.
+    return xxhash.xxh64(bytes(data)).intdigest()
+
+
+ENGINES = OrderedDict()
+ENGINES["xxh64"] = HashEngine(
+    "xxh64",
+    getattr(xxhash, "xxh64_intdigest", _xxh64)
+)
+
+# XXH3 ships with xxhash 2.0 and later.
+if hasattr(xxhash, "xxh3_64_intdigest"):
+    ENGINES["xxh3"] = HashEngine("xxh3", xxhash.xxh3_64_intdigest)
+
+ENGINES["fnv1a64"] = HashEngine("fnv1a64", fnv1a64)
+ENGINES[LEGACY] = HashEngine(LEGACY, fnv1_64, legacy=True)
+
+
+def get_hash_engine(name):
+    """Get a hash engine by name."""
+    try:
+        return ENGINES[name]
+    except KeyError:
+        err = "Unknown hash engine {}, available engines are {}."
+        raise BloomFilterError(err.format(name, ", ".join(ENGINES)))
@@ -3,6 +3,7 @@
 
 from illume.filter.bloom import BloomFilter
 from illume.filter.persistent_key_filter import PersistentKeyFilter
+from illume.filter.reindex import reindex_like
 
 
 class KeyFilterResult:
@@ -77,7 +78,11 @@ class KeyFilter:
 
     def _reindex_bloom_filter(self):
         """Reindex the bloom filter with the persistent key filter."""
-        pass
+        self._bloom_filter, _ = reindex_like(
+            self._path,
+            "url",
+            self._bloom_filter
+        )
 
     @property
     def _persistent_filter(self):
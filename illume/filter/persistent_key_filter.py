@@ -43,6 +43,12 @@ CHECKER_BOTH = "SELECT 1 FROM filter WHERE domain = ? AND url = ?"
 CHECKER_MULTI = "SELECT domain, url FROM filter WHERE "
 
 
+LAST_ROWID = "SELECT MAX(rowid) FROM filter"
+SELECTOR_SINCE = """
+    SELECT rowid, domain, url FROM filter WHERE rowid > ? ORDER BY rowid
+"""
+
+
 class PersistentKeyFilter(SqliteDB):
 
     """
@@ -162,3 +168,18 @@ class PersistentKeyFilter(SqliteDB):
         cursor.execute(CHECKER_BOTH, (domain, url))
 
         return bool(cursor.fetchone())
+
+    def last_rowid(self, cursor=None):
+        """Rowid of the last pairing added, 0 if there are none."""
+        if not cursor:
+            cursor = self.create_cursor()
+
+        cursor.execute(LAST_ROWID)
+
+        return cursor.fetchone()[0] or 0
+
+    def iter_since(self, rowid):
+        """Iterate over (rowid, domain, url) of pairings added after rowid."""
+        cursor = self.create_cursor()
+
+        yield from cursor.execute(SELECTOR_SINCE, (rowid,))
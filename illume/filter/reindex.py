@@ -0,0 +1,383 @@
+"""Parallel bloom filter reindex.
+
+Rebuilds bloom filters from the filter table of a PersistentKeyFilter. The
+table is split into rowid ranges that a process pool streams and hashes,
+every process setting bits with atomic operations in one bit array mapped
+from a temporary file, the bitwise OR of the partial bit arrays of each
+range without copying them between processes.
+
+Cuckoo filters move fingerprints around as items are inserted, so they are
+rebuilt by a single process, and frozen filters by building a xor filter of
+every row.
+
+The reindex command of illume.filter saves reindexed filters as the
+snapshots the filter actor loads on start.
+"""
+
+
+from bitarray import bitarray
+from hashes import bloom_add_many
+from illume import config
+from illume.error import BloomFilterError
+from illume.filter.bloom import BloomFilter, LEGACY_MAX_M
+from illume.filter.bloom import get_optimal_bloom_k, get_optimal_bloom_m
+from illume.filter.bloom import PROBE_BLOCKED, PROBE_DOUBLE, PROBE_LEGACY
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.hashing import get_hash_engine
+from illume.filter.scalable import ScalableBloomFilter
+from illume.filter.xor import FrozenFilter, build_xor_filter
+from illume.log import log
+from illume.util import check_alloc_size, get_temp_file_name
+from illume.util import remove_or_ignore_file
+from itertools import chain
+from mmap import mmap
+from multiprocessing import Pool
+from sqlite3 import connect
+
+
+COLUMNS = ("domain", "url")
+ROWID_RANGE = "SELECT MIN(rowid), MAX(rowid) FROM filter"
+ROW_COUNT = "SELECT COUNT(*) FROM filter"
+SELECTOR_RANGE = "SELECT {} FROM filter WHERE rowid >= ? AND rowid <= ?"
+# Rows fetched and hashed at once.
+FETCH_SIZE = 10000
+
+
+def connect_read_only(path):
+    """Open a read only connection to a database."""
+    return connect("file:{}?mode=ro".format(path), uri=True)
+
+
+def get_last_rowid(path):
+    """Last rowid of the filter table, 0 if it is empty."""
+    conn = connect_read_only(path)
+
+    try:
+        return conn.execute(ROWID_RANGE).fetchone()[1] or 0
+    finally:
+        conn.close()
+
+
+def iter_column(path, column, last):
+    """Iterate over batches of a column up to rowid last."""
+    conn = connect_read_only(path)
+
+    try:
+        cursor = conn.execute(SELECTOR_RANGE.format(column), (0, last))
+
+        while True:
+            batch = cursor.fetchmany(FETCH_SIZE)
+
+            if not batch:
+                break
+
+            yield [row[0] for row in batch]
+    finally:
+        conn.close()
+
+
+def get_rowid_ranges(first, last, chunk_size):
+    """Split rowids from first to last into inclusive ranges."""
+    if first is None:
+        return []
+
+    return [
+        (start, min(start + chunk_size - 1, last))
+        for start in range(first, last + 1, chunk_size)
+    ]
+
+
+def index_range(task):
+    """
+    Set the bits of every key of a rowid range.
+
+    Runs in a pool process, returns the number of rows read and of keys that
+    set at least one bit.
+    """
+    path, column, start, end, bits_path, k, m, hash_engine, scheme = task
+    engine = get_hash_engine(hash_engine)
+    rows = added = 0
+    conn = connect_read_only(path)
+
+    try:
+        cursor = conn.execute(SELECTOR_RANGE.format(column), (start, end))
+
+        with open(bits_path, "r+b") as f, mmap(f.fileno(), 0) as bits:
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+
+                if not batch:
+                    break
+
+                added += bloom_add_many(
+                    bits,
+                    engine.hash_many([row[0] for row in batch]),
+                    k,
+                    m,
+                    True,
+                    scheme,
+                    True
+                )
+                rows += len(batch)
+    finally:
+        conn.close()
+
+    return rows, added
+
+
+def log_progress(column, done, total, rows):
+    """Default progress callback."""
+    log.info("Reindexed {} of {} {} ranges, {} rows".format(
+        done,
+        total,
+        column,
+        rows
+    ))
+
+
+def reindex_bloom_filter(path, column, max_n, p, hash_engine=None,
+                         processes=None, chunk_size=None, progress=None,
+                         blocked=None):
+    """
+    Build a bloom filter of a column of the persistent key filter.
+
+    Args:
+        path (str): Path of the persistent key filter database.
+        column (str): "domain" or "url".
+        max_n (int): Bloom filter element size.
+        p (float): Desired error rate.
+        hash_engine (str): Name of the hash engine.
+        processes (int): Pool size, defaults to
+            FILTER_BLOOM_REINDEX_PROCESSES.
+        chunk_size (int): Rowids per range, defaults to
+            FILTER_BLOOM_REINDEX_CHUNK_SIZE.
+        progress (callable): Called with the column, the number of ranges
+            done, their total and the number of rows read so far.
+        blocked (bool): Build a blocked filter, defaults to
+            FILTER_BLOOM_BLOCKED.
+
+    Returns:
+        (BloomFilter, int): Filter, and the last rowid it holds.
+    """
+    if column not in COLUMNS:
+        raise ValueError("Column must be one of {}.".format(COLUMNS))
+
+    if hash_engine is None:
+        hash_engine = config.get("FILTER_BLOOM_HASH_ENGINE")
+
+    if processes is None:
+        processes = config.get("FILTER_BLOOM_REINDEX_PROCESSES")
+
+    if chunk_size is None:
+        chunk_size = config.get("FILTER_BLOOM_REINDEX_CHUNK_SIZE")
+
+    if progress is None:
+        progress = log_progress
+
+    if blocked is None:
+        blocked = config.get("FILTER_BLOOM_BLOCKED")
+
+    m = int(get_optimal_bloom_m(max_n, p, blocked))
+    k = int(get_optimal_bloom_k(m, max_n, p, blocked))
+    size = (m + 7) // 8
+    legacy = get_hash_engine(hash_engine).legacy
+
+    if legacy and blocked:
+        err = "The {} engine can't be used by blocked filters."
+        raise BloomFilterError(err.format(hash_engine))
+
+    if legacy and m > LEGACY_MAX_M:
+        err = "The {} engine can't address {} bits."
+        raise BloomFilterError(err.format(hash_engine, m))
+
+    if blocked:
+        scheme = PROBE_BLOCKED
+    elif legacy:
+        scheme = PROBE_LEGACY
+    else:
+        scheme = PROBE_DOUBLE
+
+    check_alloc_size(size, "reindex bit array")
+
+    conn = connect_read_only(path)
+
+    try:
+        first, last = conn.execute(ROWID_RANGE).fetchone()
+    finally:
+        conn.close()
+
+    ranges = get_rowid_ranges(first, last, chunk_size)
+    bits_path = get_temp_file_name()
+    rows = added = 0
+
+    try:
+        with open(bits_path, "wb") as f:
+            f.truncate(size)
+
+        tasks = [
+            (path, column, start, end, bits_path, k, m, hash_engine, scheme)
+            for start, end in ranges
+        ]
+
+        with Pool(processes) as pool:
+            results = pool.imap_unordered(index_range, tasks)
+
+            for done, (range_rows, range_added) in enumerate(results, 1):
+                rows += range_rows
+                added += range_added
+                progress(column, done, len(tasks), rows)
+
+        bit_array = bitarray(endian="big")
+
+        with open(bits_path, "rb") as f:
+            bit_array.fromfile(f)
+    finally:
+        remove_or_ignore_file(bits_path)
+
+    del bit_array[m:]
+
+    bloom_filter = BloomFilter(max_n, p, hash_engine, bit_array, blocked)
+    bloom_filter.n = min(added, max_n)
+
+    return bloom_filter, last or 0
+
+
+def reindex_cuckoo_filter(path, column, max_n, p, hash_engine=None):
+    """
+    Build a cuckoo filter of a column of the persistent key filter.
+
+    Args:
+        path (str): Path of the persistent key filter database.
+        column (str): "domain" or "url".
+        max_n (int): Cuckoo filter element size.
+        p (float): Desired error rate.
+        hash_engine (str): Name of the hash engine.
+
+    Returns:
+        (CuckooFilter, int): Filter, and the last rowid it holds.
+    """
+    if column not in COLUMNS:
+        raise ValueError("Column must be one of {}.".format(COLUMNS))
+
+    last = get_last_rowid(path)
+    cuckoo_filter = CuckooFilter(max_n, p, hash_engine)
+
+    for batch in iter_column(path, column, last):
+        # Domains repeat, and every copy would take a slot.
+        batch = list(set(batch))
+        found = cuckoo_filter.contains_many(batch)
+        cuckoo_filter.add_many([i for i, f in zip(batch, found) if not f])
+
+    return cuckoo_filter, last
+
+
+def freeze_column(path, column, delta, p, hash_engine=None):
+    """
+    Build a frozen filter of a column of the persistent key filter.
+
+    Args:
+        path (str): Path of the persistent key filter database.
+        column (str): "domain" or "url".
+        delta (CuckooFilter): Empty filter of the items added afterwards.
+        p (float): Desired error rate of the xor filter.
+        hash_engine (str): Name of the hash engine.
+
+    Returns:
+        (FrozenFilter, int): Filter, and the last rowid it holds.
+    """
+    if column not in COLUMNS:
+        raise ValueError("Column must be one of {}.".format(COLUMNS))
+
+    last = get_last_rowid(path)
+    frozen = build_xor_filter(
+        chain.from_iterable(iter_column(path, column, last)),
+        p,
+        hash_engine
+    )
+
+    return FrozenFilter(frozen, delta), last
+
+
+def reindex_like(path, column, bloom_filter, max_n=None, p=None, **kwargs):
+    """
+    Rebuild a filter of the same kind as bloom_filter.
+
+    A BloomFilter or CuckooFilter keeps its max_n and p unless new ones are
+    given, and bloom filters keep their layout. A ScalableBloomFilter is
+    rebuilt as one whose first filter holds every row, or max_n elements if
+    that is more. A FrozenFilter is rebuilt with every row frozen and an
+    empty delta filter of max_n elements, the size of its current one by
+    default, p being split between both as in illume.filter.backends.
+
+    Args:
+        path (str): Path of the persistent key filter database.
+        column (str): "domain" or "url".
+        bloom_filter (MembershipFilter): Filter to rebuild.
+        max_n (int): New element size.
+        p (float): New error rate.
+        kwargs: Passed to reindex_bloom_filter.
+
+    Returns:
+        (MembershipFilter, int): Filter, and the last rowid it holds.
+    """
+    if p is None:
+        p = bloom_filter.p
+
+    hash_engine = bloom_filter.hash_engine
+
+    if isinstance(bloom_filter, FrozenFilter):
+        delta = CuckooFilter(
+            max_n or bloom_filter.delta.max_n,
+            p / 2,
+            hash_engine.name
+        )
+
+        return freeze_column(path, column, delta, p / 2, hash_engine.name)
+
+    if isinstance(bloom_filter, CuckooFilter):
+        return reindex_cuckoo_filter(
+            path,
+            column,
+            max_n or bloom_filter.max_n,
+            p,
+            hash_engine.name
+        )
+
+    if not isinstance(bloom_filter, ScalableBloomFilter):
+        return reindex_bloom_filter(
+            path,
+            column,
+            max_n or bloom_filter.max_n,
+            p,
+            hash_engine.name,
+            blocked=bloom_filter.blocked,
+            **kwargs
+        )
+
+    conn = connect_read_only(path)
+
+    try:
+        count = conn.execute(ROW_COUNT).fetchone()[0]
+    finally:
+        conn.close()
+
+    initial_n = max(count, max_n or bloom_filter.initial_n)
+    reindexed, last_rowid = reindex_bloom_filter(
+        path,
+        column,
+        initial_n,
+        p * (1 - bloom_filter.tightening),
+        hash_engine,
+        blocked=bloom_filter.filters[-1].blocked,
+        **kwargs
+    )
+    scalable = ScalableBloomFilter(
+        initial_n,
+        p,
+        bloom_filter.growth,
+        bloom_filter.tightening,
+        hash_engine,
+        [reindexed]
+    )
+
+    return scalable, last_rowid
@@ -0,0 +1,166 @@
+"""Scalable bloom filter.
+
+Implements the scalable bloom filter of Almeida et al., "Scalable Bloom
+Filters", Information Processing Letters 101 (2007).
+"""
+
+
+from illume import config
+from illume.filter.base import MembershipFilter
+from illume.filter.bloom import BloomFilter
+
+
+class ScalableBloomFilter(MembershipFilter):
+
+    """
+    Bloom filter that grows instead of overflowing.
+
+    Items are added to the newest of a series of BloomFilters. Once it is
+    full a new one is appended, growth times larger and with an error rate
+    tightened by a factor of tightening. Error rates form the geometric
+    series p * (1 - tightening) * tightening^i, so the compound error rate
+    stays below p however many filters are added, while the number of
+    filters only grows logarithmically with n.
+
+    Args:
+        initial_n (int): Element size of the first filter.
+        p (float): Maximum compound error rate.
+        growth (int): Size ratio of consecutive filters, defaults to
+            FILTER_BLOOM_GROWTH.
+        tightening (float): Error rate ratio of consecutive filters, in
+            (0, 1), defaults to FILTER_BLOOM_TIGHTENING.
+        hash_engine (str): Name of the hash engine.
+        filters (list): Existing filters, such as ones loaded from a
+            snapshot.
+    """
+
+    backend = "bloom"
+
+    def __init__(self, initial_n, p, growth=None, tightening=None,
+                 hash_engine=None, filters=None):
+        if growth is None:
+            growth = config.get("FILTER_BLOOM_GROWTH")
+
+        if tightening is None:
+            tightening = config.get("FILTER_BLOOM_TIGHTENING")
+
+        if hash_engine is None:
+            hash_engine = config.get("FILTER_BLOOM_HASH_ENGINE")
+
+        if growth < 1 or not 0 < tightening < 1:
+            raise ValueError("growth must be >= 1 and 0 < tightening < 1.")
+
+        self.initial_n = initial_n
+        self.p = p
+        self.growth = growth
+        self.tightening = tightening
+        self.hash_engine = hash_engine
+        self.filters = []
+
+        if filters:
+            self.filters.extend(filters)
+        else:
+            self.grow()
+
+    def grow(self):
+        """Append a larger filter with a tighter error rate."""
+        i = len(self.filters)
+        bloom_filter = BloomFilter(
+            self.initial_n * self.growth ** i,
+            self.p * (1 - self.tightening) * self.tightening ** i,
+            self.hash_engine
+        )
+        self.filters.append(bloom_filter)
+
+        return bloom_filter
+
+    @property
+    def n(self):
+        """Number of elements in every filter."""
+        return sum(f.n for f in self.filters)
+
+    @property
+    def m(self):
+        """Size in bits of every filter."""
+        return sum(f.m for f in self.filters)
+
+    @property
+    def max_n(self):
+        """Element size of the filters allocated so far."""
+        return sum(f.max_n for f in self.filters)
+
+    @property
+    def nbytes(self):
+        """Bytes taken by every filter."""
+        return sum(f.nbytes for f in self.filters)
+
+    @property
+    def full(self):
+        """Never full, filters are added instead."""
+        return False
+
+    @property
+    def current_p_float(self):
+        """Current compound error rate."""
+        p = 1.0
+
+        for bloom_filter in self.filters:
+            p *= 1 - bloom_filter.current_p_float
+
+        return 1 - p
+
+    def add(self, item):
+        """Add an item unless it is already present."""
+        if item in self:
+            return
+
+        bloom_filter = self.filters[-1]
+
+        if bloom_filter.full:
+            bloom_filter = self.grow()
+
+        bloom_filter.add(item)
+
+    def add_many(self, items):
+        """Add several items, skipping those already present."""
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        found = self.contains_many(items)
+        items = [item for item, f in zip(items, found) if not f]
+
+        while items:
+            bloom_filter = self.filters[-1]
+
+            if bloom_filter.full:
+                bloom_filter = self.grow()
+
+            space = bloom_filter.max_n - bloom_filter.n
+            bloom_filter.add_many(items[:space])
+            items = items[space:]
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        results = [False] * len(items)
+        pending = list(range(len(items)))
+
+        # Newer filters are larger and hold most items.
+        for bloom_filter in reversed(self.filters):
+            if not pending:
+                break
+
+            found = bloom_filter.contains_many([items[i] for i in pending])
+
+            for i, f in zip(pending, found):
+                results[i] = f
+
+            pending = [i for i, f in zip(pending, found) if not f]
+
+        return results
+
+    def __len__(self):
+        """Count of elements inserted."""
+        return self.n
+
+    def __contains__(self, item):
+        """Item is in any of the filters."""
+        return any(item in f for f in reversed(self.filters))
@@ -0,0 +1,252 @@
+"""Shared memory bloom filter."""
+
+
+from hashes import atomic_add, bloom_add, bloom_add_many
+from illume.error import BloomFilterError, BloomFilterSizeOverflow
+from illume.filter.bloom import BloomFilter
+from illume.util import check_alloc_size, remove_or_ignore_file
+from mmap import mmap
+from os import O_CREAT, O_EXCL, O_RDWR, close, fstat, ftruncate, getpid
+from os import link, open as os_open
+from struct import Struct
+from time import monotonic, sleep
+
+
+MAGIC = b"ILSB"
+VERSION = 1
+# Magic, version, state, big endian, hash engine, blocked, k, m, max_n and
+# p.
+HEADER = Struct("=4sHH?16s?xxIQQd")
+# Number of elements, on a cache line of its own.
+COUNTER = Struct("=Q")
+COUNTER_OFFSET = 64
+HEADER_SIZE = 128
+
+# The filter is being populated by the process that created it.
+POPULATING = 0
+# The filter is ready to use.
+READY = 1
+
+
+class SharedBloomFilter(BloomFilter):
+
+    """
+    Bloom filter in a file mapping shared by the processes of a host.
+
+    The first process to open path creates the filter, later ones map it as
+    long as they ask for the same parameters. Place path on a tmpfs such as
+    /dev/shm so the filter is shared memory, it stays there until unlink() is
+    called. Bits are set with atomic operations so filters can be updated by
+    several processes at once, and n is a shared counter of the items that
+    set at least one bit, items added by several processes count once.
+
+    A created filter is marked populating until set_ready() is called, so
+    processes that opened it can wait_ready() instead of using it half full.
+
+    bit_array is a memoryview of the mapping.
+
+    Args:
+        path (str): Path of the mapped file.
+        max_n (int): Bloom filter element size.
+        p (float): Desired error rate
+        hash_engine (str): Name of the hash engine, defaults to
+            FILTER_BLOOM_HASH_ENGINE.
+        blocked (bool): Confine the bits of an item to one block, defaults
+            to FILTER_BLOOM_BLOCKED.
+    """
+
+    map = None
+
+    def __init__(self, path, max_n, p, hash_engine=None, blocked=None):
+        self.init_params(max_n, p, hash_engine, blocked)
+        self.path = path
+        self.created = False
+        self.size = (self.m + 7) // 8
+
+        try:
+            fd = os_open(path, O_RDWR)
+        except FileNotFoundError:
+            fd = self.create()
+
+        try:
+            self.map = mmap(fd, fstat(fd).st_size)
+        finally:
+            close(fd)
+
+        self.check_header()
+        self.bit_array = memoryview(self.map)[
+            HEADER_SIZE:HEADER_SIZE + self.size
+        ]
+
+    def create(self):
+        """Create the file of the filter, returns a descriptor of it."""
+        check_alloc_size(self.size, "SharedBloomFilter.bit_array")
+
+        temp_path = "{}.{}.tmp".format(self.path, getpid())
+        fd = os_open(temp_path, O_RDWR | O_CREAT | O_EXCL, 0o600)
+
+        try:
+            ftruncate(fd, HEADER_SIZE + self.size)
+
+            with mmap(fd, HEADER_SIZE) as header:
+                HEADER.pack_into(
+                    header,
+                    0,
+                    MAGIC,
+                    VERSION,
+                    POPULATING,
+                    True,
+                    self.hash_engine.name.encode("ascii"),
+                    self.blocked,
+                    self.k,
+                    self.m,
+                    self.max_n,
+                    self.p
+                )
+
+            # Unlike rename, link fails if another process created it first.
+            link(temp_path, self.path)
+            self.created = True
+        except FileExistsError:
+            close(fd)
+            fd = os_open(self.path, O_RDWR)
+        except Exception:
+            close(fd)
+            raise
+        finally:
+            remove_or_ignore_file(temp_path)
+
+        return fd
+
+    def check_header(self):
+        """Check that the mapped filter has the parameters of this one."""
+        if len(self.map) < HEADER_SIZE + self.size:
+            raise BloomFilterError("{} is truncated.".format(self.path))
+
+        magic, version, _, big_endian, engine, blocked, k, m, max_n, p = \
+            HEADER.unpack_from(self.map)
+        engine = engine.rstrip(b"\0").decode("ascii")
+
+        if magic != MAGIC or version != VERSION:
+            err = "{} is not a shared bloom filter."
+            raise BloomFilterError(err.format(self.path))
+
+        params = (self.hash_engine.name, self.k, self.m, self.blocked)
+
+        if (engine, k, m, blocked) != params:
+            err = "{} holds a filter of {} bits, k = {}, hashed with {}{}."
+            raise BloomFilterError(err.format(
+                self.path,
+                m,
+                k,
+                engine,
+                ", blocked" if blocked else ""
+            ))
+
+        self.big_endian = big_endian
+
+    @property
+    def n(self):
+        """Number of elements added by every process."""
+        return COUNTER.unpack_from(self.map, COUNTER_OFFSET)[0]
+
+    @property
+    def ready(self):
+        """Indicate that the filter was populated."""
+        return HEADER.unpack_from(self.map)[2] == READY
+
+    def set_ready(self):
+        """Mark the filter as populated."""
+        self.map[6:8] = READY.to_bytes(2, "little")
+
+    def wait_ready(self, timeout=None, interval=.1):
+        """Wait until the filter was populated."""
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while not self.ready:
+            if deadline is not None and monotonic() > deadline:
+                err = "{} was not populated in time."
+                raise BloomFilterError(err.format(self.path))
+
+            sleep(interval)
+
+    def load(self, bloom_filter):
+        """Copy the bits and n of a filter with the same parameters."""
+        if not isinstance(bloom_filter, BloomFilter):
+            raise BloomFilterError("Only BloomFilters can be loaded.")
+
+        params = (
+            bloom_filter.m,
+            bloom_filter.k,
+            bloom_filter.hash_engine.name,
+            bloom_filter.big_endian,
+            bloom_filter.blocked
+        )
+        own = (
+            self.m,
+            self.k,
+            self.hash_engine.name,
+            self.big_endian,
+            self.blocked
+        )
+
+        if params != own:
+            raise BloomFilterError("Filter parameters don't match.")
+
+        self.bit_array[:] = bloom_filter.bit_array.tobytes()
+        COUNTER.pack_into(self.map, COUNTER_OFFSET, bloom_filter.n)
+
+    def add(self, item):
+        """Add an item to the bloom filter."""
+        self.check_bounds()
+
+        added = bloom_add(
+            self.bit_array,
+            self.hash_engine.hash(item),
+            self.k,
+            self.m,
+            self.big_endian,
+            self.scheme,
+            True
+        )
+
+        if added:
+            atomic_add(self.map, COUNTER_OFFSET, 1)
+
+    def add_many(self, items):
+        """
+        Add several items to the bloom filter.
+
+        Bounds are checked once for the whole batch, which is rejected as a
+        whole if it would take n past max_n.
+        """
+        items = items if isinstance(items, (list, tuple)) else list(items)
+
+        self.check_bounds()
+
+        if self.n + len(items) > self.max_n:
+            raise BloomFilterSizeOverflow(self.error_params)
+
+        added = bloom_add_many(
+            self.bit_array,
+            self.hash_engine.hash_many(items),
+            self.k,
+            self.m,
+            self.big_endian,
+            self.scheme,
+            True
+        )
+
+        if added:
+            atomic_add(self.map, COUNTER_OFFSET, added)
+
+    def close(self):
+        """Unmap the filter."""
+        if self.map is not None:
+            self.bit_array.release()
+            self.map.close()
+            self.map = None
+
+    def unlink(self):
+        """Remove the filter from the host once every process closed it."""
+        remove_or_ignore_file(self.path)
@@ -0,0 +1,344 @@
+"""Bloom filter snapshots.
+
+A snapshot file starts with a preamble and a JSON header holding the
+parameters of the filter, followed by the bytes of every bit array, each
+aligned to a page and covered by an xxh64 checksum. Snapshots are written to
+a temporary file and renamed, so an existing snapshot is only ever replaced
+by a complete one.
+
+Bit arrays are those of bloom filters, or the fingerprint tables of cuckoo
+and xor filters.
+"""
+
+
+from asyncio import CancelledError, ensure_future, get_event_loop, sleep
+from bitarray import bitarray
+from illume import config
+from illume.error import BloomFilterError
+from illume.filter.bloom import BloomFilter
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.scalable import ScalableBloomFilter
+from illume.filter.xor import FrozenFilter, XorFilter
+from illume.log import log
+from illume.util import remove_or_ignore_file
+from json import dumps, loads
+from mmap import mmap, ACCESS_READ
+from os import fstat, fsync, getpid, rename
+from struct import Struct
+from xxhash import xxh64
+
+
+MAGIC = b"ILBS"
+VERSION = 1
+# Magic, version and length of the JSON header.
+PREAMBLE = Struct("=4sHI")
+# Bit arrays start on page boundaries.
+ALIGNMENT = 4096
+
+BLOOM = "bloom"
+SCALABLE = "scalable"
+CUCKOO = "cuckoo"
+XOR = "xor"
+FROZEN = "frozen"
+
+
+def get_filter_params(bloom_filter):
+    """Parameters of a BloomFilter, CuckooFilter or XorFilter."""
+    if isinstance(bloom_filter, CuckooFilter):
+        return {
+            "kind": CUCKOO,
+            "max_n": bloom_filter.max_n,
+            "p": bloom_filter.p,
+            "n": bloom_filter.n,
+            "hash_engine": bloom_filter.hash_engine.name
+        }
+
+    if isinstance(bloom_filter, XorFilter):
+        return {
+            "kind": XOR,
+            "n": bloom_filter.n,
+            "p": bloom_filter.p,
+            "seed": bloom_filter.seed,
+            "hash_engine": bloom_filter.hash_engine.name
+        }
+
+    return {
+        "max_n": bloom_filter.max_n,
+        "p": bloom_filter.p,
+        "n": bloom_filter.n,
+        "m": bloom_filter.m,
+        "k": bloom_filter.k,
+        "hash_engine": bloom_filter.hash_engine.name,
+        "endian": "big" if bloom_filter.big_endian else "little",
+        "blocked": bloom_filter.blocked
+    }
+
+
+def get_block(bloom_filter):
+    """Bytes of the bit array or table of a filter."""
+    if isinstance(bloom_filter, (CuckooFilter, XorFilter)):
+        return bytes(bloom_filter.table)
+
+    return bloom_filter.bit_array.tobytes()
+
+
+def capture(bloom_filter, metadata=None):
+    """
+    Copy the state of a filter.
+
+    Only copies memory, so it is cheap enough to call from the event loop
+    while writing the copy is left to another thread.
+
+    Args:
+        bloom_filter (MembershipFilter): BloomFilter, ScalableBloomFilter,
+            CuckooFilter, XorFilter or FrozenFilter.
+        metadata (dict): JSON serializable data saved along the filter.
+
+    Returns:
+        (dict, list): Header and bytes of every bit array.
+    """
+    if isinstance(bloom_filter, ScalableBloomFilter):
+        filters = bloom_filter.filters
+        header = {
+            "type": SCALABLE,
+            "initial_n": bloom_filter.initial_n,
+            "p": bloom_filter.p,
+            "growth": bloom_filter.growth,
+            "tightening": bloom_filter.tightening,
+            "hash_engine": bloom_filter.hash_engine
+        }
+    elif isinstance(bloom_filter, FrozenFilter):
+        filters = [bloom_filter.frozen, bloom_filter.delta]
+        header = {"type": FROZEN}
+    else:
+        filters = [bloom_filter]
+        header = {"type": bloom_filter.backend}
+
+    header["metadata"] = metadata or {}
+    header["filters"] = [get_filter_params(f) for f in filters]
+
+    return header, [get_block(f) for f in filters]
+
+
+def write_snapshot(path, header, blocks):
+    """Write a captured filter to path, replacing it atomically."""
+    offset = 0
+
+    for params, block in zip(header["filters"], blocks):
+        params["offset"] = offset
+        params["size"] = len(block)
+        params["checksum"] = xxh64(block).intdigest()
+        offset = align(offset + len(block))
+
+    encoded = dumps(header).encode("UTF-8")
+    start = align(PREAMBLE.size + len(encoded))
+    # Processes sharing a filter may save it at the same time.
+    temp_path = "{}.{}.tmp".format(path, getpid())
+
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+            f.write(encoded)
+
+            for params, block in zip(header["filters"], blocks):
+                f.seek(start + params["offset"])
+                f.write(block)
+
+            f.truncate(start + offset)
+            f.flush()
+            fsync(f.fileno())
+
+        rename(temp_path, path)
+    except Exception:
+        remove_or_ignore_file(temp_path)
+        raise
+
+
+def save_snapshot(bloom_filter, path, metadata=None):
+    """Save a filter to path."""
+    header, blocks = capture(bloom_filter, metadata)
+    write_snapshot(path, header, blocks)
+
+
+def load_snapshot(path):
+    """
+    Load a filter saved to path.
+
+    The file is mapped and every bit array checked against its checksum
+    before being copied into the filter.
+
+    Returns:
+        (MembershipFilter, dict): Filter, and the metadata it was saved
+            with.
+    """
+    with open(path, "rb") as f:
+        if fstat(f.fileno()).st_size < PREAMBLE.size:
+            raise BloomFilterError("{} is not a snapshot.".format(path))
+
+        m = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+    with m:
+        magic, version, length = PREAMBLE.unpack_from(m)
+
+        if magic != MAGIC or version != VERSION:
+            raise BloomFilterError("{} is not a snapshot.".format(path))
+
+        header = loads(m[PREAMBLE.size:PREAMBLE.size + length].decode())
+        start = align(PREAMBLE.size + length)
+        filters = [
+            load_filter(path, params, m, start)
+            for params in header["filters"]
+        ]
+
+    if header["type"] == SCALABLE:
+        bloom_filter = ScalableBloomFilter(
+            header["initial_n"],
+            header["p"],
+            header["growth"],
+            header["tightening"],
+            header["hash_engine"],
+            filters
+        )
+    elif header["type"] == FROZEN:
+        bloom_filter = FrozenFilter(*filters)
+    else:
+        bloom_filter, = filters
+
+    return bloom_filter, header["metadata"]
+
+
+def load_filter(path, params, mapping, start):
+    """Load a filter from a snapshot mapping."""
+    begin = start + params["offset"]
+    block = mapping[begin:begin + params["size"]]
+    kind = params.get("kind", BLOOM)
+
+    if (len(block) != params["size"] or
+            xxh64(block).intdigest() != params["checksum"]):
+        raise BloomFilterError("Checksum mismatch in {}.".format(path))
+
+    if kind == CUCKOO:
+        bloom_filter = CuckooFilter(
+            params["max_n"],
+            params["p"],
+            params["hash_engine"],
+            bytearray(block)
+        )
+        bloom_filter.n = params["n"]
+
+        return bloom_filter
+
+    if kind == XOR:
+        return XorFilter(
+            params["n"],
+            params["p"],
+            params["hash_engine"],
+            params["seed"],
+            bytearray(block)
+        )
+
+    bit_array = bitarray(endian=params["endian"])
+    bit_array.frombytes(block)
+    del bit_array[params["m"]:]
+
+    bloom_filter = BloomFilter(
+        params["max_n"],
+        params["p"],
+        params["hash_engine"],
+        bit_array,
+        params.get("blocked", False)
+    )
+
+    if bloom_filter.k != params["k"]:
+        raise BloomFilterError("Parameters mismatch in {}.".format(path))
+
+    bloom_filter.n = params["n"]
+
+    return bloom_filter
+
+
+def align(offset):
+    """Round offset up to ALIGNMENT."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class Snapshotter:
+
+    """
+    Periodically saves filters in the background.
+
+    Filters are captured on the event loop, then written by the default
+    executor so the loop is only held for a memory copy. Filters to which
+    nothing was added since their last snapshot are skipped.
+
+    Args:
+        filters (dict): Filters by snapshot path.
+        interval (float): Seconds between snapshots, defaults to
+            FILTER_BLOOM_SNAPSHOT_SECONDS.
+        metadata (callable): Returns the metadata saved with a snapshot.
+        loop (asyncio.AbstractEventLoop): Event loop.
+    """
+
+    task = None
+
+    def __init__(self, filters, interval=None, metadata=None, loop=None):
+        if interval is None:
+            interval = config.get("FILTER_BLOOM_SNAPSHOT_SECONDS")
+
+        if loop is None:
+            loop = get_event_loop()
+
+        self.filters = filters
+        self.interval = interval
+        self.metadata = metadata or dict
+        self.loop = loop
+        self.saved_n = {}
+
+    def start(self):
+        """Start taking snapshots."""
+        self.task = ensure_future(self.run(), loop=self.loop)
+
+    async def run(self):
+        """Take snapshots every interval seconds."""
+        while True:
+            await sleep(self.interval, loop=self.loop)
+
+            try:
+                await self.snapshot()
+            except (OSError, BloomFilterError) as e:
+                log.error("Bloom filter snapshot failed with {!r}".format(e))
+
+    async def snapshot(self):
+        """Save every filter that changed since its last snapshot."""
+        metadata = self.metadata()
+
+        for path, bloom_filter in self.filters.items():
+            n = bloom_filter.n
+
+            if self.saved_n.get(path, None) == n:
+                continue
+
+            header, blocks = capture(bloom_filter, metadata)
+            await self.loop.run_in_executor(
+                None,
+                write_snapshot,
+                path,
+                header,
+                blocks
+            )
+            self.saved_n[path] = n
+            log.debug("Saved bloom filter snapshot {}".format(path))
+
+    async def stop(self):
+        """Stop taking snapshots and save a last one."""
+        if self.task is not None:
+            self.task.cancel()
+
+            try:
+                await self.task
+            except CancelledError:
+                pass
+
+            self.task = None
+
+        await self.snapshot()
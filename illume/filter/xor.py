@@ -0,0 +1,269 @@
+"""Xor filter.
+
+Implements the xor filter of Graf and Lemire, "Xor Filters: Faster and
+Smaller Than Bloom and Cuckoo Filters", ACM Journal of Experimental
+Algorithmics 25 (2020), over a selectable 64-bit hash engine.
+"""
+
+
+from array import array
+from hashes import sort_unique, xor_build, xor_contains, xor_contains_many
+from illume import config
+from illume.error import BloomFilterError
+from illume.filter.base import MembershipFilter
+from illume.filter.hashing import get_hash_engine
+from illume.util import check_alloc_size
+from itertools import islice
+from math import ceil, log2
+
+
+# Table slots per item, and extra slots, of a xor filter.
+SLOTS_PER_ITEM = 1.23
+EXTRA_SLOTS = 32
+# Seeds tried before giving up on building a filter.
+MAX_SEEDS = 64
+# Bytes past the last fingerprint, see FingerprintTable in hashes.c.
+TABLE_PADDING = 8
+# Items hashed at once while building a filter.
+BATCH_SIZE = 10000
+
+
+def get_fingerprint_size(p):
+    """Compute the fingerprint size in bits of a xor filter."""
+    return min(max(ceil(log2(1 / p)), 1), 32)
+
+
+def get_segment_size(n):
+    """Slots of each of the three segments of a xor filter of n items."""
+    return ceil((SLOTS_PER_ITEM * n + EXTRA_SLOTS) / 3)
+
+
+def get_table_size(segment, f):
+    """Bytes of the table of a xor filter."""
+    return (3 * segment * f + 7) // 8 + TABLE_PADDING
+
+
+class XorFilter(MembershipFilter):
+
+    """
+    Static xor filter over a selectable 64-bit hash engine.
+
+    Holds a frozen set of n items in 1.23 * n f-bit fingerprints, where f
+    is log2(1 / p) rounded up, about 8.6 bits per item at 1% against 9.6
+    for a bloom filter, and a lookup reads three fingerprints. Items can't
+    be added once the filter is built, see build_xor_filter and
+    FrozenFilter.
+
+    Args:
+        n (int): Number of distinct items.
+        p (float): Desired error rate.
+        hash_engine (str): Name of the hash engine, defaults to
+            FILTER_BLOOM_HASH_ENGINE.
+        seed (int): Seed the table was built with.
+        table (bytearray): Existing table, such as one loaded from a
+            snapshot.
+    """
+
+    backend = "xor"
+
+    def __init__(self, n, p, hash_engine=None, seed=0, table=None):
+        if hash_engine is None:
+            hash_engine = config.get("FILTER_BLOOM_HASH_ENGINE")
+
+        self.n = self.max_n = n
+        self.p = p
+        self.f = get_fingerprint_size(p)
+        self.segment = get_segment_size(n)
+        self.seed = seed
+        self.hash_engine = get_hash_engine(hash_engine)
+        size = get_table_size(self.segment, self.f)
+
+        if self.segment >= 2 ** 32:
+            raise BloomFilterError("Xor filters hold at most 2^33 items.")
+
+        if table is None:
+            check_alloc_size(size, "XorFilter.table")
+            table = bytearray(size)
+        elif len(table) != size:
+            err = "Table of {} bytes, {} expected."
+            raise BloomFilterError(err.format(len(table), size))
+
+        self.table = table
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the table."""
+        return len(self.table)
+
+    @property
+    def full(self):
+        """Always full, xor filters are static."""
+        return True
+
+    @property
+    def current_p_float(self):
+        """Current error rate."""
+        return pow(2, -self.f)
+
+    def build(self, hashes):
+        """
+        Build the table from distinct hash values.
+
+        Seeds are tried in turn until one places every value, which takes
+        one or two tries in practice.
+
+        Args:
+            hashes (array.array): n distinct "Q" hash values.
+        """
+        if len(hashes) != self.n:
+            err = "{} hash values, {} expected."
+            raise BloomFilterError(err.format(len(hashes), self.n))
+
+        for seed in range(self.seed, self.seed + MAX_SEEDS):
+            if xor_build(self.table, hashes, self.f, self.segment, seed):
+                self.seed = seed
+                return
+
+        raise BloomFilterError("No seed placed every hash value.")
+
+    def add(self, item):
+        """Xor filters are static."""
+        raise BloomFilterError("Items can't be added to a xor filter.")
+
+    def add_many(self, items):
+        """Xor filters are static."""
+        raise BloomFilterError("Items can't be added to a xor filter.")
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        return xor_contains_many(
+            self.table,
+            self.hash_engine.hash_many(items),
+            self.f,
+            self.segment,
+            self.seed
+        )
+
+    def __contains__(self, item):
+        """Fingerprints of item's slots xor to its fingerprint."""
+        return xor_contains(
+            self.table,
+            self.hash_engine.hash(item),
+            self.f,
+            self.segment,
+            self.seed
+        )
+
+
+def build_xor_filter(items, p, hash_engine=None):
+    """
+    Build a xor filter of an iterable of items.
+
+    Duplicate items are only counted once. Items are hashed in batches into
+    an array of 8 bytes per item, and building takes about 24 more bytes per
+    item on top of the table.
+
+    Args:
+        items (iterable): Items of the filter.
+        p (float): Desired error rate.
+        hash_engine (str): Name of the hash engine, defaults to
+            FILTER_BLOOM_HASH_ENGINE.
+
+    Returns:
+        XorFilter: Built filter.
+    """
+    if hash_engine is None:
+        hash_engine = config.get("FILTER_BLOOM_HASH_ENGINE")
+
+    engine = get_hash_engine(hash_engine)
+    hashes = array("Q")
+    items = iter(items)
+
+    while True:
+        batch = list(islice(items, BATCH_SIZE))
+
+        if not batch:
+            break
+
+        hashes.extend(engine.hash_many(batch))
+
+    del hashes[sort_unique(hashes):]
+
+    xor_filter = XorFilter(len(hashes), p, hash_engine)
+    xor_filter.build(hashes)
+
+    return xor_filter
+
+
+class FrozenFilter(MembershipFilter):
+
+    """
+    Xor filter of a frozen set of items, and a filter of the items added
+    since.
+
+    Lookups check both filters, so the compound error rate is the sum of
+    theirs. Items are added to the delta filter, which overflows once it
+    holds delta.max_n items. Reindexing the filter freezes every item again.
+
+    Args:
+        frozen (XorFilter): Frozen items.
+        delta (MembershipFilter): Items added since frozen was built.
+    """
+
+    backend = "xor"
+
+    def __init__(self, frozen, delta):
+        self.frozen = frozen
+        self.delta = delta
+        self.hash_engine = frozen.hash_engine
+
+    @property
+    def n(self):
+        """Number of items in both filters."""
+        return self.frozen.n + self.delta.n
+
+    @property
+    def max_n(self):
+        """Element size of both filters."""
+        return self.frozen.n + self.delta.max_n
+
+    @property
+    def p(self):
+        """Compound error rate of both filters."""
+        return self.frozen.p + self.delta.p
+
+    @property
+    def nbytes(self):
+        """Bytes taken by both filters."""
+        return self.frozen.nbytes + self.delta.nbytes
+
+    @property
+    def full(self):
+        """Delta filter is full."""
+        return self.delta.full
+
+    def add(self, item):
+        """Add an item to the delta filter."""
+        self.delta.add(item)
+
+    def add_many(self, items):
+        """Add several items to the delta filter."""
+        self.delta.add_many(items)
+
+    def contains_many(self, items):
+        """Check several items, returns a list of booleans."""
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        found = self.frozen.contains_many(items)
+        pending = [i for i, f in enumerate(found) if not f]
+
+        if pending:
+            added = self.delta.contains_many([items[i] for i in pending])
+
+            for i, f in zip(pending, added):
+                found[i] = f
+
+        return found
+
+    def __contains__(self, item):
+        """Item is in either filter."""
+        return item in self.frozen or item in self.delta
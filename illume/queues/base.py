@@ -1,8 +1,10 @@
 """Base classes and methods for generator queues."""
 
 
-from asyncio import Queue, QueueEmpty, as_completed, get_event_loop
+from asyncio import Queue, QueueEmpty, TimeoutError, as_completed
+from asyncio import get_event_loop
 from illume.error import QueueClosed
+from illume.task import timeout as with_timeout
 
 
 class GeneratorQueue:
@@ -11,9 +13,21 @@ class GeneratorQueue:
     Abstract class.
 
     Generator queue.
+
+    Queues with watermarks pause their registered producers once their depth
+    reaches the high watermark, and resume them once it falls to the low
+    watermark. A producer of several queues stays paused until every queue
+    that paused it fell to its low watermark.
+
+    Queues can be consumed in batches with get_many or as a stream with
+    `async for`.
     """
 
     closed = False
+    high_watermark = None
+    low_watermark = None
+    producers = None
+    throttled = False
 
     def __init__(self, get_size=10):
         pass
@@ -30,6 +44,134 @@ class GeneratorQueue:
         """Close queue."""
         raise NotImplementedError
 
+    @property
+    def stopped(self):
+        """Indicate that no more elements will be returned."""
+        return self.closed
+
+    async def get_many(self, max_items, timeout=None):
+        """
+        Get up to max_items elements.
+
+        Only waits, for at most timeout seconds, for the first element and
+        then takes whatever else is available without waiting. Returns an
+        empty list if the timeout expires or the queue stops.
+        """
+        try:
+            if timeout is None:
+                first = await self._get_first()
+            else:
+                first = await with_timeout(
+                    self._get_first(),
+                    timeout,
+                    self._get_loop()
+                )
+        except TimeoutError:
+            return []
+
+        if first is None and self.stopped:
+            return []
+
+        items = [first]
+
+        while len(items) < max_items:
+            try:
+                items.append(self._get_buffered())
+            except QueueEmpty:
+                break
+
+        if self.high_watermark is not None and hasattr(self, "qsize"):
+            await self.throttle(self.qsize())
+
+        return items
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """Get the next element, ending the stream once the queue stops."""
+        if self.stopped:
+            raise StopAsyncIteration
+
+        try:
+            data = await self._get_first()
+        except QueueClosed:
+            raise StopAsyncIteration
+
+        if data is None and self.stopped:
+            raise StopAsyncIteration
+
+        return data
+
+    async def _get_first(self):
+        """Wait for a single element."""
+        return await self.get()
+
+    def _get_buffered(self):
+        """Get an element without waiting or raise QueueEmpty."""
+        raise QueueEmpty()
+
+    def _get_loop(self):
+        """Event loop the queue was created with."""
+        loop = getattr(self, "loop", None) or getattr(self, "_loop", None)
+
+        if loop is None:
+            loop = get_event_loop()
+
+        return loop
+
+    def set_watermarks(self, high, low=None):
+        """Set the depths at which producers are paused and resumed."""
+        if low is None:
+            low = high // 2
+
+        if low > high:
+            raise ValueError("Low watermark exceeds high watermark.")
+
+        self.high_watermark = high
+        self.low_watermark = low
+
+    def add_producer(self, producer):
+        """Register an actor that publishes to this queue."""
+        if self.producers is None:
+            self.producers = []
+
+        self.producers.append(producer)
+
+    async def throttle(self, depth):
+        """Pause or resume producers according to the current depth."""
+        if self.high_watermark is None or not self.producers:
+            return
+
+        if not self.throttled and depth >= self.high_watermark:
+            self.throttled = True
+
+            for producer in self.producers:
+                get_pause_requests(producer).add(self)
+
+                if not producer.paused:
+                    await producer.pause()
+        elif self.throttled and depth <= self.low_watermark:
+            self.throttled = False
+
+            for producer in self.producers:
+                requests = get_pause_requests(producer)
+                requests.discard(self)
+
+                if not requests and producer.paused:
+                    await producer.resume()
+
+
+def get_pause_requests(producer):
+    """Get the queues that want a producer paused, created on first use."""
+    requests = producer.__dict__.get("_pause_requests", None)
+
+    if requests is None:
+        requests = set()
+        producer._pause_requests = requests
+
+    return requests
+
 
 class AsyncQueue(GeneratorQueue):
 
@@ -39,16 +181,23 @@ class AsyncQueue(GeneratorQueue):
     Args:
         get_size (int): Number of elements to return from queue.
         loop (asyncio.AbstractEventLoop): Event loop
+        maxsize (int): Maximum queue size, puts block once reached.
+        high_watermark (int): Depth at which producers are paused.
+        low_watermark (int): Depth at which paused producers are resumed.
     """
 
-    def __init__(self, get_size=10, loop=None):
+    def __init__(self, get_size=10, loop=None, maxsize=0,
+                 high_watermark=None, low_watermark=None):
         self.get_size = get_size
 
         if not loop:
             loop = get_event_loop()
 
         self._loop = loop
-        self.queue = Queue(loop=self._loop)
+        self.queue = Queue(maxsize=maxsize, loop=self._loop)
+
+        if high_watermark is not None:
+            self.set_watermarks(high_watermark, low_watermark)
 
     async def get(self):
         if self.closed:
@@ -59,13 +208,33 @@ class AsyncQueue(GeneratorQueue):
 
     async def _get_single(self):
         """Get single entity from queue."""
-        return await self.queue.get()
+        if self.closed:
+            raise QueueClosed("Can't get items from closed queue")
+
+        data = await self.queue.get()
+
+        await self.throttle(self.queue.qsize())
+
+        return data
+
+    _get_first = _get_single
+
+    def _get_buffered(self):
+        if self.closed:
+            raise QueueClosed("Can't get items from closed queue")
+
+        return self.queue.get_nowait()
+
+    def qsize(self):
+        """Number of queued elements."""
+        return self.queue.qsize()
 
     async def put(self, data):
         if self.closed:
             raise QueueClosed("Can't put item into closed queue.")
 
         await self.queue.put(data)
+        await self.throttle(self.queue.qsize())
 
         return True
 
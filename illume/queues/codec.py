@@ -0,0 +1,155 @@
+"""Message codecs for socket queues."""
+
+
+from collections import OrderedDict
+from json import dumps, loads
+from struct import Struct
+from sys import version_info
+from zlib import compress, decompress
+import marshal
+
+
+# Frame header of length-prefixed messages, payload length and frame type.
+FRAME_HEADER = Struct("!IB")
+# Frame carrying a message encoded with the codec.
+FRAME_DATA = 0
+# Frame a client sends to acknowledge messages it finished.
+FRAME_ACK = 1
+# Payload of acknowledgement frames, the number of finished messages.
+ACK_RECORD = Struct("!I")
+# Key of the handshake message used to agree on a codec.
+HANDSHAKE_KEY = "__illume_codecs__"
+# Key of the handshake reply asking clients to acknowledge messages.
+ACK_KEY = "__illume_ack__"
+# Prefix of the names of codecs whose payloads are zlib compressed.
+COMPRESSED_PREFIX = "zlib+"
+
+
+class Codec:
+
+    """
+    Abstract class.
+
+    Serializes messages to and from bytes.
+
+    Args:
+        encoding_type (str): Text encoding used by text based codecs.
+    """
+
+    name = None
+
+    def __init__(self, encoding_type="UTF-8"):
+        self.encoding_type = encoding_type
+
+    def encode(self, data):
+        """Serialize data into bytes."""
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """Deserialize data from bytes."""
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+
+    """JSON codec, understood by every peer."""
+
+    name = "json"
+
+    def encode(self, data):
+        return dumps(data).encode(self.encoding_type)
+
+    def decode(self, payload):
+        data = payload.decode(self.encoding_type)
+
+        return loads(data.strip()) if data else None
+
+
+class MarshalCodec(Codec):
+
+    """
+    Compact binary codec using the marshal format.
+
+    Marshal only supports builtin types and its format is only guaranteed
+    to be read back by the same interpreter version, so the format version
+    and the Python version are part of the codec name and peers running
+    another version fall back to JSON. Only meant for trusted local peers.
+
+    Unlike JSONCodec, tuples, sets, bytes and non-string keys come back as
+    they were sent, where JSON turns tuples into lists and keys into
+    strings. Messages should stick to JSON types to decode the same with
+    either codec.
+    """
+
+    name = "marshal-{}-py{}.{}".format(marshal.version, *version_info[:2])
+
+    def encode(self, data):
+        return marshal.dumps(data, marshal.version)
+
+    def decode(self, payload):
+        return marshal.loads(payload)
+
+
+class CompressedCodec(Codec):
+
+    """
+    Compresses the payloads of another codec with zlib.
+
+    Args:
+        codec (illume.queues.codec.Codec): Codec of the uncompressed data.
+        level (int): zlib compression level.
+    """
+
+    def __init__(self, codec, level=6):
+        self.codec = codec
+        self.level = level
+        self.name = COMPRESSED_PREFIX + codec.name
+
+        super().__init__(codec.encoding_type)
+
+    def encode(self, data):
+        return compress(self.codec.encode(data), self.level)
+
+    def decode(self, payload):
+        return self.codec.decode(decompress(payload))
+
+
+# Codecs offered during the handshake, most preferred first.
+CODECS = OrderedDict((c.name, c) for c in (MarshalCodec, JSONCodec))
+
+
+def uncompressed_name(name):
+    """Name of a codec without its compression prefix."""
+    if name.startswith(COMPRESSED_PREFIX):
+        return name[len(COMPRESSED_PREFIX):]
+
+    return name
+
+
+def get_codec(name, encoding_type="UTF-8"):
+    """Instantiate a codec by name, falling back to JSON if unknown."""
+    base = uncompressed_name(name)
+
+    if base != name:
+        return CompressedCodec(get_codec(base, encoding_type))
+
+    return CODECS.get(name, JSONCodec)(encoding_type)
+
+
+def choose_codec(offered, accepted=CODECS):
+    """
+    Pick the first offered codec name that is accepted locally.
+
+    Args:
+        offered (list): Codec names offered by the peer, preferred first.
+        accepted (iterable): Names of the codecs that may be used, without
+            compression prefix.
+
+    Returns:
+        str: Chosen codec name, JSON if none of the offered is accepted.
+    """
+    for name in offered:
+        if uncompressed_name(name) in accepted:
+            return name
+
+    return JSONCodec.name
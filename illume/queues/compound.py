@@ -1,23 +1,66 @@
 """Compound queue"""
 
 
-from asyncio import wait, Event
+from asyncio import wait, Event, Queue, QueueEmpty, TimeoutError
+from asyncio import CancelledError, ensure_future
+from illume import config
 from illume.error import QueueError
+from illume.log import log
 from illume.queues.base import GeneratorQueue
-from illume.task import dies_on_stop_event
+from illume.task import close_stop_watcher, dies_on_stop_event, timeout
+from zlib import crc32
 
 
 class CompoundQueue(GeneratorQueue):
+
+    """
+    Queue composed of several child queues.
+
+    Without a route, puts are broadcast to every child queue through one
+    long lived writer task per child, each fed by a bounded queue, and wait
+    until every child took the message. With a
+    route, every message goes to exactly one child chosen by a stable hash
+    of its route field, so messages of e.g. one domain always reach the same
+    child. Gets read from a single stream merging all children, fed by one
+    reader task per child.
+
+    A broadcast raises the first error a child raised while taking its
+    messages. Broadcast messages still buffered after flushing for
+    stop_timeout seconds at stop are dropped and counted in `dropped`.
+
+    Args:
+        queues (list): Child queues.
+        loop (asyncio.AbstractEventLoop): Event loop.
+        route (str): Message field to partition by, broadcast if None.
+        feed_size (int): Broadcast messages buffered per child.
+        stop_timeout (float): Seconds to flush broadcasts for at stop.
+    """
+
     stop_event = None
     ready = None
     loop = None
     queues = None
+    merged = None
+    readers = None
+    feeds = None
+    writers = None
+    dropped = 0
+
+    def __init__(self, queues, loop, route=None, feed_size=None,
+                 stop_timeout=None):
+        if feed_size is None:
+            feed_size = config.get("QUEUE_BROADCAST_FEED_SIZE")
+
+        if stop_timeout is None:
+            stop_timeout = config.get("QUEUE_BROADCAST_STOP_SECONDS")
 
-    def __init__(self, queues, loop):
         self.ready = Event(loop=loop)
         self.stop_event = Event(loop=loop)
         self.queues = queues
         self.loop = loop
+        self.route = route
+        self.feed_size = feed_size
+        self.stop_timeout = stop_timeout
 
     async def start(self):
         if self.stop_event.is_set():
@@ -26,15 +69,141 @@ class CompoundQueue(GeneratorQueue):
         await self.do_action("start")
         self.ready.set()
 
+    @property
+    def stopped(self):
+        """Indicate that the queue has been stopped."""
+        return self.stop_event.is_set()
+
     @dies_on_stop_event
     async def get(self):
-        raise NotImplementedError()
+        """Get the next message from any child queue."""
+        await self.setup()
+        self.start_readers()
+
+        return await self.merged.get()
+
+    def _get_buffered(self):
+        if self.merged is None:
+            raise QueueEmpty()
+
+        return self.merged.get_nowait()
+
+    def start_readers(self):
+        """Start streaming every child queue into the merged queue."""
+        if self.merged is not None:
+            return
+
+        self.merged = Queue(loop=self.loop)
+        self.readers = [
+            ensure_future(self.read(queue), loop=self.loop)
+            for queue in self.queues
+        ]
+
+    async def read(self, queue):
+        """Forward messages of a child queue into the merged queue."""
+        async for data in queue:
+            await self.merged.put(data)
 
     @dies_on_stop_event
     async def put(self, data):
         await self.setup()
         await self.ready.wait()
-        await self.do_action("put", (data,))
+
+        if self.route is not None:
+            await self.queues[self.partition(data)].put(data)
+            return
+
+        await self.broadcast([data])
+
+    @dies_on_stop_event
+    async def put_many(self, items):
+        """Put several messages, routed ones are grouped per child."""
+        await self.setup()
+        await self.ready.wait()
+
+        if self.route is None:
+            await self.broadcast(items)
+            return
+
+        batches = {}
+
+        for data in items:
+            batches.setdefault(self.partition(data), []).append(data)
+
+        for index, batch in batches.items():
+            queue = self.queues[index]
+
+            if hasattr(queue, "put_many"):
+                await queue.put_many(batch)
+            else:
+                for data in batch:
+                    await queue.put(data)
+
+    def partition(self, data):
+        """Index of the child queue a message is routed to."""
+        key = data.get(self.route, "") if isinstance(data, dict) else ""
+
+        return crc32(str(key).encode("UTF-8")) % len(self.queues)
+
+    def start_writers(self):
+        """Start one writer task per child queue for broadcasts."""
+        if self.feeds is not None:
+            return
+
+        self.feeds = [
+            Queue(maxsize=self.feed_size, loop=self.loop)
+            for queue in self.queues
+        ]
+        self.writers = [
+            ensure_future(self.write(queue, feed), loop=self.loop)
+            for queue, feed in zip(self.queues, self.feeds)
+        ]
+
+    async def broadcast(self, items):
+        """Put messages into every child queue and wait until they did."""
+        self.start_writers()
+        delivered = []
+
+        for data in items:
+            for feed in self.feeds:
+                done = self.loop.create_future()
+                await feed.put((data, done))
+                delivered.append(done)
+
+        if not delivered:
+            return
+
+        await wait(delivered, loop=self.loop)
+
+        for done in delivered:
+            if done.cancelled():
+                raise QueueError("Broadcast cancelled before delivery.")
+            elif done.exception() is not None:
+                raise done.exception()
+
+    async def write(self, queue, feed):
+        """Forward broadcast messages from a feed into a child queue."""
+        while True:
+            data, done = await feed.get()
+
+            try:
+                await queue.put(data)
+            except CancelledError:
+                done.cancel()
+                raise
+            except Exception as e:
+                if not done.done():
+                    done.set_exception(e)
+            else:
+                if not done.done():
+                    done.set_result(None)
+            finally:
+                feed.task_done()
+
+    async def flush(self):
+        """Wait until broadcast messages reached every child queue."""
+        for feed in self.feeds or ():
+            await feed.join()
 
     async def setup(self):
         """Setup the client."""
@@ -43,11 +212,33 @@ class CompoundQueue(GeneratorQueue):
 
     async def stop(self):
         """Stop queue."""
+        try:
+            await timeout(self.flush(), self.stop_timeout, self.loop)
+        except TimeoutError:
+            dropped = sum(feed.qsize() for feed in self.feeds)
+            self.dropped += dropped
+            log.warning("Dropping {} broadcast messages of stopped queue."
+                        .format(dropped))
+
         self.ready.clear()
         self.stop_event.set()
+        await close_stop_watcher(self)
+        tasks = (self.readers or []) + (self.writers or [])
+
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            await wait(tasks, loop=self.loop)
 
         await self.do_action("stop")
 
+    def add_producer(self, producer):
+        """Register a producer with every child queue."""
+        for queue in self.queues:
+            if hasattr(queue, "add_producer"):
+                queue.add_producer(producer)
+
     async def do_action(self, name, args=()):
         coroutines = [getattr(i, name) for i in self.queues]
         tasks = [i(*args) for i in coroutines]
@@ -0,0 +1,221 @@
+"""Per-host politeness queue."""
+
+
+from asyncio import Event, QueueEmpty, Semaphore, TimeoutError
+from asyncio import get_event_loop
+from collections import Counter
+from heapq import heappush, heappop
+from illume.error import QueueClosed
+from illume.queues.base import GeneratorQueue
+from illume.task import timeout
+
+
+class HostQueue(GeneratorQueue):
+
+    """
+    Queue that keeps the messages of each domain in priority order and hands
+    out the earliest eligible host first.
+
+    A host becomes eligible `delay` seconds after its last message was handed
+    out, and only while fewer than `concurrency` of its messages are still
+    being worked on. Consumers must call release() with the domain of every
+    message they get once they are done with it.
+
+    Messages of a host are handed out by priority as in FetchPriorityHeap, a
+    message waits behind at most `aging` messages of the host for each level
+    of priority it is behind.
+
+    Args:
+        delay (float): Minimum seconds between two messages of one host.
+        concurrency (int): Maximum messages of one host being worked on.
+        maxsize (int): Maximum queued messages, puts block once reached.
+        loop (asyncio.AbstractEventLoop): Event loop.
+        key (str): Message field holding the priority.
+        default (int): Priority of messages without the key.
+        aging (int): Number of messages a priority level is worth.
+    """
+
+    def __init__(self, delay=1, concurrency=1, maxsize=0, loop=None,
+                 key="fetch_priority", default=5, aging=1000):
+        if not loop:
+            loop = get_event_loop()
+
+        self.delay = delay
+        self.concurrency = concurrency
+        self.key = key
+        self.default = default
+        self.aging = aging
+        self.size = 0
+        self.sequence = 0
+        self.received = 0
+        # Domain -> min-heap of (rank, received, message) of queued messages.
+        self.hosts = {}
+        # Domain -> messages handed out and not yet released.
+        self.active = Counter()
+        # Domain -> earliest loop time its next message may be handed out.
+        self.next_allowed = {}
+        # Min-heap of (next allowed time, domain) of forgotten hosts.
+        self.expiring = []
+        # Min-heap of (next allowed time, sequence, domain) of eligible hosts.
+        self.schedule = []
+        self.scheduled = set()
+        self._loop = loop
+        self._wakeup = Event(loop=loop)
+        self._space = Semaphore(maxsize, loop=loop) if maxsize else None
+
+    def qsize(self):
+        """Number of queued messages."""
+        return self.size
+
+    @property
+    def depths(self):
+        """Number of queued messages per domain."""
+        return {domain: len(queue) for domain, queue in self.hosts.items()}
+
+    async def put(self, data):
+        """Queue a message under its domain."""
+        if self.closed:
+            raise QueueClosed("Can't put item into closed queue.")
+
+        if self._space is not None:
+            await self._space.acquire()
+
+        domain = data['domain']
+        queue = self.hosts.get(domain, None)
+
+        if queue is None:
+            queue = self.hosts[domain] = []
+
+        self.received += 1
+        rank = self.received + data.get(self.key, self.default) * self.aging
+        heappush(queue, (rank, self.received, data))
+        self.size += 1
+        self._prune(self._loop.time())
+        self._schedule(domain)
+
+        await self.throttle(self.size)
+
+        return True
+
+    async def get(self):
+        """Wait for the earliest eligible host and get its next message."""
+        while True:
+            if self.closed:
+                raise QueueClosed("Can't get items from closed queue")
+
+            now = self._loop.time()
+
+            if self.schedule and self.schedule[0][0] <= now:
+                data = self._take(now)
+                await self.throttle(self.size)
+
+                return data
+
+            self._wakeup.clear()
+
+            if not self.schedule:
+                await self._wakeup.wait()
+                continue
+
+            try:
+                await timeout(
+                    self._wakeup.wait(),
+                    self.schedule[0][0] - now,
+                    self._loop
+                )
+            except TimeoutError:
+                pass
+
+    def _get_buffered(self):
+        """Get a message of an eligible host without waiting."""
+        if self.closed:
+            raise QueueClosed("Can't get items from closed queue")
+
+        now = self._loop.time()
+
+        if not self.schedule or self.schedule[0][0] > now:
+            raise QueueEmpty()
+
+        return self._take(now)
+
+    def release(self, domain):
+        """Mark a message of a domain as done."""
+        self.active[domain] -= 1
+
+        if self.active[domain] <= 0:
+            del self.active[domain]
+
+        self._schedule(domain)
+
+    def close(self):
+        self.hosts = None
+        self.schedule = None
+        self.closed = True
+        self._wakeup.set()
+
+    def _take(self, now):
+        """Pop the next message of the host at the top of the schedule."""
+        allowed, sequence, domain = heappop(self.schedule)
+        self.scheduled.discard(domain)
+
+        queue = self.hosts[domain]
+        rank, received, data = heappop(queue)
+        self.size -= 1
+
+        if not queue:
+            del self.hosts[domain]
+
+        self.active[domain] += 1
+        self.next_allowed[domain] = now + self.delay
+
+        if self._space is not None:
+            self._space.release()
+
+        self._prune(now)
+        self._schedule(domain)
+
+        return data
+
+    def _schedule(self, domain):
+        """Put a host on the schedule if it is eligible and not on it yet."""
+        if domain in self.scheduled or self.closed:
+            return
+
+        queue = self.hosts.get(domain, None)
+
+        if not queue:
+            if not self.active[domain]:
+                self._forget(domain)
+
+            return
+
+        if self.active[domain] >= self.concurrency:
+            return
+
+        self.sequence += 1
+        allowed = self.next_allowed.get(domain, 0)
+
+        heappush(self.schedule, (allowed, self.sequence, domain))
+        self.scheduled.add(domain)
+        self._wakeup.set()
+
+    def _forget(self, domain):
+        """Drop bookkeeping of an idle host."""
+        self.hosts.pop(domain, None)
+        self.active.pop(domain, None)
+        allowed = self.next_allowed.get(domain, 0)
+
+        if allowed <= self._loop.time():
+            self.next_allowed.pop(domain, None)
+        else:
+            # Keep the delay until it expires, see _prune.
+            heappush(self.expiring, (allowed, domain))
+
+    def _prune(self, now):
+        """Drop delays of forgotten hosts that expired."""
+        while self.expiring and self.expiring[0][0] <= now:
+            allowed, domain = heappop(self.expiring)
+
+            if (domain not in self.hosts and domain not in self.active and
+                    self.next_allowed.get(domain, None) == allowed):
+                del self.next_allowed[domain]
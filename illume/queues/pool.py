@@ -48,13 +48,13 @@ class PooledActor:
 
     async def on_message(self, message):
         """Handle incoming message."""
-        await self.actor.on_message(message)
-
+        await self.actor.handle(message)
 
     async def stop(self):
-        """Stop pooled actor."""
+        """Stop pooled actor, handling the messages it batched first."""
+        await self.actor.flush_batch()
         await self.actor.stop()
-        await self.actor.on_stop()
+        await self.actor.finalize()
         await self.pooled_queue.stop()
 
 
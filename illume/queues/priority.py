@@ -0,0 +1,194 @@
+"""Priority queues ordered by fetch_priority."""
+
+
+from asyncio import Queue, ensure_future, get_event_loop
+from collections import Counter
+from heapq import heappush, heappop
+from illume import config
+from illume.error import QueueClosed
+from illume.log import log
+from illume.queues.base import GeneratorQueue
+from illume.queues.unix import PooledUnixSocketServerQueue
+
+
+class FetchPriorityHeap(Queue):
+
+    """
+    Asyncio queue that dequeues messages by priority in O(log n).
+
+    Messages are ordered by sequence + priority * aging, so a message waits
+    behind at most `aging` messages of a higher priority for each level of
+    priority it is behind. Lower priorities therefore cannot starve.
+
+    Args:
+        maxsize (int): Maximum queue size, puts block once reached.
+        key (str): Message field holding the priority.
+        default (int): Priority of messages without the key.
+        aging (int): Number of messages a priority level is worth.
+        loop (asyncio.AbstractEventLoop): Event loop.
+    """
+
+    def __init__(self, maxsize=0, key="fetch_priority", default=5, aging=1000,
+                 loop=None):
+        self.key = key
+        self.default = default
+        self.aging = aging
+        self.sequence = 0
+        self.depths = Counter()
+
+        super().__init__(maxsize=maxsize, loop=loop)
+
+    def _init(self, maxsize):
+        self._queue = []
+
+    def _put(self, item):
+        priority = item.get(self.key, self.default)
+        self.sequence += 1
+        rank = self.sequence + priority * self.aging
+
+        heappush(self._queue, (rank, self.sequence, priority, item))
+        self.depths[priority] += 1
+
+    def _get(self):
+        rank, sequence, priority, item = heappop(self._queue)
+        self.depths[priority] -= 1
+
+        if not self.depths[priority]:
+            del self.depths[priority]
+
+        return item
+
+
+class PriorityAsyncQueue(GeneratorQueue):
+
+    """
+    Implements the GeneratorQueue interface with a fetch priority heap.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Event loop.
+        maxsize (int): Maximum queue size, puts block once reached.
+        key (str): Message field holding the priority.
+        default (int): Priority of messages without the key.
+        aging (int): Number of messages a priority level is worth.
+    """
+
+    def __init__(self, loop=None, maxsize=0, key="fetch_priority", default=5,
+                 aging=1000):
+        if not loop:
+            loop = get_event_loop()
+
+        self._loop = loop
+        self.queue = FetchPriorityHeap(
+            maxsize=maxsize,
+            key=key,
+            default=default,
+            aging=aging,
+            loop=loop
+        )
+
+    @property
+    def depths(self):
+        """Number of queued messages per priority."""
+        return dict(self.queue.depths)
+
+    def qsize(self):
+        """Number of queued messages."""
+        return self.queue.qsize()
+
+    async def get(self):
+        """Get the highest priority message, waiting if none is queued."""
+        if self.closed:
+            raise QueueClosed("Can't get items from closed queue")
+
+        data = await self.queue.get()
+        await self.throttle(self.queue.qsize())
+
+        return data
+
+    def get_nowait(self):
+        """Get the highest priority message or raise QueueEmpty."""
+        if self.closed:
+            raise QueueClosed("Can't get items from closed queue")
+
+        return self.queue.get_nowait()
+
+    _get_buffered = get_nowait
+
+    async def put(self, data):
+        if self.closed:
+            raise QueueClosed("Can't put item into closed queue.")
+
+        await self.queue.put(data)
+        await self.throttle(self.queue.qsize())
+
+        return True
+
+    def close(self):
+        self.queue = None
+        self.closed = True
+
+
+class PooledUnixSocketPriorityServerQueue(PooledUnixSocketServerQueue):
+
+    """
+    Unix socket server queue that hands messages to its actor by priority.
+
+    Messages read from every connection are pushed onto a priority queue and
+    a single dispatcher feeds the pooled actor from it. Once the queue is full
+    connections stop reading, which pushes back on the writers.
+
+    Args:
+        path (str): Path to listen on.
+        loop (asyncio.AbstractEventLoop): Event loop.
+    """
+
+    dispatcher = None
+
+    def __init__(self, path, loop):
+        super().__init__(path, loop)
+
+        self.frontier = PriorityAsyncQueue(
+            loop=loop,
+            maxsize=config.get("FRONTIER_QUEUE_MAX_SIZE"),
+            default=config.get("FRONTIER_DEFAULT_PRIORITY"),
+            aging=config.get("FRONTIER_PRIORITY_AGING")
+        )
+
+    @property
+    def depths(self):
+        """Number of queued messages per priority."""
+        return self.frontier.depths
+
+    def start(self):
+        """Start server and dispatcher."""
+        self.dispatcher = ensure_future(self.dispatch(), loop=self.loop)
+
+        super().start()
+
+    async def on_message(self, message):
+        """Queue a message read from a connection."""
+        await self.frontier.put(message)
+
+    async def dispatch(self):
+        """Feed the pooled actor from the priority queue."""
+        while not self.stop_event.is_set():
+            message = await self.frontier.get()
+
+            try:
+                await self.pooled_actor.on_message(message)
+            except Exception as e:
+                log.error("Dispatch of {} failed with {!r}".format(message, e))
+
+    async def stop(self):
+        """Stop server and dispatcher."""
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+
+        await super().stop()
+
+    def get_connection(self, reader, writer):
+        """Get a connection that queues messages on this server."""
+        connection = super().get_connection(reader, writer)
+        connection.pooled_actor = self
+
+        return connection
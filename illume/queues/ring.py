@@ -0,0 +1,508 @@
+"""Shared memory ring buffer queues."""
+
+
+from asyncio import Event, QueueEmpty, new_event_loop, get_event_loop, sleep
+from fcntl import lockf, LOCK_EX, LOCK_NB, LOCK_SH, LOCK_UN
+from illume import config
+from illume.error import QueueClosed, QueueError
+from illume.log import log
+from illume.queues.base import GeneratorQueue
+from illume.queues.codec import CODECS, get_codec
+from illume.queues.pool import PooledQueue, PooledActor
+from illume.util import get_temp_file_name, remove_or_ignore_file
+from mmap import mmap
+from os import O_CREAT, O_RDWR, close, fstat, ftruncate, open as os_open
+from os import rename
+from platform import machine
+from struct import Struct
+
+
+MAGIC = b"ILRB"
+# Magic, lane count, lane size and codec name.
+HEADER = Struct("=4sII32s")
+HEADER_SIZE = 64
+# Head and tail counters of a lane sit on separate cache lines.
+COUNTER = Struct("=Q")
+TAIL_OFFSET = 64
+CONTROL_SIZE = 128
+RECORD = Struct("=I")
+# Record length marking that the rest of the lane is padding.
+WRAP = 0xFFFFFFFF
+# First delay when polling an empty or full ring.
+MIN_POLL_SECONDS = 0.0001
+# Lane sizes are a multiple of this, so that counters stay aligned.
+LANE_ALIGNMENT = COUNTER.size
+# Machines whose stores become visible to other cores in program order.
+TOTAL_STORE_ORDER = {"x86_64", "amd64", "i386", "i486", "i586", "i686", "x86"}
+
+# (path, lane) claimed by this process, lockf locks are per process.
+_claimed = set()
+# Paths of rings this process consumes, it can't test its own locks.
+_consumed = set()
+
+
+def check_store_order():
+    """Raise QueueError unless the machine keeps stores in program order."""
+    if machine().lower() not in TOTAL_STORE_ORDER:
+        err = "Ring buffers need x86 store ordering, {} is not supported."
+        raise QueueError(err.format(machine()))
+
+
+class RingBuffer:
+
+    """
+    Multi-producer, single-consumer ring buffer in a shared file mapping.
+
+    The mapping is split into lanes, each a single-producer ring with its own
+    head and tail counter. A producer claims a free lane by locking its
+    control block, a lock the kernel drops when the process exits, and is
+    then the only writer of that lane's tail. The consumer is the only writer
+    of every head and reads the lanes in turn. Counters only grow, so once a
+    lane is claimed no locks or syscalls are needed to write or read.
+
+    Records are published by storing the tail after the payload. Python
+    offers no memory barriers, so this relies on stores becoming visible to
+    other cores in program order as they do on x86. Other machines, such as
+    ARM, may show the new tail before the payload, and rings refuse to open
+    there.
+
+    Lane locks are lockf locks, which belong to the process: closing any
+    descriptor of the file drops every lock the process holds on it. Rings
+    of one process therefore keep track of the lanes they claimed, and a
+    process should not open the file of a ring it writes to through any
+    other means.
+
+    Args:
+        path (str): Path of the mapped file.
+        fd (int): File descriptor of the mapped file.
+        mapping (mmap.mmap): Mapping of the file.
+    """
+
+    lane = None
+    consumer = False
+
+    def __init__(self, path, fd, mapping):
+        magic, lanes, lane_size, codec = HEADER.unpack_from(mapping)
+
+        if magic != MAGIC:
+            raise QueueError("{} is not a ring buffer.".format(path))
+
+        self.path = path
+        self.fd = fd
+        self.map = mapping
+        self.lanes = lanes
+        self.lane_size = lane_size
+        self.codec = codec.rstrip(b'\0').decode("ascii")
+        self.next_lane = 0
+
+    @property
+    def max_payload(self):
+        """Largest payload that fits in a lane whatever its state."""
+        return self.lane_size // 2 - RECORD.size
+
+    @classmethod
+    def create(cls, path, lanes, lane_size, codec):
+        """Create and map a ring buffer as its consumer."""
+        check_store_order()
+
+        if lane_size <= 0 or lane_size % LANE_ALIGNMENT:
+            err = "Lane size {} is not a positive multiple of {}."
+            raise QueueError(err.format(lane_size, LANE_ALIGNMENT))
+
+        temp_path = path + ".tmp"
+        size = HEADER_SIZE + lanes * (CONTROL_SIZE + lane_size)
+        fd = os_open(temp_path, O_RDWR | O_CREAT, 0o600)
+
+        try:
+            ftruncate(fd, size)
+            mapping = mmap(fd, size)
+            HEADER.pack_into(
+                mapping,
+                0,
+                MAGIC,
+                lanes,
+                lane_size,
+                codec.encode("ascii")
+            )
+            lockf(fd, LOCK_EX | LOCK_NB, HEADER_SIZE, 0)
+            # Producers only ever see an initialized file.
+            rename(temp_path, path)
+        except Exception:
+            close(fd)
+            remove_or_ignore_file(temp_path)
+            raise
+
+        ring = cls(path, fd, mapping)
+        ring.consumer = True
+        _consumed.add(path)
+
+        return ring
+
+    @classmethod
+    def open(cls, path):
+        """Map an existing ring buffer as a producer."""
+        check_store_order()
+        fd = os_open(path, O_RDWR)
+
+        try:
+            return cls(path, fd, mmap(fd, fstat(fd).st_size))
+        except Exception:
+            close(fd)
+            raise
+
+    def claim(self):
+        """Claim a lane no other producer writes to."""
+        for lane in range(self.lanes):
+            if (self.path, lane) in _claimed:
+                continue
+
+            try:
+                lockf(self.fd, LOCK_EX | LOCK_NB, 1, self._offset(lane))
+            except OSError:
+                continue
+
+            _claimed.add((self.path, lane))
+            self.lane = lane
+
+            return lane
+
+        err = "All {} lanes of {} are in use."
+        raise QueueError(err.format(self.lanes, self.path))
+
+    def write(self, payload):
+        """Append a payload to the claimed lane, False if it is full."""
+        length = len(payload)
+        base = self._offset(self.lane)
+        data = base + CONTROL_SIZE
+        head, = COUNTER.unpack_from(self.map, base)
+        tail, = COUNTER.unpack_from(self.map, base + TAIL_OFFSET)
+        start = tail % self.lane_size
+        contiguous = self.lane_size - start
+        needed = RECORD.size + length
+        padding = contiguous if contiguous < needed else 0
+
+        if tail + padding + needed - head > self.lane_size:
+            return False
+
+        if padding:
+            if contiguous >= RECORD.size:
+                RECORD.pack_into(self.map, data + start, WRAP)
+
+            start = 0
+
+        begin = data + start + RECORD.size
+        RECORD.pack_into(self.map, data + start, length)
+        self.map[begin:begin + length] = payload
+        COUNTER.pack_into(
+            self.map,
+            base + TAIL_OFFSET,
+            tail + padding + needed
+        )
+
+        return True
+
+    def read(self):
+        """Read the next payload, taking lanes in turn, None if empty."""
+        for n in range(self.lanes):
+            lane = (self.next_lane + n) % self.lanes
+            payload = self._read_lane(lane)
+
+            if payload is not None:
+                self.next_lane = (lane + 1) % self.lanes
+
+                return payload
+
+        return None
+
+    def close(self):
+        """
+        Unmap the ring buffer and drop its locks.
+
+        This drops the locks of every ring of this process on the same file,
+        their lanes stay claimed within the process only.
+        """
+        _claimed.discard((self.path, self.lane))
+
+        if self.consumer:
+            _consumed.discard(self.path)
+
+        self.map.close()
+        close(self.fd)
+
+    def consumer_alive(self):
+        """
+        Indicate that the consumer still has the ring open.
+
+        A consumer that closed the ring removed its file, one that died
+        lost the lock on the header it holds while running.
+        """
+        if fstat(self.fd).st_nlink == 0:
+            return False
+        elif self.path in _consumed:
+            return True
+
+        try:
+            lockf(self.fd, LOCK_SH | LOCK_NB, HEADER_SIZE, 0)
+        except OSError:
+            return True
+
+        lockf(self.fd, LOCK_UN, HEADER_SIZE, 0)
+
+        return False
+
+    def _read_lane(self, lane):
+        """Read the next payload of a lane."""
+        base = self._offset(lane)
+        data = base + CONTROL_SIZE
+        head, = COUNTER.unpack_from(self.map, base)
+        tail, = COUNTER.unpack_from(self.map, base + TAIL_OFFSET)
+
+        while head < tail:
+            start = head % self.lane_size
+            contiguous = self.lane_size - start
+
+            if contiguous >= RECORD.size:
+                length, = RECORD.unpack_from(self.map, data + start)
+
+                if length != WRAP:
+                    begin = data + start + RECORD.size
+                    payload = self.map[begin:begin + length]
+                    head += RECORD.size + length
+                    COUNTER.pack_into(self.map, base, head)
+
+                    return payload
+
+            head += contiguous
+
+        return None
+
+    def _offset(self, lane):
+        """Offset of the control block of a lane."""
+        return HEADER_SIZE + lane * (CONTROL_SIZE + self.lane_size)
+
+
+class SharedMemoryQueue(GeneratorQueue):
+
+    """
+    Queue between processes of a host backed by a RingBuffer.
+
+    The process that calls create() consumes messages, every process that
+    puts claims a lane of its own on start. Waiting on an empty or full ring
+    is done by polling with a backoff of up to poll_interval seconds. Place
+    the path on a tmpfs such as /dev/shm to keep pages from being written
+    back to disk.
+
+    Args:
+        path (str): Path of the ring buffer file.
+        loop (asyncio.AbstractEventLoop): Event loop.
+        lanes (int): Maximum number of producers.
+        lane_size (int): Size in bytes of the ring of each producer.
+        connect_retries (int): Attempts to open the ring before giving up.
+    """
+
+    ring = None
+    codec = None
+
+    def __init__(self, path, loop=None, lanes=None, lane_size=None,
+                 connect_retries=3):
+        if loop is None:
+            loop = get_event_loop()
+
+        if lanes is None:
+            lanes = config.get("QUEUE_RING_LANES")
+
+        if lane_size is None:
+            lane_size = config.get("QUEUE_RING_LANE_SIZE")
+
+        self.path = path
+        self.loop = loop
+        self.lanes = lanes
+        self.lane_size = lane_size
+        self.connect_retries = connect_retries
+        self.poll_interval = config.get("QUEUE_RING_POLL_SECONDS")
+        self.encoding_type = config.get("QUEUE_ENCODING_TYPE")
+        self.consumer = False
+        self.ready = Event(loop=loop)
+        self.stop_event = Event(loop=loop)
+
+    def create(self):
+        """Create the ring buffer and consume from it."""
+        name = next(iter(CODECS))
+        self.ring = RingBuffer.create(
+            self.path,
+            self.lanes,
+            self.lane_size,
+            name
+        )
+        self.codec = get_codec(name, self.encoding_type)
+        self.consumer = True
+        self.ready.set()
+
+    async def start(self):
+        """Open the ring buffer and claim a lane to put into."""
+        if self.stop_event.is_set():
+            raise QueueError("Ring already stopped.")
+
+        for n in range(self.connect_retries):
+            try:
+                ring = RingBuffer.open(self.path)
+            except FileNotFoundError:
+                await sleep(n, loop=self.loop)
+            else:
+                break
+        else:
+            raise FileNotFoundError(self.path)
+
+        try:
+            ring.claim()
+        except QueueError:
+            ring.close()
+            raise
+
+        self.ring = ring
+        self.codec = get_codec(ring.codec, self.encoding_type)
+        log.debug("Writing to lane {} of ring {}".format(ring.lane, self.path))
+        self.ready.set()
+
+    async def setup(self):
+        """Start the queue if it was not started yet."""
+        if not self.ready.is_set():
+            await self.start()
+
+    @property
+    def stopped(self):
+        """Indicate that the queue was stopped."""
+        return self.closed or self.stop_event.is_set()
+
+    async def put(self, data):
+        """
+        Put into queue, waiting while the lane is full.
+
+        Raises QueueClosed if the consumer is gone while the lane is full.
+        """
+        await self.setup()
+
+        payload = self.encode(data)
+
+        if len(payload) > self.ring.max_payload:
+            err = "Message of {} bytes exceeds ring lane capacity."
+            raise QueueError(err.format(len(payload)))
+
+        delay = 0
+
+        while not self.ring.write(payload):
+            if self.stopped:
+                raise QueueClosed("Can't put item into closed queue.")
+            elif not self.ring.consumer_alive():
+                raise QueueClosed("Consumer of the ring is gone.")
+
+            await sleep(delay, loop=self.loop)
+            delay = self._backoff(delay)
+
+        return True
+
+    async def put_many(self, items):
+        """Put several messages into queue."""
+        for data in items:
+            await self.put(data)
+
+    async def get(self):
+        """Get from queue, None once stopped."""
+        delay = 0
+
+        while not self.stopped:
+            payload = self.ring.read()
+
+            if payload is not None:
+                return self.decode(payload)
+
+            await sleep(delay, loop=self.loop)
+            delay = self._backoff(delay)
+
+        return None
+
+    def _get_buffered(self):
+        payload = self.ring.read()
+
+        if payload is None:
+            raise QueueEmpty()
+
+        return self.decode(payload)
+
+    async def stop(self):
+        """Stop queue."""
+        self.close()
+
+    def close(self):
+        """Release the ring, removing its file if this is the consumer."""
+        self.stop_event.set()
+        self.ready.clear()
+
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+            if self.consumer:
+                remove_or_ignore_file(self.path)
+
+        self.closed = True
+
+    def encode(self, data):
+        """Serialize data with the codec of the ring."""
+        return self.codec.encode(data)
+
+    def decode(self, data):
+        """Deserialize data with the codec of the ring."""
+        return self.codec.decode(data)
+
+    def _backoff(self, delay):
+        """Next delay while polling."""
+        return min(delay * 2 or MIN_POLL_SECONDS, self.poll_interval)
+
+
+class PooledSharedMemoryServerQueue(PooledQueue):
+
+    """
+    Shared memory ring buffer server queue.
+
+    Args:
+        path (str): Path of the ring buffer file.
+        loop (asyncio.AbstractEventLoop): Event loop.
+    """
+
+    def __init__(self, path, loop):
+        self.path = path
+        self.loop = loop
+        self.queue = SharedMemoryQueue(path, loop)
+
+    def start(self):
+        """Create the ring and feed the pooled actor until stopped."""
+        self.queue.create()
+        self.loop.run_until_complete(self.run())
+
+    async def run(self):
+        """Main read event loop."""
+        async for message in self.queue:
+            await self.pooled_actor.on_message(message)
+
+    async def stop(self):
+        """Stop server."""
+        await self.queue.stop()
+
+    def get_client(self, loop):
+        """Generate client object from server parameters. Thread safe."""
+        return SharedMemoryQueue(self.path, loop)
+
+
+def get_shared_memory_pooled_actor(Actor, path=None, loop=None):
+    """Helper method to create an actor fed by a shared memory ring."""
+    if loop is None:
+        loop = new_event_loop()
+
+    if path is None:
+        path = get_temp_file_name()
+
+    pooled_queue = PooledSharedMemoryServerQueue(path, loop)
+    pooled_actor = PooledActor(Actor, pooled_queue, loop)
+
+    return pooled_actor
@@ -0,0 +1,426 @@
+"""Disk spilling frontier queue."""
+
+
+from asyncio import Event, QueueEmpty, get_event_loop
+from bisect import bisect_left, bisect_right
+from collections import deque
+from illume import config
+from illume.error import QueueClosed
+from illume.queues.base import GeneratorQueue
+from illume.util import create_dir, remove_or_ignore_file
+from json import dumps, loads
+from mmap import mmap, ACCESS_READ
+from os import listdir, replace
+from os.path import getsize, join, exists
+from struct import Struct
+from zlib import crc32
+
+
+RECORD_HEADER = Struct("!I")
+OFFSET_RECORD = Struct("!QQ")
+SEGMENT_NAME = "bucket-{:04d}-{:012d}.seg"
+OFFSET_NAME = "bucket-{:04d}.offset"
+
+
+class SpillBucket:
+
+    """
+    Append-only segment files holding the spilled messages of a bucket.
+
+    Records are a 4 byte big-endian length followed by the payload. Segments
+    are read back through mmap. The position of the last consumed record is
+    kept in an offset file so reading resumes there after a restart. A record
+    cut short by a crash ends its segment.
+
+    Args:
+        directory (str): Directory holding the segment files.
+        index (int): Bucket number.
+        segment_size (int): Size in bytes after which a new segment starts.
+    """
+
+    def __init__(self, directory, index, segment_size):
+        self.directory = directory
+        self.index = index
+        self.segment_size = segment_size
+        self.prefix = SEGMENT_NAME.format(index, 0)[:12]
+        self.segments = sorted(
+            int(name[12:-4])
+            for name in listdir(directory)
+            if name.startswith(self.prefix) and name.endswith(".seg")
+        )
+        self.writer = None
+        self._map = None
+        self._map_segment = None
+        self.consumed = self._seek(*self._load_offset())
+        self.read_segment, self.read_offset = self.consumed
+        self.dirty = False
+
+    @property
+    def offset_path(self):
+        """Path of the consumed position file."""
+        return join(self.directory, OFFSET_NAME.format(self.index))
+
+    def segment_path(self, segment):
+        """Path of a segment file."""
+        return join(self.directory, SEGMENT_NAME.format(self.index, segment))
+
+    def append(self, payload):
+        """Append a record to the newest segment."""
+        if self.writer is None or self.writer.tell() >= self.segment_size:
+            self._roll()
+
+        self.writer.write(RECORD_HEADER.pack(len(payload)))
+        self.writer.write(payload)
+
+    def read(self):
+        """Read the next unread record, returns (payload, position) or None."""
+        while self.segments:
+            following = bisect_left(self.segments, self.read_segment)
+
+            if following == len(self.segments):
+                return None
+            elif self.segments[following] != self.read_segment:
+                # Segment is gone, resume at the next one.
+                self.read_segment = self.segments[following]
+                self.read_offset = 0
+
+            last = self.read_segment == self.segments[-1]
+
+            if self.writer is not None and last:
+                self.writer.flush()
+
+            view = self._map
+
+            if (self._map_segment != self.read_segment or
+                    get_record_end(view, self.read_offset) is None):
+                view = self._view(self.read_segment)
+
+            end = get_record_end(view, self.read_offset)
+
+            if end is not None:
+                start = self.read_offset + RECORD_HEADER.size
+                payload = view[start:end]
+                self.read_offset = end
+                position = self.index, self.read_segment, self.read_offset
+
+                return payload, position
+
+            if last:
+                return None
+
+            # Segment exhausted, move on to the next one.
+            following = bisect_right(self.segments, self.read_segment)
+            self.read_segment, self.read_offset = self.segments[following], 0
+
+        return None
+
+    def count_unread(self):
+        """Count complete records that were not read yet."""
+        count = 0
+
+        if self.writer is not None:
+            self.writer.flush()
+
+        first = bisect_left(self.segments, self.read_segment)
+
+        for segment in self.segments[first:]:
+            path = self.segment_path(segment)
+            offset = self.read_offset if segment == self.read_segment else 0
+
+            if not exists(path) or getsize(path) == 0:
+                continue
+
+            with open(path, "rb") as f:
+                with mmap(f.fileno(), 0, access=ACCESS_READ) as view:
+                    end = get_record_end(view, offset)
+
+                    while end is not None:
+                        count += 1
+                        end = get_record_end(view, end)
+
+        return count
+
+    def consume(self, segment, offset):
+        """Record that everything up to a position has been handed out."""
+        self.consumed = segment, offset
+        self.dirty = True
+
+    def commit(self):
+        """Persist the consumed position and delete consumed segments."""
+        if self.writer is not None:
+            self.writer.flush()
+
+        if not self.dirty:
+            return
+
+        segment, offset = self.consumed
+        temp_path = self.offset_path + ".tmp"
+
+        with open(temp_path, "wb") as f:
+            f.write(OFFSET_RECORD.pack(segment, offset))
+
+        replace(temp_path, self.offset_path)
+        self.dirty = False
+
+        while len(self.segments) > 1 and self.segments[0] < segment:
+            self._delete(self.segments.pop(0))
+
+    def close(self):
+        """Persist state and release file handles."""
+        self.commit()
+        self._unmap()
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _roll(self):
+        """Start appending to a new segment."""
+        if self.writer is not None:
+            self.writer.close()
+
+        segment = self.segments[-1] + 1 if self.segments else 0
+        # Never append behind the read position.
+        segment = max(segment, self.read_segment)
+        self.segments.append(segment)
+        self.writer = open(self.segment_path(segment), "ab")
+
+    def _view(self, segment):
+        """Map a segment, remapping when the file grew past the mapping."""
+        path = self.segment_path(segment)
+
+        if not exists(path):
+            return None
+
+        size = getsize(path)
+
+        if self._map_segment == segment and len(self._map) >= size:
+            return self._map
+
+        self._unmap()
+
+        if size == 0:
+            return None
+
+        with open(path, "rb") as f:
+            self._map = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+        self._map_segment = segment
+
+        return self._map
+
+    def _unmap(self):
+        """Close the current mapping."""
+        if self._map is not None:
+            self._map.close()
+
+        self._map = None
+        self._map_segment = None
+
+    def _delete(self, segment):
+        """Delete a consumed segment."""
+        if self._map_segment == segment:
+            self._unmap()
+
+        remove_or_ignore_file(self.segment_path(segment))
+
+    def _load_offset(self):
+        """Load the consumed position from the previous run."""
+        if not exists(self.offset_path):
+            return (self.segments[0] if self.segments else 0), 0
+
+        with open(self.offset_path, "rb") as f:
+            return OFFSET_RECORD.unpack(f.read(OFFSET_RECORD.size))
+
+    def _seek(self, segment, offset):
+        """Move a position in a deleted segment to the next segment."""
+        if segment in self.segments:
+            return segment, offset
+
+        following = bisect_right(self.segments, segment)
+
+        if following < len(self.segments):
+            return self.segments[following], 0
+
+        # Every remaining segment was consumed, new ones start after them.
+        return (self.segments[-1] + 1 if self.segments else 0), 0
+
+
+def get_record_end(view, offset):
+    """End of the record at offset, None if it is not complete in view."""
+    if view is None:
+        return None
+
+    start = offset + RECORD_HEADER.size
+
+    if start > len(view):
+        return None
+
+    length, = RECORD_HEADER.unpack_from(view, offset)
+
+    if start + length > len(view):
+        return None
+
+    return start + length
+
+
+class SpillQueue(GeneratorQueue):
+
+    """
+    Frontier queue with a bounded in-memory head and a tail on disk.
+
+    Once the head holds memory_size messages, further messages are appended
+    to segment files of a bucket chosen by a stable hash of their domain. The
+    head is refilled by taking one message from each bucket in turn, so
+    consumers still see a mix of hosts. Spilled messages that were not yet
+    handed out are read again after a restart.
+
+    Args:
+        directory (str): Directory holding the segment files.
+        memory_size (int): Maximum number of messages kept in memory.
+        buckets (int): Number of domain buckets on disk.
+        segment_size (int): Size in bytes after which a new segment starts.
+        commit_interval (int): Gets between persisting read positions.
+        loop (asyncio.AbstractEventLoop): Event loop.
+    """
+
+    def __init__(self, directory=None, memory_size=None, buckets=None,
+                 segment_size=None, commit_interval=1000, loop=None):
+        if not loop:
+            loop = get_event_loop()
+
+        if directory is None:
+            directory = config.get("FRONTIER_SPILL_DIRECTORY")
+
+        if memory_size is None:
+            memory_size = config.get("FRONTIER_SPILL_MEMORY_SIZE")
+
+        if buckets is None:
+            buckets = config.get("FRONTIER_SPILL_BUCKETS")
+
+        if segment_size is None:
+            segment_size = config.get("FRONTIER_SPILL_SEGMENT_SIZE")
+
+        create_dir(directory)
+
+        self.directory = directory
+        self.memory_size = memory_size
+        self.commit_interval = commit_interval
+        self.head = deque()
+        self.buckets = [
+            SpillBucket(directory, n, segment_size)
+            for n in range(buckets)
+        ]
+        # Spilled data from a previous run is read before anything new.
+        self.spilling = any(b.segments for b in self.buckets)
+        self.spilled = sum(b.count_unread() for b in self.buckets)
+        self.gets = 0
+        self.encoding_type = config.get("QUEUE_ENCODING_TYPE")
+        self._loop = loop
+        self._available = Event(loop=loop)
+
+    def qsize(self):
+        """Messages in memory plus spilled messages not read yet."""
+        return len(self.head) + self.spilled
+
+    async def put(self, data):
+        if self.closed:
+            raise QueueClosed("Can't put item into closed queue.")
+
+        if self.spilling or len(self.head) >= self.memory_size:
+            self.spill(data)
+        else:
+            self.head.append((data, None))
+
+        self._available.set()
+        await self.throttle(self.qsize())
+
+        return True
+
+    async def get(self):
+        """Get the next message, waiting until one is available."""
+        while True:
+            try:
+                data = self.get_nowait()
+            except QueueEmpty:
+                self._available.clear()
+                await self._available.wait()
+            else:
+                await self.throttle(self.qsize())
+
+                return data
+
+    def get_nowait(self):
+        """Get the next message or raise QueueEmpty."""
+        if self.closed:
+            raise QueueClosed("Can't get items from closed queue")
+
+        if not self.head and self.spilling:
+            self.refill()
+
+        if not self.head:
+            raise QueueEmpty()
+
+        data, position = self.head.popleft()
+
+        if position is not None:
+            index, segment, offset = position
+            self.buckets[index].consume(segment, offset)
+            self.gets += 1
+
+            if self.gets % self.commit_interval == 0:
+                self.commit()
+
+        return data
+
+    _get_buffered = get_nowait
+
+    def spill(self, data):
+        """Append a message to the bucket of its domain."""
+        domain = data.get("domain", "") if isinstance(data, dict) else ""
+        index = crc32(domain.encode(self.encoding_type)) % len(self.buckets)
+
+        self.buckets[index].append(self.encode(data))
+        self.spilling = True
+        self.spilled += 1
+
+    def refill(self):
+        """Move spilled messages into memory, one bucket at a time."""
+        want = max(self.memory_size // 2, 1)
+        active = list(self.buckets)
+
+        while active and len(self.head) < want:
+            for bucket in list(active):
+                record = bucket.read()
+
+                if record is None:
+                    active.remove(bucket)
+                    continue
+
+                payload, position = record
+                self.head.append((self.decode(payload), position))
+                self.spilled = max(self.spilled - 1, 0)
+
+        if not active:
+            self.spilling = False
+
+    def commit(self):
+        """Persist read positions of every bucket."""
+        for bucket in self.buckets:
+            bucket.commit()
+
+    def close(self):
+        """Persist state and close segment files."""
+        for bucket in self.buckets:
+            bucket.close()
+
+        self.head = None
+        self.closed = True
+
+    def encode(self, data):
+        """Serialize data into JSON bytes."""
+        return dumps(data).encode(self.encoding_type)
+
+    def decode(self, data):
+        """Deserialize data from JSON bytes."""
+        return loads(data.decode(self.encoding_type))
@@ -0,0 +1,136 @@
+"""TCP socket queues."""
+
+
+from asyncio import new_event_loop, open_connection, sleep, start_server
+from illume import config
+from illume.log import log
+from illume.queues.codec import COMPRESSED_PREFIX, JSONCodec
+from illume.queues.pool import PooledActor
+from illume.queues.unix import PooledUnixSocketServerQueue, UnixSocketClient
+
+
+def parse_address(address):
+    """Split a "host:port" address into host and port."""
+    host, _, port = address.rpartition(":")
+
+    return host or None, int(port)
+
+
+class PooledTCPServerQueue(PooledUnixSocketServerQueue):
+
+    """
+    TCP server queue.
+
+    Works like PooledUnixSocketServerQueue, dispatch policies included, but
+    listens on a host and port so stages can run on other nodes. Peers are
+    not trusted, so clients offering marshal are answered with JSON.
+
+    Args:
+        path (str): "host:port" address to listen on.
+        loop (asyncio.AbstractEventLoop): Event loop.
+        dispatch_policy (str): One of illume.queues.unix.DISPATCH_POLICIES.
+    """
+
+    listener = None
+    accepted_codecs = (JSONCodec.name,)
+
+    def start(self):
+        """Start server."""
+        host, port = parse_address(self.path)
+        coro = start_server(
+            self.on_connect,
+            host=host,
+            port=port,
+            loop=self.loop
+        )
+        self.listener = self.loop.run_until_complete(coro)
+        self.loop.run_forever()
+
+    def get_client(self, loop):
+        """Generate client object from server parameters. Thread safe."""
+        return TCPClient(self.path, loop)
+
+
+class TCPClient(UnixSocketClient):
+
+    """
+    TCP client queue.
+
+    Connecting is retried with an exponential backoff and a connection the
+    server closed is opened again on the next put or get. Messages are
+    batched by the write coalescing of UnixSocket and put_many. They are
+    JSON encoded, and zlib compressed when TCP_COMPRESSION is set, since
+    marshal is only safe between trusted processes of one interpreter.
+
+    Args:
+        path (str): "host:port" address of the server.
+        loop (asyncio.AbstractEventLoop): Event loop.
+        connect_retries (int): Attempts to connect before giving up.
+    """
+
+    def __init__(self, path, loop, connect_retries=None):
+        if connect_retries is None:
+            connect_retries = config.get("TCP_CONNECT_RETRIES")
+
+        super().__init__(path, loop, connect_retries)
+
+        self.retry_delay = config.get("TCP_RETRY_DELAY_SECONDS")
+        self.compression = config.get("TCP_COMPRESSION")
+
+    async def start(self):
+        delay = self.retry_delay
+
+        for n in range(self.connect_retries):
+            try:
+                await self.connect()
+            except OSError as e:
+                log.debug("Connecting to {} failed with {!r}".format(
+                    self.path,
+                    e
+                ))
+                await sleep(delay, loop=self.loop)
+                delay *= 2
+            else:
+                return
+
+        raise ConnectionError(self.path)
+
+    async def setup(self):
+        """Connect, or connect again if the server closed the connection."""
+        transport = getattr(self.writer, "transport", None)
+
+        if (self.ready.is_set() and transport is not None and
+                transport.is_closing()):
+            log.warning("Reconnecting to {}".format(self.path))
+            self.ready.clear()
+            self.framed = False
+            self.codec = JSONCodec(self.encoding_type)
+            self.read_buffer.clear()
+            self.unacknowledged = 0
+
+        await super().setup()
+
+    async def open_stream(self):
+        host, port = parse_address(self.path)
+
+        return await open_connection(host=host, port=port, loop=self.loop)
+
+    def offered_codecs(self):
+        if self.compression:
+            return [COMPRESSED_PREFIX + JSONCodec.name, JSONCodec.name]
+
+        return [JSONCodec.name]
+
+
+def get_tcp_pooled_actor(Actor, path, loop=None, queue_class=None):
+    """Helper method to create an actor served over TCP."""
+    if loop is None:
+        loop = new_event_loop()
+
+    if queue_class is None:
+        queue_class = PooledTCPServerQueue
+
+    pooled_queue = queue_class(path, loop)
+    pooled_actor = PooledActor(Actor, pooled_queue, loop)
+
+    return pooled_actor
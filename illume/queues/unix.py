@@ -4,15 +4,28 @@
 from asyncio import get_event_loop, Event, Lock, wait, open_unix_connection
 from asyncio import Queue, FIRST_COMPLETED, start_unix_server, sleep
 from asyncio import new_event_loop
+from collections import Counter, defaultdict, deque
 from copy import copy
 from illume import config
 from illume.error import TaskComplete, QueueError
 from illume.log import log
 from illume.queues.base import GeneratorQueue
+from illume.queues.codec import ACK_KEY, ACK_RECORD, CODECS, FRAME_ACK
+from illume.queues.codec import FRAME_DATA, FRAME_HEADER, HANDSHAKE_KEY
+from illume.queues.codec import JSONCodec, choose_codec, get_codec
 from illume.queues.pool import PooledQueue, PooledActor
-from illume.task import dies_on_stop_event, timeout
+from illume.task import close_stop_watcher, dies_on_stop_event, timeout
 from illume.util import get_temp_file_name
-from json import dumps, loads
+
+
+# Bytes requested from the stream at once when reading frames.
+READ_SIZE = 65536
+DISPATCH_POLICIES = (
+    "broadcast",
+    "round-robin",
+    "least-outstanding",
+    "work-stealing"
+)
 
 
 class UnixSocket(GeneratorQueue):
@@ -20,6 +33,15 @@ class UnixSocket(GeneratorQueue):
     """
     Base unix socket class.
 
+    Messages are newline delimited JSON until both ends agree on a codec
+    through a handshake, after which they are length-prefixed and encoded
+    with that codec. Frames are read in chunks into `read_buffer` so that
+    several messages can be taken at once without waiting on the stream.
+
+    Outgoing messages are buffered and written together once per event loop
+    tick, after flush_linger seconds if set, or as soon as flush_bytes are
+    buffered.
+
     Args:
         path (str): Path of unix socket.
         loop (asyncio.AbstractEventLoop): Event loop.
@@ -28,12 +50,23 @@ class UnixSocket(GeneratorQueue):
     reader = None
     writer = None
     connect_retries = 0
+    framed = False
+    flush_handle = None
 
     def __init__(self, path, loop, connect_retries=3):
         if loop is None:
             loop = get_event_loop()
 
         self.encoding_type = config.get("QUEUE_ENCODING_TYPE")
+        self.codec = JSONCodec(self.encoding_type)
+        self.set_watermarks(
+            config.get("QUEUE_HIGH_WATERMARK"),
+            config.get("QUEUE_LOW_WATERMARK")
+        )
+        self.flush_bytes = config.get("QUEUE_FLUSH_BYTES")
+        self.flush_linger = config.get("QUEUE_FLUSH_LINGER_SECONDS")
+        self.write_buffer = bytearray()
+        self.read_buffer = bytearray()
         self.ready = Event(loop=loop)
         self.stop_event = Event(loop=loop)
         self.path = path
@@ -62,15 +95,62 @@ class UnixSocket(GeneratorQueue):
 
     async def stop(self):
         """Stop queue."""
+        self.flush()
         await self.on_stop()
         self.ready.clear()
         self.stop_event.set()
+        await close_stop_watcher(self)
+
+    @property
+    def stopped(self):
+        """Indicate that the socket stopped or the peer closed it."""
+        at_eof = self.reader is not None and self.reader.at_eof()
+        at_eof = at_eof and not self._data_buffered()
+
+        return self.stop_event.is_set() or at_eof
+
+    async def get_many(self, max_items, timeout=None):
+        """
+        Get up to max_items messages, taking only already read frames.
+
+        Newline delimited JSON is read line by line, so get_many returns a
+        single message until a codec was agreed on.
+        """
+        items = await super().get_many(1, timeout)
+
+        while items and len(items) < max_items and self._data_buffered():
+            data = await self.get()
+
+            if data is None:
+                break
+
+            items.append(data)
+
+        return items
+
+    def _data_buffered(self):
+        """Indicate if a message frame can be read without waiting."""
+        offset = 0
+
+        while len(self.read_buffer) - offset >= FRAME_HEADER.size:
+            length, kind = FRAME_HEADER.unpack_from(self.read_buffer, offset)
+            offset += FRAME_HEADER.size + length
+
+            if offset > len(self.read_buffer):
+                return False
+            elif kind == FRAME_DATA:
+                return True
+
+        return False
 
     @dies_on_stop_event
     async def get(self):
         """Get from queue."""
         await self.ready.wait()
 
+        if self.framed:
+            return await self.read_frame()
+
         payload = await self.reader.readline()
 
         if payload:
@@ -78,14 +158,147 @@ class UnixSocket(GeneratorQueue):
 
             return data
 
+    async def read_frame(self):
+        """
+        Read a length-prefixed message, None once the peer closed.
+
+        Acknowledgement frames are handed to on_acknowledge.
+        """
+        while True:
+            frame = self._pop_frame()
+
+            if frame is None:
+                chunk = await self.reader.read(READ_SIZE)
+
+                if not chunk:
+                    return None
+
+                self.read_buffer += chunk
+                continue
+
+            kind, payload = frame
+
+            if kind == FRAME_ACK:
+                count, = ACK_RECORD.unpack(payload)
+                await self.on_acknowledge(count)
+            else:
+                return self.decode(payload)
+
+    def _pop_frame(self):
+        """Take a complete frame from the read buffer, (type, payload)."""
+        if len(self.read_buffer) < FRAME_HEADER.size:
+            return None
+
+        length, kind = FRAME_HEADER.unpack_from(self.read_buffer)
+        end = FRAME_HEADER.size + length
+
+        if len(self.read_buffer) < end:
+            return None
+
+        payload = bytes(self.read_buffer[FRAME_HEADER.size:end])
+        del self.read_buffer[:end]
+
+        return kind, payload
+
+    async def on_acknowledge(self, count):
+        """
+        Implementable.
+
+        Implement this class to handle acknowledgements from the peer.
+        """
+        pass
+
     @dies_on_stop_event
     async def put(self, data):
         """Put into queue."""
         await self.ready.wait()
 
+        self.buffer(data)
+        await self.drain()
+
+    @dies_on_stop_event
+    async def put_many(self, items):
+        """Put several messages into queue with a single write."""
+        await self.ready.wait()
+
+        for data in items:
+            self.buffer(data)
+
+        await self.drain()
+
+    def buffer(self, data):
+        """Add a message to the write buffer and schedule a flush."""
         payload = self.encode(data)
-        self.writer.write(payload)
-        self.writer.write(b'\n')
+
+        if self.framed:
+            self.buffer_frame(FRAME_DATA, payload)
+        else:
+            self.write_buffer += payload
+            self.write_buffer += b'\n'
+            self.schedule_flush()
+
+    def buffer_ack(self, count):
+        """Add an acknowledgement of count messages to the write buffer."""
+        self.buffer_frame(FRAME_ACK, ACK_RECORD.pack(count))
+
+    def buffer_frame(self, kind, payload):
+        """Add a length-prefixed frame to the write buffer."""
+        self.write_buffer += FRAME_HEADER.pack(len(payload), kind)
+        self.write_buffer += payload
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        """Flush now if enough is buffered, otherwise schedule a flush."""
+        if len(self.write_buffer) >= self.flush_bytes:
+            self.flush()
+        elif self.flush_handle is None:
+            if self.flush_linger:
+                self.flush_handle = self.loop.call_later(
+                    self.flush_linger,
+                    self.flush
+                )
+            else:
+                self.flush_handle = self.loop.call_soon(self.flush)
+
+    def flush(self):
+        """Write out buffered messages."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        if self.write_buffer and self.writer is not None:
+            self.writer.write(bytes(self.write_buffer))
+            self.write_buffer.clear()
+
+    def use_codec(self, name):
+        """Switch to length-prefixed messages encoded with a codec."""
+        self.codec = get_codec(name, self.encoding_type)
+        self.framed = True
+
+    async def drain(self):
+        """Pause producers and wait while the write buffer is too large."""
+        transport = self.writer.transport
+
+        if transport is None:
+            return
+
+        pending = len(self.write_buffer)
+        await self.throttle(transport.get_write_buffer_size() + pending)
+
+        if self.throttled:
+            self.flush()
+            await self.writer.drain()
+            await self.throttle(transport.get_write_buffer_size())
+
+    def set_write_buffer_limits(self):
+        """Make the transport flow control match the queue watermarks."""
+        transport = getattr(self.writer, "transport", None)
+
+        if transport is not None:
+            transport.set_write_buffer_limits(
+                high=self.high_watermark,
+                low=self.low_watermark
+            )
 
     async def on_stop(self):
         """
@@ -96,16 +309,12 @@ class UnixSocket(GeneratorQueue):
         pass
 
     def encode(self, data):
-        """Serialize data into JSON bytes."""
-        data = dumps(data)
-
-        return data.encode(self.encoding_type)
+        """Serialize data with the current codec."""
+        return self.codec.encode(data)
 
     def decode(self, data):
-        """Deserialize data from JSON bytes."""
-        data = data.decode(self.encoding_type)
-
-        return loads(data.strip()) if data else None
+        """Deserialize data with the current codec."""
+        return self.codec.decode(data)
 
 
 class PooledUnixSocketServerQueue(PooledQueue):
@@ -113,18 +322,59 @@ class PooledUnixSocketServerQueue(PooledQueue):
     """
     Unix socket server queue.
 
+    The dispatch policy decides which clients a put message goes to:
+
+    * broadcast: every client.
+    * round-robin: the next client in turn.
+    * least-outstanding: the client with the fewest unacknowledged messages.
+    * work-stealing: like least-outstanding, but clients never hold more
+      than `prefetch` unacknowledged messages. The rest waits in a shared
+      backlog that clients take from as they acknowledge, so idle replicas
+      pick up work that busy ones have not started.
+
+    Apart from broadcast, clients acknowledge every message they finished
+    and messages put while no client is connected wait in the backlog.
+    Messages a client did not acknowledge before disconnecting go back to
+    the backlog.
+
     Args:
         path (str): Path to listen on.
         loop (asyncio.AbstractEventLoop): Event loop.
+        dispatch_policy (str): One of DISPATCH_POLICIES.
     """
 
     clients = None
+    producers = None
+    # Codecs clients may choose, marshal only suits trusted local peers.
+    accepted_codecs = tuple(CODECS)
+
+    def __init__(self, path, loop, dispatch_policy=None):
+        if dispatch_policy is None:
+            dispatch_policy = config.get("QUEUE_DISPATCH_POLICY")
+
+        if dispatch_policy not in DISPATCH_POLICIES:
+            err = "Unknown dispatch policy {}."
+            raise QueueError(err.format(dispatch_policy))
 
-    def __init__(self, path, loop):
         self.path = path
         self.clients = []
+        self.producers = []
         self.loop = loop
         self.stop_event = Event(loop=loop)
+        self.dispatch_policy = dispatch_policy
+        self.prefetch = config.get("QUEUE_DISPATCH_PREFETCH")
+        # Client -> number of messages sent and not yet acknowledged.
+        self.in_flight = Counter()
+        # Client -> those messages, oldest first.
+        self.sent = defaultdict(deque)
+        self.backlog = deque()
+        self.backlog_space = Event(loop=loop)
+        self.next_client = 0
+
+    @property
+    def acknowledged(self):
+        """Indicate that clients must acknowledge messages they finished."""
+        return self.dispatch_policy != "broadcast"
 
     def start(self):
         """Start server."""
@@ -138,27 +388,127 @@ class PooledUnixSocketServerQueue(PooledQueue):
 
     @dies_on_stop_event
     async def put(self, data):
-        """Fan out data to all clients."""
-        for client in copy(self.clients):
+        """Send data to clients according to the dispatch policy."""
+        if self.dispatch_policy == "broadcast":
+            for client in copy(self.clients):
+                await client.put(data)
+
+            return
+
+        while len(self.backlog) >= self.prefetch:
+            self.backlog_space.clear()
+            await self.backlog_space.wait()
+
+        self.backlog.append(data)
+        await self.dispatch_backlog()
+
+    @dies_on_stop_event
+    async def put_many(self, items):
+        """Send several messages, writes to a client are coalesced."""
+        if self.dispatch_policy == "broadcast":
+            for client in copy(self.clients):
+                await client.put_many(items)
+
+            return
+
+        for data in items:
+            await self.put(data)
+
+    async def dispatch_backlog(self):
+        """Send backlogged messages to clients chosen by the policy."""
+        while self.backlog:
+            client = self.choose_client()
+
+            if client is None:
+                break
+
+            data = self.backlog.popleft()
+            self.in_flight[client] += 1
+            self.sent[client].append(data)
             await client.put(data)
 
+        if len(self.backlog) < self.prefetch:
+            self.backlog_space.set()
+
+    def choose_client(self):
+        """Pick the client of the next message, None if none can take it."""
+        if not self.clients:
+            return None
+
+        start = self.next_client % len(self.clients)
+        self.next_client = start + 1
+
+        if self.dispatch_policy == "round-robin":
+            return self.clients[start]
+
+        # Starting the scan at the next client in turn spreads ties.
+        order = self.clients[start:] + self.clients[:start]
+        client = min(order, key=self.in_flight.__getitem__)
+
+        if (self.dispatch_policy == "work-stealing" and
+                self.in_flight[client] >= self.prefetch):
+            return None
+
+        return client
+
+    async def add_client(self, client):
+        """Register a negotiated connection and send it the backlog."""
+        if client not in self.clients:
+            self.clients.append(client)
+
+        await self.dispatch_backlog()
+
+    async def acknowledge(self, client, count):
+        """Record that a client finished messages and send it more."""
+        self.in_flight[client] = max(self.in_flight[client] - count, 0)
+        sent = self.sent[client]
+
+        for n in range(min(count, len(sent))):
+            sent.popleft()
+
+        await self.dispatch_backlog()
+
+    async def remove_client(self, client):
+        """
+        Forget a closed connection.
+
+        Messages it did not acknowledge go back to the front of the backlog
+        and are sent to the remaining clients.
+        """
+        self.clients.remove(client)
+        self.in_flight.pop(client, None)
+        sent = self.sent.pop(client, ())
+
+        if sent and not self.stop_event.is_set():
+            log.debug("Requeueing {} messages of a closed client".format(
+                len(sent)
+            ))
+            self.backlog.extendleft(reversed(sent))
+            await self.dispatch_backlog()
+
+    def add_producer(self, producer):
+        """Register a producer with current and future connections."""
+        self.producers.append(producer)
+
+        for client in self.clients:
+            client.add_producer(producer)
+
     async def on_connect(self, reader, writer):
         """Handle a new connection."""
         client = self.get_connection(reader, writer)
-        # TODO double check if a race condition exists here
-        self.clients.append(client)
         await client.start()
 
     async def stop(self):
         """Stop server."""
         self.stop_event.set()
+        await close_stop_watcher(self)
 
         for client in copy(self.clients):
             await client.close()
 
     def get_connection(self, reader, writer):
         """Get UnixSocketServerConnection object from reader/writer."""
-        return UnixSocketServerConnection(
+        connection = UnixSocketServerConnection(
             self,
             self.pooled_actor,
             self.path,
@@ -167,6 +517,11 @@ class PooledUnixSocketServerQueue(PooledQueue):
             self.loop
         )
 
+        for producer in self.producers:
+            connection.add_producer(producer)
+
+        return connection
+
     def get_client(self, loop):
         """Generate client object from server parameters. Thread safe."""
         return UnixSocketClient(self.path, loop)
@@ -195,29 +550,103 @@ class UnixSocketServerConnection(UnixSocket):
 
         super().__init__(path, loop=loop)
 
+    # First line of a client that skipped the codec handshake.
+    pending = None
+
+    async def start(self):
+        """
+        Answer the codec handshake, then serve the connection.
+
+        The connection only becomes ready and joins the server's clients
+        after the handshake, so no message is written in the old framing.
+        """
+        await self.accept_codec()
+        await super().start()
+
     async def on_stop(self):
         """Handle connection termination."""
-        self.server.clients.remove(self)
+        await self.server.remove_client(self)
+
+    async def close(self):
+        """Stop the connection and close its stream, as the server stops."""
+        if not self.stop_event.is_set():
+            await self.stop()
+
+        self.writer.close()
+
+    async def on_acknowledge(self, count):
+        """Let the server send more messages to the client."""
+        await self.server.acknowledge(self, count)
+
+    async def get(self):
+        """Get from queue, starting with a line read during the handshake."""
+        if self.pending is not None:
+            data, self.pending = self.pending, None
+
+            return data
+
+        return await super().get()
+
+    async def accept_codec(self):
+        """
+        Answer the codec handshake of a client.
+
+        Clients that do not start with a handshake keep using newline
+        delimited JSON, their first line is returned by the next get.
+        """
+        line = await self.reader.readline()
+        data = self.decode(line) if line else None
+
+        if not isinstance(data, dict) or HANDSHAKE_KEY not in data:
+            self.pending = data
+            return
+
+        name = choose_codec(data[HANDSHAKE_KEY], self.server.accepted_codecs)
+
+        # The reply goes through the write buffer, ahead of any frame.
+        self.buffer({
+            HANDSHAKE_KEY: name,
+            ACK_KEY: self.server.acknowledged
+        })
+        self.flush()
+        self.use_codec(name)
+        log.debug("Using codec {} on socket {}".format(name, self.path))
 
     @dies_on_stop_event
     async def run(self):
         """Main read event loop."""
+        self.set_write_buffer_limits()
+        await self.server.add_client(self)
+
         while not self.stop_event.is_set():
             result = await self.get()
 
-            if result is not None:
+            if result is None and self.reader.at_eof():
+                # The client closed the connection, get would not wait.
+                await self.stop()
+                break
+            elif result is not None:
                 await self.pooled_actor.on_message(result)
 
 
 class UnixSocketClient(UnixSocket):
 
-    """Unix socket client queue."""
+    """
+    Unix socket client queue.
+
+    When the server asks for it during the handshake, every get
+    acknowledges the message returned by the previous one.
+    """
+
+    acknowledge = False
+    unacknowledged = 0
 
     async def start(self):
         for n in range(self.connect_retries):
             try:
                 await self.connect()
-            except FileNotFoundError:
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The server may have bound its socket but not listen yet.
                 await sleep(n, loop=self.loop)
             else:
                 return
@@ -226,17 +655,38 @@ class UnixSocketClient(UnixSocket):
 
     async def connect(self):
         """Initialize the client."""
-        self.reader, self.writer = await open_unix_connection(
-            path=self.path,
-            loop=self.loop
-        )
+        self.reader, self.writer = await self.open_stream()
         log.debug("Listening to socket {}".format(self.path))
+        self.set_write_buffer_limits()
+        await self.negotiate()
         self.ready.set()
 
+    async def open_stream(self):
+        """Open a connection to the server, returns (reader, writer)."""
+        return await open_unix_connection(path=self.path, loop=self.loop)
+
+    def offered_codecs(self):
+        """Codec names offered to the server, most preferred first."""
+        return list(CODECS)
+
+    async def negotiate(self):
+        """Agree on a codec with the server."""
+        offer = self.encode({HANDSHAKE_KEY: self.offered_codecs()})
+
+        self.writer.write(offer + b'\n')
+        reply = self.decode(await self.reader.readline())
+
+        if isinstance(reply, dict) and HANDSHAKE_KEY in reply:
+            self.use_codec(reply[HANDSHAKE_KEY])
+            self.acknowledge = reply.get(ACK_KEY, False)
+
     async def stop(self):
         """Stop the client."""
         #self.writer.write_eof()
+        self.send_ack()
+        self.flush()
         await timeout(self.writer.drain(), 1, self.loop)
+        await close_stop_watcher(self)
 
     async def setup(self):
         """Set up the client."""
@@ -248,13 +698,31 @@ class UnixSocketClient(UnixSocket):
         await self.setup()
         await super().put(message)
 
+    async def put_many(self, messages):
+        log.debug("Putting {} messages".format(len(messages)))
+        await self.setup()
+        await super().put_many(messages)
+
     async def get(self):
         """Read data from the server."""
         await self.setup()
-        await super().put(message)
+        self.send_ack()
+
+        data = await super().get()
 
+        if data is not None and self.acknowledge:
+            self.unacknowledged += 1
 
-def get_unix_pooled_actor(Actor, path=None, loop=None):
+        return data
+
+    def send_ack(self):
+        """Acknowledge the messages returned so far."""
+        if self.unacknowledged:
+            self.buffer_ack(self.unacknowledged)
+            self.unacknowledged = 0
+
+
+def get_unix_pooled_actor(Actor, path=None, loop=None, queue_class=None):
     """Helper method to create an actor in a pooled context."""
     if loop is None:
         loop = new_event_loop()
@@ -262,7 +730,10 @@ def get_unix_pooled_actor(Actor, path=None, loop=None):
     if path is None:
         path = get_temp_file_name()
 
-    pooled_queue = PooledUnixSocketServerQueue(path, loop)
+    if queue_class is None:
+        queue_class = PooledUnixSocketServerQueue
+
+    pooled_queue = queue_class(path, loop)
     pooled_actor = PooledActor(Actor, pooled_queue, loop)
 
     return pooled_actor
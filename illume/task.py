@@ -1,7 +1,8 @@
 """Task-related helper methods."""
 
 
-from asyncio import FIRST_COMPLETED, wait, sleep, TimeoutError
+from asyncio import FIRST_COMPLETED, wait, sleep, TimeoutError, Task
+from asyncio import CancelledError, ensure_future
 
 
 async def get_first_completed(pending, loop):
@@ -23,23 +24,141 @@ async def sleep_and_timeout(seconds):
     raise TimeoutError()
 
 
-def dies_on_stop_event(fn):
-    """Kill a coroutine once the parent class's stop_event has been set."""
-    async def func(self, *args, **kwargs):
-        pending = {self.stop_event.wait(), fn(self, *args, **kwargs)}
-        result = await get_first_completed(pending, self.loop)
+class StopWatcher:
+
+    """
+    Cancel awaiting tasks once a stop event has been set.
+
+    A single long-lived task waits on the stop event. Coroutines passed to
+    run() are awaited inline by the calling task, which is registered so the
+    watcher can cancel it, instead of spawning a task per call. Owners close
+    the watcher when they stop so that its task does not outlive them.
+
+    Args:
+        stop_event (asyncio.Event): Event that signals shutdown.
+        loop (asyncio.AbstractEventLoop): Event loop.
+    """
+
+    def __init__(self, stop_event, loop):
+        self.stop_event = stop_event
+        self.loop = loop
+        self.pending = {}
+        self.watcher = None
+
+    async def run(self, coro):
+        """Await a coroutine, returning None if the stop event is set."""
+        if self.stop_event.is_set():
+            coro.close()
+            return None
+
+        if self.watcher is None:
+            self.watcher = ensure_future(self._watch(), loop=self.loop)
+
+        task = Task.current_task(loop=self.loop)
+        self.pending[task] = self.pending.get(task, 0) + 1
+
+        try:
+            result = await coro
+        except CancelledError:
+            # Let an enclosing run() on the same task absorb the cancel.
+            if not self.stop_event.is_set() or self.pending[task] > 1:
+                raise
+
+            return None
+        finally:
+            self._release(task)
 
         if self.stop_event.is_set():
             return None
 
         return result
 
+    def _release(self, task):
+        """Unregister one run() call of a task."""
+        depth = self.pending.pop(task) - 1
+
+        if depth:
+            self.pending[task] = depth
+
+    async def close(self):
+        """
+        Finish the watcher task.
+
+        Registered tasks other than the caller's are cancelled if the stop
+        event is set, as the watcher would have done.
+        """
+        watcher, self.watcher = self.watcher, None
+
+        if watcher is None or watcher.done():
+            return
+
+        if self.stop_event.is_set():
+            self._cancel_pending()
+
+        watcher.cancel()
+        await wait([watcher], loop=self.loop)
+
+    def _cancel_pending(self):
+        """Cancel registered tasks other than the current one."""
+        current = Task.current_task(loop=self.loop)
+
+        for task in list(self.pending):
+            if task is not current:
+                task.cancel()
+
+    async def _watch(self):
+        """Cancel every registered task when the stop event fires."""
+        await self.stop_event.wait()
+
+        self._cancel_pending()
+
+
+def get_stop_watcher(obj):
+    """Get the stop watcher of an object, creating it on first use."""
+    watcher = obj.__dict__.get("_stop_watcher", None)
+
+    if watcher is None:
+        watcher = StopWatcher(obj.stop_event, obj.loop)
+        obj._stop_watcher = watcher
+
+    return watcher
+
+
+async def close_stop_watcher(obj):
+    """Close the stop watcher of an object if it has one."""
+    watcher = obj.__dict__.get("_stop_watcher", None)
+
+    if watcher is not None:
+        await watcher.close()
+
+
+def dies_on_stop_event(fn):
+    """Kill a coroutine once the parent class's stop_event has been set."""
+    async def func(self, *args, **kwargs):
+        watcher = get_stop_watcher(self)
+
+        return await watcher.run(fn(self, *args, **kwargs))
+
     return func
 
 
 async def timeout(coro, seconds, loop):
     """Wrapped coroutine times out after specified seconds."""
-    pending = {sleep_and_timeout(seconds), coro}
-    result = await get_first_completed(pending, loop)
+    task = Task.current_task(loop=loop)
+    state = {"expired": False}
+
+    def expire():
+        state['expired'] = True
+        task.cancel()
+
+    handle = loop.call_later(seconds, expire)
+
+    try:
+        return await coro
+    except CancelledError:
+        if state['expired']:
+            raise TimeoutError()
 
-    return result
+        raise
+    finally:
+        handle.cancel()
@@ -1,7 +1,7 @@
 """Test base class."""
 
 
-from asyncio import new_event_loop
+from asyncio import Task, gather, new_event_loop
 from pytest import fixture
 from unittest import TestCase
 
@@ -15,4 +15,18 @@ class IllumeTest:
 
     @fixture
     def loop(self):
-        return new_event_loop()
+        loop = new_event_loop()
+
+        yield loop
+
+        # Settle tasks left behind by objects a test did not stop.
+        if not loop.is_closed() and not loop.is_running():
+            tasks = Task.all_tasks(loop=loop)
+
+            for task in tasks:
+                task.cancel()
+
+            loop.run_until_complete(
+                gather(*tasks, loop=loop, return_exceptions=True)
+            )
+            loop.close()
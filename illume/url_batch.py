@@ -0,0 +1,118 @@
+"""Columnar URL batch messages."""
+
+
+# Message key holding a serialized URLBatch.
+URL_BATCH_KEY = "url_batch"
+# Separator of the contiguous URL column, quoted URLs never contain it.
+URL_SEPARATOR = "\n"
+
+
+class URLBatch:
+
+    """
+    Columnar batch of URLs and their domains.
+
+    Domains are stored once in a dictionary and referenced by index, and
+    URLs are serialized as one contiguous string. Compared to a list of
+    {"url": ..., "domain": ...} dicts this avoids repeating key names and
+    domains, and lets consumers work on whole columns.
+
+    Args:
+        domains (list): Distinct domains.
+        domain_ids (list): Index into domains of every URL.
+        urls (list): URLs.
+    """
+
+    def __init__(self, domains=None, domain_ids=None, urls=None):
+        self.domains = domains or []
+        self.domain_ids = domain_ids or []
+        self.urls = urls or []
+        self.index = {domain: n for n, domain in enumerate(self.domains)}
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __iter__(self):
+        """Iterate over (url, domain) pairs."""
+        domains = self.domains
+
+        for url, domain_id in zip(self.urls, self.domain_ids):
+            yield url, domains[domain_id]
+
+    def add(self, url, domain):
+        """Append a URL of a domain."""
+        domain_id = self.index.get(domain, None)
+
+        if domain_id is None:
+            domain_id = self.index[domain] = len(self.domains)
+            self.domains.append(domain)
+
+        self.domain_ids.append(domain_id)
+        self.urls.append(url)
+
+    def url_domains(self):
+        """Domain of every URL."""
+        domains = self.domains
+
+        return [domains[n] for n in self.domain_ids]
+
+    def serialize(self):
+        """Get the batch as codec friendly builtin types."""
+        return {
+            "domains": self.domains,
+            "domain_ids": self.domain_ids,
+            "urls": URL_SEPARATOR.join(self.urls)
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        """Load a batch serialized with serialize()."""
+        urls = data["urls"]
+
+        return cls(
+            data["domains"],
+            data["domain_ids"],
+            urls.split(URL_SEPARATOR) if urls else []
+        )
+
+    @classmethod
+    def from_url_maps(cls, url_maps):
+        """Build a batch from a list of {"url": ..., "domain": ...} dicts."""
+        batch = cls()
+
+        for url_map in url_maps:
+            batch.add(url_map['url'], url_map['domain'])
+
+        return batch
+
+
+def count_urls(message):
+    """Number of URLs of a message, whatever its format."""
+    data = message.get(URL_BATCH_KEY, None)
+
+    if data is not None:
+        return len(data["domain_ids"])
+
+    return len(message.get("urls", []))
+
+
+def get_url_batch(message):
+    """Get the URLs of a message as a URLBatch, whatever its format."""
+    data = message.get(URL_BATCH_KEY, None)
+
+    if data is not None:
+        return URLBatch.deserialize(data)
+
+    return URLBatch.from_url_maps(message.get("urls", []))
+
+
+def iter_url_maps(message):
+    """Iterate over the URLs of a message as url maps, whatever its format."""
+    data = message.get(URL_BATCH_KEY, None)
+
+    if data is None:
+        yield from message.get("urls", [])
+        return
+
+    for url, domain in URLBatch.deserialize(data):
+        yield {"url": url, "domain": domain}
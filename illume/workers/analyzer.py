@@ -3,10 +3,10 @@
 
 from illume import config
 from illume.actor import Actor
-from illume.error import FileNotFound
+from illume.body import open_body
 from illume.log import log
 from illume.parse.link_fsm import DocumentReaderFsm, LEGAL_URL_CHARS
-from os.path import exists
+from illume.url_batch import URL_BATCH_KEY, URLBatch, count_urls
 from urllib.parse import urlsplit, urlunsplit, quote, quote_plus, urljoin
 
 
@@ -24,31 +24,65 @@ class FileAnalyzer(Actor):
     def on_init(self):
         self.drop_fragments = config.get("PARSER_DROP_FRAGMENTS")
         self.drop_query = config.get("PARSER_DROP_QUERY")
+        self.batch_size = config.get("ANALYZER_BATCH_SIZE")
+        self.batch_linger = config.get("ANALYZER_BATCH_LINGER_SECONDS")
+        self.url_batch = config.get("ANALYZER_URL_BATCH")
 
     async def on_message(self, message):
         """Obtain stream from input and perform analysis."""
         try:
-            path = message.get("path", None)
-            origin = message.get("url", None)
+            self.analyze(message)
 
-            if not exists(path):
-                raise FileNotFound(path)
+            log.info("Extracted {} urls from {}".format(
+                count_urls(message),
+                message.get("url", None)
+            ))
+            log.info("Analyzer publishes {}".format(message))
+
+            await self.publish(message)
+        except Exception as e:
+            log.info("Analyzer got exception {} with message {}".format(e, message))
+            raise
+
+    async def on_message_batch(self, messages):
+        """Analyze a batch of messages and log a single summary."""
+        count = 0
+
+        for message in messages:
+            try:
+                self.analyze(message)
+            except Exception as e:
+                log.info("Analyzer got exception {} with message {}".format(e, message))
+                raise
+
+            count += count_urls(message)
+
+        log.info("Extracted {} urls from {} documents".format(
+            count,
+            len(messages)
+        ))
 
-            stream = open(path)
+        for message in messages:
+            await self.publish(message)
+
+    def analyze(self, message):
+        """Extract urls from the body referenced by the message."""
+        origin = message.get("url", None)
+
+        with open_body(message) as stream:
             fsm = DocumentReaderFsm(stream)
 
             fsm.perform()
 
-            urls = self.parse_urls(origin, fsm.matches)
-            message.update({"urls": urls})
+        urls = self.parse_urls(origin, fsm.matches)
 
-            log.info("Extracted {} urls from {}".format(len(urls), origin))
-            log.info("Analyzer publishes {}".format(message))
+        if self.url_batch:
+            batch = URLBatch.from_url_maps(urls)
+            message[URL_BATCH_KEY] = batch.serialize()
+        else:
+            message.update({"urls": urls})
 
-            await self.publish(message)
-        except Exception as e:
-            log.info("Analyzer got exception {} with message {}".format(e, message))
-            raise
+        return message
 
     def parse_urls(self, origin_url, urls):
         """Get complete absolute URL set."""
@@ -4,34 +4,80 @@
 from functools import partial
 from illume import config
 from illume.actor import Actor
-from illume.error import DatabaseCorrupt
+from illume.error import BloomFilterError, DatabaseCorrupt
+from illume.filter.backends import BLOOM, create_filter
 from illume.filter.bloom import BloomFilter
+from illume.filter.expiring import ExpiringBloomFilter
 from illume.filter.persistent_key_filter import PersistentKeyFilter
+from illume.filter.reindex import reindex_like
+from illume.filter.scalable import ScalableBloomFilter
+from illume.filter.shared import SharedBloomFilter
+from illume.filter.snapshot import Snapshotter, load_snapshot
+from illume.filter.xor import FrozenFilter
 from illume.log import log
+from illume.url_batch import iter_url_maps
 
 
 class KeyFilter(Actor):
 
     """Frontier url/domain filter actor."""
 
+    snapshotter = None
+    recrawl_filter = None
+
     def on_init(self):
         self.domain_whitelist = config.get("FRONTIER_DOMAIN_WHITELIST")
+        self.batch_size = config.get("FRONTIER_BATCH_SIZE")
+        self.batch_linger = config.get("FRONTIER_BATCH_LINGER_SECONDS")
         self.init_bloom_filters()
+        self.init_recrawl_filter()
         self.init_persistent_key_filter()
         self.populate_bloom_filters()
 
     def init_bloom_filters(self):
-        """Initialize bloom filter."""
-        self.url_bloom_filter = BloomFilter(
+        """Initialize the URL and domain filters."""
+        self.url_bloom_filter = self.init_filter(
+            config.get("FRONTIER_URL_FILTER_BACKEND"),
             config.get("FRONTIER_URL_BLOOM_MAX_N"),
-            config.get("FRONTIER_URL_BLOOM_P")
+            config.get("FRONTIER_URL_BLOOM_P"),
+            config.get("FRONTIER_URL_BLOOM_INITIAL_N"),
+            config.get("FRONTIER_URL_BLOOM_SHARED_PATH")
         )
-
-        self.domain_bloom_filter = BloomFilter(
+        self.domain_bloom_filter = self.init_filter(
+            config.get("FRONTIER_DOMAIN_FILTER_BACKEND"),
             config.get("FRONTIER_DOMAIN_BLOOM_MAX_N"),
-            config.get("FRONTIER_DOMAIN_BLOOM_P")
+            config.get("FRONTIER_DOMAIN_BLOOM_P"),
+            config.get("FRONTIER_DOMAIN_BLOOM_INITIAL_N"),
+            config.get("FRONTIER_DOMAIN_BLOOM_SHARED_PATH")
         )
 
+    def init_filter(self, backend, max_n, p, initial_n, shared_path):
+        """
+        Create a filter of a backend.
+
+        Bloom filters are shared when FRONTIER_BLOOM_SHARED is set, and
+        scalable when FRONTIER_BLOOM_SCALABLE is.
+        """
+        if backend != BLOOM:
+            return create_filter(backend, max_n, p)
+        elif config.get("FRONTIER_BLOOM_SHARED"):
+            return SharedBloomFilter(shared_path, max_n, p)
+        elif config.get("FRONTIER_BLOOM_SCALABLE"):
+            return ScalableBloomFilter(initial_n, p)
+
+        return BloomFilter(max_n, p)
+
+    def init_recrawl_filter(self):
+        """Initialize the filter of URLs published during the window."""
+        window = config.get("FRONTIER_RECRAWL_WINDOW_SECONDS")
+
+        if window > 0:
+            self.recrawl_filter = ExpiringBloomFilter(
+                config.get("FRONTIER_RECRAWL_BLOOM_MAX_N"),
+                config.get("FRONTIER_RECRAWL_BLOOM_P"),
+                window
+            )
+
     def init_persistent_key_filter(self):
         """Initialize persistent key filter."""
         self.key_filter_path = config.get("FRONTIER_KEY_FILTER_DB_PATH")
@@ -43,19 +89,251 @@ class KeyFilter(Actor):
         self.cursor = self.persistent_key_filter.create_cursor()
 
     def populate_bloom_filters(self):
-        """Populate bloom filter with data from the persistent key filter."""
-        pass
+        """
+        Populate bloom filters from their snapshots.
+
+        Pairings added to the persistent key filter after the snapshots were
+        taken, or every pairing if there are no usable snapshots, are added
+        from the persistent key filter. Frozen filters without a snapshot
+        freeze every pairing first.
+
+        Shared bloom filters are populated by the replica that created them,
+        the others wait for it.
+        """
+        self.url_snapshot_path = config.get("FRONTIER_URL_BLOOM_SNAPSHOT_PATH")
+        self.domain_snapshot_path = config.get(
+            "FRONTIER_DOMAIN_BLOOM_SNAPSHOT_PATH"
+        )
+        shared = [
+            f for f in (self.url_bloom_filter, self.domain_bloom_filter)
+            if isinstance(f, SharedBloomFilter)
+        ]
+
+        if not all(f.created for f in shared):
+            for bloom_filter in shared:
+                bloom_filter.wait_ready(
+                    config.get("FRONTIER_BLOOM_SHARED_WAIT_SECONDS")
+                )
+
+            return
+
+        self.add_pairings_since(
+            self.freeze_filters(self.load_bloom_snapshots()),
+            self.url_bloom_filter,
+            self.domain_bloom_filter
+        )
+
+        for bloom_filter in shared:
+            bloom_filter.set_ready()
+
+    def freeze_filters(self, rowid):
+        """
+        Freeze the persistent key filter into frozen filters that hold none.
+
+        Returns the rowid after which pairings are missing from a filter,
+        given the one after which they are missing from snapshots.
+        """
+        url_rowid = domain_rowid = rowid
+
+        if self.is_unfrozen(self.url_bloom_filter):
+            self.url_bloom_filter, url_rowid = reindex_like(
+                self.key_filter_path,
+                "url",
+                self.url_bloom_filter
+            )
+
+        if self.is_unfrozen(self.domain_bloom_filter):
+            self.domain_bloom_filter, domain_rowid = reindex_like(
+                self.key_filter_path,
+                "domain",
+                self.domain_bloom_filter
+            )
+
+        return min(url_rowid, domain_rowid)
+
+    def is_unfrozen(self, bloom_filter):
+        """Filter is a frozen filter holding no frozen pairing."""
+        return (
+            isinstance(bloom_filter, FrozenFilter) and
+            not bloom_filter.frozen.n
+        )
+
+    def add_pairings_since(self, rowid, url_bloom_filter, domain_bloom_filter):
+        """Add pairings of the persistent key filter after rowid."""
+        count = 0
+
+        for _, domain, url in self.persistent_key_filter.iter_since(rowid):
+            if domain not in domain_bloom_filter:
+                domain_bloom_filter.add(domain)
+
+            if url not in url_bloom_filter:
+                url_bloom_filter.add(url)
+
+            count += 1
+
+        if count:
+            log.info("{} pairings added to bloom filters".format(count))
+
+    async def reindex_bloom_filters(self, url_max_n=None, url_p=None,
+                                    domain_max_n=None, domain_p=None,
+                                    progress=None):
+        """
+        Rebuild the bloom filters from the persistent key filter.
+
+        Filters are rebuilt by a process pool from the default executor while
+        messages keep being handled. Pairings added meanwhile are then added
+        to the new filters, which replace the current ones without yielding
+        to the loop. Shared filters have their bits replaced instead and
+        can't be resized.
+
+        Args:
+            url_max_n (int): New element size of the URL filter.
+            url_p (float): New error rate of the URL filter.
+            domain_max_n (int): New element size of the domain filter.
+            domain_p (float): New error rate of the domain filter.
+            progress (callable): See reindex_bloom_filter.
+        """
+        # Pool processes only see committed pairings.
+        self.persistent_key_filter.conn.commit()
+
+        url_bloom_filter, url_rowid = await self._loop.run_in_executor(
+            None,
+            partial(
+                reindex_like,
+                self.key_filter_path,
+                "url",
+                self.url_bloom_filter,
+                url_max_n,
+                url_p,
+                progress=progress
+            )
+        )
+        domain_bloom_filter, domain_rowid = await self._loop.run_in_executor(
+            None,
+            partial(
+                reindex_like,
+                self.key_filter_path,
+                "domain",
+                self.domain_bloom_filter,
+                domain_max_n,
+                domain_p,
+                progress=progress
+            )
+        )
+
+        self.add_pairings_since(
+            min(url_rowid, domain_rowid),
+            url_bloom_filter,
+            domain_bloom_filter
+        )
+        self.url_bloom_filter = self.use_snapshot(
+            self.url_bloom_filter,
+            url_bloom_filter
+        )
+        self.domain_bloom_filter = self.use_snapshot(
+            self.domain_bloom_filter,
+            domain_bloom_filter
+        )
+
+        if self.snapshotter is not None:
+            self.snapshotter.filters = {
+                self.url_snapshot_path: self.url_bloom_filter,
+                self.domain_snapshot_path: self.domain_bloom_filter
+            }
+
+    def load_bloom_snapshots(self):
+        """Load bloom filter snapshots, returns the last rowid they hold."""
+        try:
+            url_bloom_filter, url_metadata = load_snapshot(
+                self.url_snapshot_path
+            )
+            domain_bloom_filter, domain_metadata = load_snapshot(
+                self.domain_snapshot_path
+            )
+        except FileNotFoundError:
+            return 0
+        except (BloomFilterError, ValueError) as e:
+            log.warning("Ignoring bloom filter snapshots: {!r}".format(e))
+            return 0
+
+        try:
+            self.url_bloom_filter = self.use_snapshot(
+                self.url_bloom_filter,
+                url_bloom_filter
+            )
+            self.domain_bloom_filter = self.use_snapshot(
+                self.domain_bloom_filter,
+                domain_bloom_filter
+            )
+        except BloomFilterError as e:
+            log.warning("Ignoring bloom filter snapshots: {!r}".format(e))
+            return 0
+
+        return min(
+            url_metadata.get("rowid", 0),
+            domain_metadata.get("rowid", 0)
+        )
+
+    def use_snapshot(self, bloom_filter, loaded):
+        """Filter to use given one loaded from a snapshot or reindexed."""
+        if loaded.backend != bloom_filter.backend:
+            err = "Snapshot of a {} filter, {} filters are configured."
+            raise BloomFilterError(
+                err.format(loaded.backend, bloom_filter.backend)
+            )
+
+        if isinstance(bloom_filter, SharedBloomFilter):
+            bloom_filter.load(loaded)
+
+            return bloom_filter
+
+        return loaded
+
+    def get_snapshot_metadata(self):
+        """Metadata of bloom filter snapshots."""
+        return {"rowid": self.persistent_key_filter.last_rowid()}
+
+    async def on_start(self):
+        if config.get("FILTER_BLOOM_SNAPSHOT_SECONDS") > 0:
+            self.snapshotter = Snapshotter(
+                {
+                    self.url_snapshot_path: self.url_bloom_filter,
+                    self.domain_snapshot_path: self.domain_bloom_filter
+                },
+                metadata=self.get_snapshot_metadata,
+                loop=self._loop
+            )
+            self.snapshotter.start()
+
+    async def on_stop(self):
+        if self.snapshotter is not None:
+            await self.snapshotter.stop()
+            self.snapshotter = None
 
     async def on_message(self, message):
-        urls = message.get("urls", [])
         count = 0
 
-        for url in urls:
+        for url in iter_url_maps(message):
             count += await self.handle_url(url)
 
         if count:
             log.info("{} URLS published".format(count))
 
+    async def on_message_batch(self, messages):
+        """Filter a batch of messages within a single transaction."""
+        count = 0
+
+        with self.persistent_key_filter.conn:
+            for message in messages:
+                for url in iter_url_maps(message):
+                    count += await self.handle_url(url)
+
+        if count:
+            log.info("{} URLS published from {} messages".format(
+                count,
+                len(messages)
+            ))
+
     async def handle_url(self, url_map):
         """Determine if URL should be crawled."""
         url = url_map['url']
@@ -68,11 +346,15 @@ class KeyFilter(Actor):
 
         domain_is_known = self.exists_domain(domain)
         url_is_known = False
-        should_publish = recrawl or override
 
         if domain_is_known:
             url_is_known = self.exists_url(domain, url)
 
+        if url_is_known and not recrawl and self.recrawl_due(url):
+            recrawl = url_map['recrawl'] = True
+
+        should_publish = recrawl or override
+
         should_ignore = self._should_ignore(
             domain_is_known,
             url_is_known,
@@ -83,9 +365,6 @@ class KeyFilter(Actor):
         if should_ignore:
             return 0
 
-        if not domain_is_known:
-            self.domain_bloom_filter.add(domain)
-
         should_add = self._should_add(domain_is_known, url_is_known)
 
         if should_add:
@@ -105,10 +384,31 @@ class KeyFilter(Actor):
                 url_map
             )
             url_map['fetch_priority'] = priority
+
+            if self.recrawl_filter is not None:
+                self.recrawl_filter.add(url)
+
             await self.publish(url_map)
 
             return 1
 
+    def recrawl_due(self, url):
+        """
+        Known URL was not published during the last recrawl window.
+
+        URLs seen during the first window after start are assumed to have
+        been published before the restart.
+        """
+        if self.recrawl_filter is None or url in self.recrawl_filter:
+            return False
+
+        if self.recrawl_filter.age < self.recrawl_filter.window:
+            self.recrawl_filter.add(url)
+
+            return False
+
+        return True
+
     def _get_priority(self, domain_is_known, url_is_known, url_map):
         """Get crawler priority of url."""
         override = url_map.get("override", None)
@@ -1,12 +1,16 @@
 """HTTP/HTTPS fetcher crawler component."""
 
 
+from asyncio import CancelledError, ensure_future, gather
 from illume import config
 from illume.actor import Actor
+from illume.body import BODY_PREFIX, MEMORY, get_shared_memory_directory
+from illume.body import sweep_bodies
 from illume.clients.http import HTTPRequest
 from illume.error import IllumeException
 from illume.log import log
-from illume.util import create_dir
+from illume.queues.host import HostQueue
+from illume.util import create_dir, remove_or_ignore_file
 from os import getpid
 from os.path import join
 from shutil import move
@@ -24,7 +28,12 @@ class HTTPFetcher(Actor):
         self.progress_dir = config.get("FETCHER_PROGRESS_DIR")
         self.max_response_size = config.get("FETCHER_MAX_RESPONSE_SIZE")
         self.max_header_size = config.get("FETCHER_HEADER_MAX_SIZE")
+        self.max_concurrency = config.get("FETCHER_MAX_CONCURRENCY")
+        self.ordered = config.get("FETCHER_ORDERED")
         self.shard_id = config.get("SHARD_ID")
+        self.shared_memory_dir = get_shared_memory_directory()
+        self.body_ttl = config.get("FETCHER_SHARED_MEMORY_TTL_SECONDS")
+        self.next_sweep = 0
         self.pid = getpid()
         self.sequence = 0
 
@@ -33,6 +42,10 @@ class HTTPFetcher(Actor):
 
     async def on_message(self, message):
         """Get URL."""
+        await self.fetch(message)
+
+    async def fetch(self, message):
+        """Fetch the URL of a message and publish the result."""
         url = message['url']
         domain = message['domain']
         method = message.get('method', "GET")
@@ -41,47 +54,154 @@ class HTTPFetcher(Actor):
         file_name = self.get_unique_file_name()
         progress_path = join(self.progress_dir, file_name)
         destination_path = join(self.output_dir, file_name)
-        writer = open(progress_path, 'wb')
         result = {
             "url": url,
-            "domain": domain,
-            "path": destination_path
+            "domain": domain
         }
 
-        client = HTTPRequest(
-            url,
-            writer,
-            method=method,
-            timeout=self.timeout,
-            request_body=request_body,
-            headers=add_headers,
-            max_response_size=self.max_response_size,
-            max_header_size=self.max_header_size,
-            loop=self._loop
-        )
+        if self.shared_memory_dir is not None:
+            self.sweep_bodies()
+            # Nothing to persist, the analyzer reads and removes the body.
+            progress_path = destination_path = join(
+                self.shared_memory_dir,
+                file_name
+            )
+            result['body_store'] = MEMORY
+
+        writer = open(progress_path, 'wb')
+        result['path'] = destination_path
 
         try:
+            client = HTTPRequest(
+                url,
+                writer,
+                method=method,
+                timeout=self.timeout,
+                request_body=request_body,
+                headers=add_headers,
+                max_response_size=self.max_response_size,
+                max_header_size=self.max_header_size,
+                loop=self._loop
+            )
+
             await client.perform()
         except IllumeException as e:
             result['success'] = False
             result['error'] = e.code
             log.error("'{}' occurred while fetching {}.".format(e, url))
+        except BaseException:
+            # Nothing is published, so nobody would remove the body.
+            remove_or_ignore_file(progress_path)
+            raise
         else:
             result['success'] = True
             result['md5'] = client.md5_hash
             result['http_code'] = client.response_code
             log.info("Successfully fetched {}".format(url))
+        finally:
+            writer.close()
+
+        if progress_path != destination_path:
+            move(progress_path, destination_path)
 
-        move(progress_path, destination_path)
         await self.publish(result)
 
+    def sweep_bodies(self):
+        """Remove expired bodies from shared memory, once per TTL at most."""
+        now = time()
+
+        if now < self.next_sweep:
+            return
+
+        self.next_sweep = now + self.body_ttl
+        count = sweep_bodies(self.shared_memory_dir, self.body_ttl, now)
+
+        if count:
+            log.warning("Removed {} bodies no analyzer opened".format(count))
+
     def get_unique_file_name(self):
         """Get a unique file name to store the result in."""
         self.sequence += 1
 
-        return "fetcher-{}-{}-{}-{}".format(
+        return "{}{}-{}-{}-{}".format(
+            BODY_PREFIX,
             self.shard_id,
             int(time()),
             getpid(),
             self.sequence
         )
+
+
+class PoliteHTTPFetcher(HTTPFetcher):
+
+    """
+    HTTP fetcher that schedules requests per host.
+
+    Incoming messages are queued per domain in a HostQueue. Fetch workers,
+    FETCHER_MAX_CONCURRENCY of them, take the earliest eligible host first, so
+    no host is fetched more often than FETCHER_HOST_DELAY_SECONDS allows or by
+    more than FETCHER_HOST_CONCURRENCY workers at once. The URLs of a host
+    are fetched in order of fetch_priority, aged as in the frontier queue.
+    """
+
+    def on_init(self):
+        super().on_init()
+
+        self.worker_count = self.max_concurrency
+        self.max_concurrency = 1
+        self.workers = []
+        self.host_queue = HostQueue(
+            delay=config.get("FETCHER_HOST_DELAY_SECONDS"),
+            concurrency=config.get("FETCHER_HOST_CONCURRENCY"),
+            maxsize=config.get("FETCHER_HOST_QUEUE_MAX_SIZE"),
+            loop=self._loop,
+            default=config.get("FRONTIER_DEFAULT_PRIORITY"),
+            aging=config.get("FRONTIER_PRIORITY_AGING")
+        )
+
+    async def on_start(self):
+        self.workers = [
+            ensure_future(self.fetch_from_hosts(), loop=self._loop)
+            for n in range(self.worker_count)
+        ]
+
+    async def on_stop(self):
+        """Stop the fetch workers and report the URLs left queued."""
+        for worker in self.workers:
+            worker.cancel()
+
+        if self.workers:
+            await gather(*self.workers, loop=self._loop,
+                         return_exceptions=True)
+
+        depths = self.host_queue.depths
+
+        if depths:
+            log.warning("Dropping {} queued URLs of {} hosts".format(
+                self.host_queue.qsize(),
+                len(depths)
+            ))
+
+        self.host_queue.close()
+        await super().on_stop()
+
+    async def on_message(self, message):
+        """Queue URL behind its host."""
+        await self.host_queue.put(message)
+
+    async def fetch_from_hosts(self):
+        """Fetch worker loop."""
+        while True:
+            message = await self.host_queue.get()
+
+            try:
+                await self.fetch(message)
+            except CancelledError:
+                raise
+            except Exception as e:
+                log.error("'{}' occurred while fetching {}.".format(
+                    e,
+                    message['url']
+                ))
+            finally:
+                self.host_queue.release(message['domain'])
@@ -6,7 +6,7 @@ from illume import config
 from illume.actor import Actor
 from illume.filter.graph import EntityGraph
 from illume.log import log
-from time import time
+from illume.url_batch import URL_BATCH_KEY, URLBatch, count_urls
 from urllib.parse import urlsplit
 
 
@@ -16,19 +16,48 @@ class CrawlLogger(Actor):
 
     def on_init(self):
         self.entity_graph = EntityGraph(config.get("GRAPH_LOGGER_PATH"))
+        self.batch_size = config.get("LOGGER_BATCH_SIZE")
+        self.batch_linger = config.get("LOGGER_BATCH_LINGER_SECONDS")
 
     async def on_message(self, message):
         log.info("Logging entity {}.".format(message))
-        urls = message.get("urls", [])
+        count = self.log_entities(message)
+
+        if count:
+            log.info("Successfully logged {} entities".format(count))
+
+    async def on_message_batch(self, messages):
+        """Log a batch of messages within a single transaction."""
+        count = 0
+
+        with self.entity_graph.conn:
+            for message in messages:
+                count += self.log_entities(message)
+
+        log.info("Successfully logged {} entities from {} messages".format(
+            count,
+            len(messages)
+        ))
+
+    def log_entities(self, message):
+        """Add the origin and destinations of a message to the graph."""
+        count = count_urls(message)
         origin_url = message.get("url", None)
-        now = int(time())
 
-        if origin_url is None or len(urls) == 0:
+        if origin_url is None or count == 0:
             log.warn("Got invalid message")
-            return
+            return 0
 
         origin = urlsplit(origin_url).netloc
-        destinations = [urlsplit(u['url']).netloc for u in urls]
+
+        if URL_BATCH_KEY in message:
+            # The domain column already holds the netloc of every URL.
+            batch = URLBatch.deserialize(message[URL_BATCH_KEY])
+            destinations = batch.url_domains()
+        else:
+            urls = message["urls"]
+            destinations = [urlsplit(u['url']).netloc for u in urls]
 
         self.entity_graph.add_entities(origin, destinations)
-        log.info("Successfully logged {} entities".format(len(urls)))
+
+        return count
@@ -1,7 +1,7 @@
 """Test actor."""
 
 
-from asyncio import new_event_loop, gather, Queue as AsyncIOQueue
+from asyncio import new_event_loop, gather, sleep, Queue as AsyncIOQueue
 from illume.actor import Actor
 from illume.queues.base import AsyncQueue
 from illume.test.assertions import check_queue
@@ -165,3 +165,164 @@ class TestActor:
         check_queue(second_paused_queue, second_paused_result)
         check_queue(second_resume_queue, second_resume_result)
         check_queue(second_stop_queue, second_stop_result)
+
+    def test_batch_mode(self):
+        # Create an actor with batch mode enabled and queue more messages than
+        # fit in a single batch.
+        # Assert that batches are filled from the queued messages in order.
+
+        count = 10
+        batch_size = 4
+        batches = []
+        loop = new_event_loop()
+
+        class TestActor(Actor):
+            async def on_message_batch(self, messages):
+                batches.append(messages)
+
+                if sum(len(b) for b in batches) == count:
+                    await self.stop()
+
+        inbox = AsyncIOQueue(loop=loop)
+        actor = TestActor(inbox, None, loop=loop)
+        actor.batch_size = batch_size
+
+        async def run():
+            for n in range(count):
+                await inbox.put(n)
+
+            await actor.start()
+
+        loop.run_until_complete(run())
+
+        assert [len(b) for b in batches] == [4, 4, 2]
+        assert [n for b in batches for n in b] == list(range(count))
+
+    def test_batch_linger(self):
+        # Create an actor that lingers for the batch to fill.
+        # Assert that messages published during the linger join the batch.
+
+        batches = []
+        loop = new_event_loop()
+
+        class TestActor(Actor):
+            async def on_message_batch(self, messages):
+                batches.append(messages)
+                await self.stop()
+
+        inbox = AsyncIOQueue(loop=loop)
+        actor = TestActor(inbox, None, loop=loop)
+        actor.batch_size = 3
+        actor.batch_linger = 1
+
+        async def produce():
+            for n in range(3):
+                await inbox.put(n)
+                await sleep(.01, loop=loop)
+
+        async def run():
+            await gather(produce(), actor.start(), loop=loop)
+
+        loop.run_until_complete(run())
+
+        assert batches == [[0, 1, 2]]
+
+    def test_max_concurrency(self):
+        # Create an actor that handles several messages at once.
+        # Assert that no more than max_concurrency messages are in flight.
+
+        count = 9
+        max_concurrency = 3
+        loop = new_event_loop()
+        peak = {"in_flight": 0, "handled": 0}
+
+        class TestActor(Actor):
+            async def on_message(self, data):
+                peak['in_flight'] = max(peak['in_flight'], self.in_flight)
+                await sleep(.01, loop=loop)
+                peak['handled'] += 1
+
+                if peak['handled'] == count:
+                    await self.stop()
+
+        inbox = AsyncIOQueue(loop=loop)
+        actor = TestActor(inbox, None, loop=loop)
+        actor.max_concurrency = max_concurrency
+
+        async def run():
+            for n in range(count):
+                await inbox.put(n)
+
+            await actor.start()
+
+        loop.run_until_complete(run())
+
+        assert peak['in_flight'] == max_concurrency
+        assert peak['handled'] == count
+        assert actor.in_flight == 0
+
+    def test_ordered_concurrency(self):
+        # Create an ordered concurrent actor whose earlier messages finish
+        # last.
+        # Assert that published messages keep the order they were received.
+
+        count = 5
+        loop = new_event_loop()
+
+        class TestActor(Actor):
+            async def on_message(self, data):
+                await sleep((count - data) * .01, loop=loop)
+                await self.publish(data)
+
+        inbox = AsyncIOQueue(loop=loop)
+        outbox = AsyncIOQueue(loop=loop)
+        actor = TestActor(inbox, outbox, loop=loop)
+        actor.max_concurrency = count
+        actor.ordered = True
+
+        async def stop_when_published():
+            while outbox.qsize() < count:
+                await sleep(.01, loop=loop)
+
+            await actor.stop()
+
+        async def run():
+            for n in range(count):
+                await inbox.put(n)
+
+            await gather(actor.start(), stop_when_published(), loop=loop)
+
+        loop.run_until_complete(run())
+
+        assert [outbox.get_nowait() for n in range(count)] == list(range(count))
+
+    def test_pause_blocks_run_loop(self):
+        # Create an actor that is paused before it starts.
+        # Assert that no message is handled until the actor is resumed.
+
+        loop = new_event_loop()
+        received = []
+
+        class TestActor(Actor):
+            async def on_message(self, data):
+                received.append(data)
+                await self.stop()
+
+        inbox = AsyncIOQueue(loop=loop)
+        actor = TestActor(inbox, None, loop=loop)
+
+        async def resume_later():
+            await sleep(.05, loop=loop)
+
+            assert received == []
+
+            await actor.resume()
+
+        async def run():
+            await inbox.put(1)
+            await actor.pause()
+            await gather(actor.start(), resume_later(), loop=loop)
+
+        loop.run_until_complete(run())
+
+        assert received == [1]
@@ -3,7 +3,9 @@
 
 from asyncio import new_event_loop, Queue as AsyncIOQueue
 from illume import config
+from illume.body import MEMORY
 from illume.test.actor import mock_actor
+from illume.util import get_temp_file_name
 from illume.workers.analyzer import FileAnalyzer
 from os import listdir
 from os.path import join, exists
@@ -64,6 +66,26 @@ class TestFileAnalyzer:
 
         loop.run_until_complete(perform())
 
+    def test_memory_body(self):
+        actor = FileAnalyzer(None, None)
+        path = get_temp_file_name()
+
+        with open(path, "wb") as f:
+            f.write(b"<a href='/wiki/Miku'>Miku</a>")
+
+        message = actor.analyze({
+            "url": "https://en.wikipedia.org/wiki/Vocaloid",
+            "domain": "en.wikipedia.org",
+            "path": path,
+            "body_store": MEMORY
+        })
+
+        assert message["urls"] == [{
+            "url": "https://en.wikipedia.org/wiki/Miku",
+            "domain": "en.wikipedia.org"
+        }]
+        assert not exists(path)
+
     def test_url_parser(self):
         actor = FileAnalyzer(None, None)
         urls = [
@@ -0,0 +1,116 @@
+"""Test Blocked Bloom Filter."""
+
+
+from hashes import hash_indexes
+from illume.error import BloomFilterError
+from illume.filter.bloom import BLOCK_BITS, PROBE_BLOCKED, BloomFilter
+from illume.filter.bloom import get_bloom_error_rate, get_optimal_bloom_k
+from illume.filter.bloom import get_optimal_bloom_m
+from illume.filter.hashing import LEGACY
+from illume.filter.shared import SharedBloomFilter
+from illume.filter.snapshot import load_snapshot, save_snapshot
+from illume.util import get_temp_file_name, remove_or_ignore_file
+from pytest import raises
+
+
+class TestBlockedBloomFilter:
+    def setup_method(self, method):
+        self.path = get_temp_file_name()
+
+    def teardown_method(self, method):
+        remove_or_ignore_file(self.path)
+
+    def test_sizing(self):
+        """Assert blocked filters take whole blocks and stay within p."""
+        n = 100000
+
+        for p in (.1, .01, .001, .0001):
+            m = get_optimal_bloom_m(n, p, blocked=True)
+            k = get_optimal_bloom_k(m, n, p, blocked=True)
+
+            assert m % BLOCK_BITS == 0
+            assert m >= get_optimal_bloom_m(n, p)
+            assert get_bloom_error_rate(m, k, n, blocked=True) <= p
+
+    def test_error_rate(self):
+        """Assert the measured error rate of a full filter is about p."""
+        max_n = 20000
+        p = .01
+        bloom_filter = BloomFilter(max_n, p, blocked=True)
+        bloom_filter.add_many(["in-{}".format(i) for i in range(max_n)])
+        others = ["out-{}".format(i) for i in range(100000)]
+        false_positives = sum(bloom_filter.contains_many(others))
+
+        assert bloom_filter.full
+        assert false_positives / len(others) < p * 1.3
+
+    def test_add_and_contains(self):
+        """Assert single and batch lookups find every added item."""
+        bloom_filter = BloomFilter(10000, .01, blocked=True)
+        items = [str(i) for i in range(5000)]
+        bloom_filter.add_many(items[:2500])
+
+        for item in items[2500:]:
+            bloom_filter.add(item)
+
+        assert bloom_filter.n == len(items)
+        assert bloom_filter.contains_many(items) == [True] * len(items)
+        assert all(item in bloom_filter for item in items)
+
+    def test_indexes_within_block(self):
+        """Assert every index of a hash value falls in the same block."""
+        bloom_filter = BloomFilter(10000, .001, blocked=True)
+
+        for item in (str(i) for i in range(1000)):
+            hashval = bloom_filter.hash_engine.hash(item)
+            indexes = hash_indexes(
+                hashval,
+                bloom_filter.k,
+                bloom_filter.m,
+                PROBE_BLOCKED
+            )
+            blocks = {index // BLOCK_BITS for index in indexes}
+
+            assert len(indexes) == bloom_filter.k
+            assert len(blocks) == 1
+
+    def test_legacy_engine(self):
+        """Assert the legacy engine can't probe blocks."""
+        with raises(BloomFilterError):
+            BloomFilter(10000, .01, LEGACY, blocked=True)
+
+    def test_snapshot(self):
+        """Assert snapshots keep the layout of a filter."""
+        bloom_filter = BloomFilter(10000, .01, blocked=True)
+        items = [str(i) for i in range(1000)]
+        bloom_filter.add_many(items)
+
+        save_snapshot(bloom_filter, self.path, {"rowid": 1})
+        loaded, _ = load_snapshot(self.path)
+
+        assert loaded.blocked
+        assert loaded.m == bloom_filter.m
+        assert loaded.k == bloom_filter.k
+        assert loaded.bit_array == bloom_filter.bit_array
+        assert loaded.contains_many(items) == [True] * len(items)
+
+    def test_shared(self):
+        """Assert shared filters agree on the layout."""
+        shared = SharedBloomFilter(self.path, 10000, .01, blocked=True)
+
+        try:
+            bloom_filter = BloomFilter(10000, .01, blocked=True)
+            items = [str(i) for i in range(1000)]
+            bloom_filter.add_many(items)
+            shared.load(bloom_filter)
+
+            assert shared.contains_many(items) == [True] * len(items)
+
+            with raises(BloomFilterError):
+                SharedBloomFilter(self.path, 10000, .01, blocked=False)
+
+            with raises(BloomFilterError):
+                shared.load(BloomFilter(10000, .01, blocked=False))
+        finally:
+            shared.close()
+            shared.unlink()
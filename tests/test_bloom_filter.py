@@ -1,9 +1,13 @@
 """Test Bloom Filter."""
 
 
+from hashes import fnv1a64_composite, hash_indexes
 from illume.error import BloomFilterExceedsErrorRate, BloomFilterSizeOverflow
+from illume.error import BloomFilterError
 from illume.error import InsufficientMemory, AllocationValueError
+from illume.filter import hashing
 from illume.filter.bloom import BloomFilter, alloc_bitarray
+from illume.filter.hashing import ENGINES, LEGACY, get_hash_engine
 from illume.util import get_available_memory
 from pytest import fail, raises
 
@@ -122,7 +126,7 @@ class TestBloomFilter:
 
         for max_n, p, content, hashes in values:
             count = 0
-            bloom_filter = BloomFilter(max_n, p)
+            bloom_filter = BloomFilter(max_n, p, LEGACY)
             iterable = list(enumerate(bloom_filter._get_hashes(content)))
 
             for index, hash_ in iterable:
@@ -130,3 +134,114 @@ class TestBloomFilter:
                 count += 1
 
             assert count == len(hashes)
+
+    def test_add_and_contains(self):
+        """Assert added items are found and match the composite hashes."""
+        bloom_filter = BloomFilter(10000, .01)
+        items = [str(i) for i in range(1000)]
+
+        for item in items:
+            bloom_filter.add(item)
+
+        assert all(item in bloom_filter for item in items)
+        assert bloom_filter.bit_array.count() <= len(items) * bloom_filter.k
+
+        for item in items:
+            for index in bloom_filter._get_hashes(item):
+                assert bloom_filter.bit_array[index]
+
+    def test_add_many_and_contains_many(self):
+        """Assert batch operations match single item operations."""
+        single = BloomFilter(10000, .01)
+        batch = BloomFilter(10000, .01)
+        items = [str(i) for i in range(1000)]
+        others = [str(i) for i in range(1000, 3000)]
+
+        for item in items:
+            single.add(item)
+
+        batch.add_many(iter(items))
+
+        assert batch.n == single.n == len(items)
+        assert batch.bit_array == single.bit_array
+        assert batch.contains_many(items) == [True] * len(items)
+        assert batch.contains_many(others) == [o in single for o in others]
+        assert batch.contains_many([]) == []
+
+    def test_contains_bitmap(self):
+        """Assert the bitmap holds the result of each item in order."""
+        bloom_filter = BloomFilter(1000, .01)
+        items = [str(i) for i in range(21)]
+        bloom_filter.add_many(items[::3])
+        bitmap = bloom_filter.contains_bitmap(iter(items))
+
+        assert len(bitmap) == len(items)
+        assert bitmap.tolist() == [item in bloom_filter for item in items]
+        assert bitmap.count() >= 7
+        assert len(bloom_filter.contains_bitmap([])) == 0
+
+    def test_add_many_overflow(self):
+        """Assert batches taking n past max_n are rejected."""
+        bloom_filter = BloomFilter(100, .1)
+
+        with raises(BloomFilterSizeOverflow):
+            bloom_filter.add_many([str(i) for i in range(101)])
+
+        assert bloom_filter.n == 0
+        assert bloom_filter.bit_array.count() == 0
+
+    def test_hash_engines(self):
+        """Assert every engine stores and finds str and buffer items."""
+        items = [str(i) for i in range(500)]
+        others = [str(i) for i in range(500, 1500)]
+
+        for name in ENGINES:
+            bloom_filter = BloomFilter(1000, .01, name)
+            bloom_filter.add_many(items[:250])
+
+            for item in items[250:]:
+                bloom_filter.add(item.encode("UTF-8"))
+
+            assert bloom_filter.contains_many(items) == [True] * len(items)
+            assert memoryview(b"499") in bloom_filter
+            assert bytearray(b"0") in bloom_filter
+            assert sum(bloom_filter.contains_many(others)) < len(others) * .05
+
+        with raises(BloomFilterError):
+            BloomFilter(1000, .01, "md5")
+
+    def test_legacy_engine(self):
+        """Assert the legacy engine matches the composite hash."""
+        bloom_filter = BloomFilter(100000, .01, LEGACY)
+        k, m = bloom_filter.k, bloom_filter.m
+
+        for content in ["123", "asd", "初音ミクはかわいいですか"]:
+            expected = fnv1a64_composite(content, k, m)
+
+            assert list(bloom_filter._get_hashes(content)) == expected
+            assert list(bloom_filter._get_hashes(content.encode())) == expected
+
+        with raises(BloomFilterError):
+            BloomFilter(1000000000, .001, LEGACY)
+
+    def test_large_m(self):
+        """Assert indexes are spread over m larger than 32 bits."""
+        m = 2 ** 40
+        engine = get_hash_engine("xxh64")
+        indexes = [
+            index
+            for i in range(100)
+            for index in hash_indexes(engine.hash(str(i)), 7, m, False)
+        ]
+
+        assert all(0 <= index < m for index in indexes)
+        assert sum(index >= 2 ** 32 for index in indexes) > len(indexes) * .9
+        assert len(set(indexes)) == len(indexes)
+
+    def test_xxh64_fallback(self):
+        """Assert the xxh64 fallback hashes buffers like bytes."""
+        expected = hashing._xxh64(b"http://example.com")
+
+        assert hashing._xxh64(memoryview(b"http://example.com")) == expected
+        assert hashing._xxh64(bytearray(b"http://example.com")) == expected
+        assert ENGINES["xxh64"].hash("http://example.com") == expected
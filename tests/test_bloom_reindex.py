@@ -0,0 +1,158 @@
+"""Test Bloom Filter Reindex."""
+
+
+from illume import config
+from illume.filter.backends import create_filter
+from illume.filter.bloom import BloomFilter
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.persistent_key_filter import PersistentKeyFilter
+from illume.filter.reindex import get_rowid_ranges, reindex_bloom_filter
+from illume.filter.reindex import reindex_like
+from illume.filter.scalable import ScalableBloomFilter
+from illume.filter.xor import FrozenFilter
+from os.path import join
+from uuid import uuid1
+
+
+def create_key_filter(count):
+    path = join(config.get("DATA_DIR"), "keyfilter-{}".format(uuid1()))
+    key_filter = PersistentKeyFilter(path)
+    pairs = [
+        ("example{}.com".format(n % 50), "http://example{}.com/{}".format(
+            n % 50,
+            n
+        ))
+        for n in range(count)
+    ]
+
+    with key_filter.conn:
+        for domain, url in pairs:
+            key_filter.add(domain, url)
+
+    return key_filter, pairs
+
+
+class TestBloomReindex:
+    def test_rowid_ranges(self):
+        assert get_rowid_ranges(None, None, 10) == []
+        assert get_rowid_ranges(1, 1, 10) == [(1, 1)]
+        assert get_rowid_ranges(1, 25, 10) == [(1, 10), (11, 20), (21, 25)]
+
+    def test_reindex(self):
+        """Assert a parallel reindex sets the bits of a serial build."""
+        key_filter, pairs = create_key_filter(5000)
+        urls = [url for _, url in pairs]
+        reports = []
+
+        bloom_filter, rowid = reindex_bloom_filter(
+            key_filter.path,
+            "url",
+            10000,
+            .01,
+            processes=3,
+            chunk_size=400,
+            progress=lambda *args: reports.append(args)
+        )
+        expected = BloomFilter(10000, .01)
+        expected.add_many(urls)
+
+        assert rowid == key_filter.last_rowid()
+        assert bloom_filter.bit_array == expected.bit_array
+        assert bloom_filter.contains_many(urls) == [True] * len(urls)
+        assert len(urls) * .98 < bloom_filter.n <= len(urls)
+        assert len(reports) == 13
+        assert reports[-1] == ("url", 13, 13, len(urls))
+
+        domains, _ = reindex_bloom_filter(
+            key_filter.path,
+            "domain",
+            1000,
+            .01,
+            processes=2
+        )
+
+        assert all(domain in domains for domain, _ in pairs)
+        assert domains.n <= 50
+
+    def test_reindex_blocked(self):
+        """Assert a parallel blocked reindex sets the bits of a serial one."""
+        key_filter, pairs = create_key_filter(3000)
+        urls = [url for _, url in pairs]
+
+        bloom_filter, _ = reindex_bloom_filter(
+            key_filter.path,
+            "url",
+            10000,
+            .01,
+            processes=2,
+            chunk_size=400,
+            blocked=True
+        )
+        expected = BloomFilter(10000, .01, blocked=True)
+        expected.add_many(urls)
+
+        assert bloom_filter.blocked
+        assert bloom_filter.bit_array == expected.bit_array
+
+    def test_reindex_like(self):
+        """Assert filters are rebuilt with their kind and new sizes."""
+        key_filter, pairs = create_key_filter(3000)
+        urls = [url for _, url in pairs]
+
+        resized, _ = reindex_like(
+            key_filter.path,
+            "url",
+            BloomFilter(1000, .1),
+            max_n=5000,
+            p=.001,
+            processes=2
+        )
+
+        assert (resized.max_n, resized.p) == (5000, .001)
+        assert resized.contains_many(urls) == [True] * len(urls)
+
+        scalable, _ = reindex_like(
+            key_filter.path,
+            "url",
+            ScalableBloomFilter(100, .01),
+            processes=2
+        )
+
+        assert isinstance(scalable, ScalableBloomFilter)
+        assert len(scalable.filters) == 1
+        assert scalable.filters[0].max_n == len(urls)
+        assert scalable.contains_many(urls) == [True] * len(urls)
+
+        scalable.add("http://example.org")
+
+        assert "http://example.org" in scalable
+
+    def test_reindex_like_cuckoo_and_frozen(self):
+        """Assert cuckoo filters are rebuilt and frozen filters frozen."""
+        key_filter, pairs = create_key_filter(3000)
+        urls = [url for _, url in pairs]
+
+        cuckoo_filter, rowid = reindex_like(
+            key_filter.path,
+            "domain",
+            CuckooFilter(1000, .01)
+        )
+
+        assert isinstance(cuckoo_filter, CuckooFilter)
+        assert rowid == key_filter.last_rowid()
+        assert all(domain in cuckoo_filter for domain, _ in pairs)
+        assert cuckoo_filter.n <= 50
+
+        frozen_filter, rowid = reindex_like(
+            key_filter.path,
+            "url",
+            create_filter("xor", 10000, .01)
+        )
+
+        assert isinstance(frozen_filter, FrozenFilter)
+        assert rowid == key_filter.last_rowid()
+        assert frozen_filter.frozen.n == len(urls)
+        assert frozen_filter.delta.n == 0
+        assert frozen_filter.delta.max_n == 1000
+        assert frozen_filter.p == .01
+        assert frozen_filter.contains_many(urls) == [True] * len(urls)
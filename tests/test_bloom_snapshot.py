@@ -0,0 +1,139 @@
+"""Test Bloom Filter Snapshots."""
+
+
+from asyncio import new_event_loop
+from illume.error import BloomFilterError
+from illume.filter.bloom import BloomFilter
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.scalable import ScalableBloomFilter
+from illume.filter.snapshot import ALIGNMENT, Snapshotter
+from illume.filter.snapshot import load_snapshot, save_snapshot
+from illume.filter.xor import FrozenFilter, build_xor_filter
+from illume.util import get_temp_file_name, remove_or_ignore_file
+from os import stat
+from pytest import raises
+
+
+class TestBloomSnapshot:
+    def setup_method(self, method):
+        self.path = get_temp_file_name()
+
+    def teardown_method(self, method):
+        remove_or_ignore_file(self.path)
+
+    def test_save_and_load(self):
+        """Assert a loaded filter equals the saved one."""
+        bloom_filter = BloomFilter(10000, .01)
+        items = [str(i) for i in range(1000)]
+        bloom_filter.add_many(items)
+
+        save_snapshot(bloom_filter, self.path, {"rowid": 42})
+        loaded, metadata = load_snapshot(self.path)
+
+        assert metadata == {"rowid": 42}
+        assert loaded.n == bloom_filter.n
+        assert loaded.m == bloom_filter.m
+        assert loaded.k == bloom_filter.k
+        assert loaded.bit_array == bloom_filter.bit_array
+        assert loaded.contains_many(items) == [True] * len(items)
+
+        loaded.add("http://example.com")
+
+        assert "http://example.com" in loaded
+
+    def test_save_and_load_scalable(self):
+        """Assert every filter of a scalable filter is saved."""
+        bloom_filter = ScalableBloomFilter(100, .01)
+        items = [str(i) for i in range(1000)]
+        bloom_filter.add_many(items)
+
+        save_snapshot(bloom_filter, self.path)
+        loaded, metadata = load_snapshot(self.path)
+
+        assert metadata == {}
+        assert isinstance(loaded, ScalableBloomFilter)
+        assert len(loaded.filters) == len(bloom_filter.filters) > 1
+        assert loaded.n == bloom_filter.n
+        assert loaded.contains_many(items) == [True] * len(items)
+
+        for saved, sub_filter in zip(bloom_filter.filters, loaded.filters):
+            assert saved.bit_array == sub_filter.bit_array
+
+    def test_save_and_load_cuckoo(self):
+        """Assert cuckoo filters are saved with their table."""
+        cuckoo_filter = CuckooFilter(10000, .001)
+        items = [str(i) for i in range(1000)]
+        cuckoo_filter.add_many(items)
+
+        save_snapshot(cuckoo_filter, self.path)
+        loaded, _ = load_snapshot(self.path)
+
+        assert isinstance(loaded, CuckooFilter)
+        assert (loaded.n, loaded.f) == (cuckoo_filter.n, cuckoo_filter.f)
+        assert loaded.table == cuckoo_filter.table
+        assert loaded.contains_many(items) == [True] * len(items)
+
+    def test_save_and_load_frozen(self):
+        """Assert frozen filters are saved with both filters."""
+        items = [str(i) for i in range(2000)]
+        frozen_filter = FrozenFilter(
+            build_xor_filter(items[:1000], .005),
+            CuckooFilter(1000, .005)
+        )
+        frozen_filter.add_many(items[1000:])
+
+        save_snapshot(frozen_filter, self.path, {"rowid": 2000})
+        loaded, metadata = load_snapshot(self.path)
+
+        assert metadata == {"rowid": 2000}
+        assert isinstance(loaded, FrozenFilter)
+        assert loaded.frozen.seed == frozen_filter.frozen.seed
+        assert loaded.frozen.table == frozen_filter.frozen.table
+        assert loaded.delta.n == 1000
+        assert loaded.contains_many(items) == [True] * len(items)
+
+    def test_corrupt(self):
+        """Assert damaged snapshots are rejected."""
+        bloom_filter = BloomFilter(10000, .01)
+        bloom_filter.add("http://example.com")
+        save_snapshot(bloom_filter, self.path)
+
+        with open(self.path, "r+b") as f:
+            # First byte of the bit array.
+            f.seek(ALIGNMENT)
+            f.write(b"\xff")
+
+        with raises(BloomFilterError):
+            load_snapshot(self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(b"ILBS")
+
+        with raises(BloomFilterError):
+            load_snapshot(self.path)
+
+    def test_snapshotter(self):
+        """Assert snapshots are only written for changed filters."""
+        loop = new_event_loop()
+        bloom_filter = BloomFilter(10000, .01)
+        snapshotter = Snapshotter(
+            {self.path: bloom_filter},
+            metadata=lambda: {"rowid": bloom_filter.n},
+            loop=loop
+        )
+
+        bloom_filter.add("http://example.com")
+        loop.run_until_complete(snapshotter.snapshot())
+        modified = stat(self.path).st_mtime_ns
+
+        loop.run_until_complete(snapshotter.snapshot())
+
+        assert stat(self.path).st_mtime_ns == modified
+
+        bloom_filter.add("http://example.org")
+        loop.run_until_complete(snapshotter.stop())
+        loaded, metadata = load_snapshot(self.path)
+
+        assert metadata == {"rowid": 2}
+        assert "http://example.org" in loaded
+        loop.close()
@@ -0,0 +1,81 @@
+"""Test response body storage."""
+
+
+from illume.body import BODY_PREFIX, DISK, MEMORY, get_shared_memory_directory
+from illume.body import open_body, sweep_bodies
+from illume.error import FileNotFound
+from illume.util import get_temp_file_name
+from os import utime
+from os.path import exists, join
+from pytest import raises
+
+
+BODY = "<a href='http://example.com/ミク'>link</a>"
+
+
+def write_body(content=BODY, path=None):
+    if path is None:
+        path = get_temp_file_name()
+
+    with open(path, "wb") as f:
+        f.write(content.encode("UTF-8"))
+
+    return path
+
+
+class TestBody:
+    def test_disk_body(self):
+        path = write_body()
+
+        with open_body({"path": path, "body_store": DISK}) as stream:
+            assert stream.read() == BODY
+
+        assert exists(path)
+
+    def test_memory_body_is_consumed(self):
+        path = write_body()
+
+        with open_body({"path": path, "body_store": MEMORY}) as stream:
+            assert stream.read(2) == BODY[:2]
+            stream.seek(0)
+            assert stream.read() == BODY
+
+        assert not exists(path)
+
+    def test_memory_body_has_one_consumer(self):
+        path = write_body()
+        message = {"path": path, "body_store": MEMORY}
+
+        with open_body(message) as stream:
+            # A second consumer fails, the first still reads the body.
+            with raises(FileNotFound):
+                open_body(message)
+
+            assert stream.read() == BODY
+
+    def test_sweep_bodies(self, tmpdir):
+        directory = str(tmpdir)
+        stale = write_body(path=join(directory, BODY_PREFIX + "stale"))
+        fresh = write_body(path=join(directory, BODY_PREFIX + "fresh"))
+        other = write_body(path=join(directory, "other"))
+
+        for path in (stale, other):
+            utime(path, (0, 0))
+
+        assert sweep_bodies(directory, 60) == 1
+        assert not exists(stale)
+        assert exists(fresh)
+        assert exists(other)
+
+    def test_empty_memory_body(self):
+        path = write_body("")
+
+        assert open_body({"path": path, "body_store": MEMORY}).read() == ""
+
+    def test_missing_body(self):
+        for store in (DISK, MEMORY):
+            with raises(FileNotFound):
+                open_body({"path": get_temp_file_name(), "body_store": store})
+
+    def test_disk_is_default(self):
+        assert get_shared_memory_directory() is None
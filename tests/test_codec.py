@@ -0,0 +1,54 @@
+"""Test socket queue codecs."""
+
+
+from illume.queues.codec import CODECS, CompressedCodec, JSONCodec
+from illume.queues.codec import MarshalCodec
+from illume.queues.codec import choose_codec, get_codec
+from sys import version_info
+
+
+MESSAGE = {
+    "url": "http://example.com/",
+    "domain": "example.com",
+    "success": True,
+    "http_code": 200,
+    "urls": [{"url": "http://example.com/ミク", "domain": "example.com"}],
+    "ratio": .5,
+    "error": None
+}
+
+
+class TestCodec:
+    def test_round_trip(self):
+        for Codec in CODECS.values():
+            codec = Codec()
+
+            assert codec.decode(codec.encode(MESSAGE)) == MESSAGE
+
+    def test_preference(self):
+        assert list(CODECS)[0] == MarshalCodec.name
+        assert list(CODECS)[-1] == JSONCodec.name
+
+    def test_choose_codec(self):
+        offered = ["unknown", JSONCodec.name, MarshalCodec.name]
+
+        assert choose_codec(offered) == JSONCodec.name
+        assert choose_codec(["unknown"]) == JSONCodec.name
+
+    def test_marshal_name(self):
+        version = "py{}.{}".format(*version_info[:2])
+
+        assert MarshalCodec.name.endswith(version)
+        assert choose_codec(["marshal-4-py2.7"]) == JSONCodec.name
+
+    def test_get_codec_fallback(self):
+        assert isinstance(get_codec("unknown"), JSONCodec)
+        assert isinstance(get_codec(MarshalCodec.name), MarshalCodec)
+
+    def test_compressed_codec(self):
+        codec = get_codec("zlib+" + JSONCodec.name)
+
+        assert isinstance(codec, CompressedCodec)
+        assert codec.name == "zlib+" + JSONCodec.name
+        assert codec.decode(codec.encode(MESSAGE)) == MESSAGE
+        assert choose_codec(["zlib+unknown", codec.name]) == codec.name
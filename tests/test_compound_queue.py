@@ -1,4 +1,5 @@
-from asyncio import new_event_loop
+from asyncio import ensure_future, new_event_loop, sleep
+from illume.queues.base import AsyncQueue
 from illume.queues.compound import CompoundQueue
 from illume.test.base import IllumeTest
 from pytest import raises
@@ -28,9 +29,52 @@ class TestCompoundQueue(IllumeTest):
     def test_start(self):
         self.run_queue_action("start", "start")
 
-    def test_get(self):
-        with raises(NotImplementedError):
-            self.run_queue_action("get", "get")
+    def test_get(self, loop):
+        queues = [ChildQueue(loop=loop) for n in range(3)]
+        queue = CompoundQueue(queues, loop=loop)
+
+        async def run():
+            for n, child in enumerate(queues):
+                await child.put(n)
+
+            return [await queue.get() for n in range(len(queues))]
+
+        assert sorted(loop.run_until_complete(run())) == [0, 1, 2]
+
+    def test_get_many(self, loop):
+        queues = [ChildQueue(loop=loop) for n in range(2)]
+        queue = CompoundQueue(queues, loop=loop)
+
+        async def run():
+            for n in range(4):
+                await queues[n % 2].put(n)
+
+            first = await queue.get_many(10)
+            second = await queue.get_many(10, timeout=.01)
+            third = await queue.get_many(10, timeout=.01)
+
+            return first + second + third
+
+        assert sorted(loop.run_until_complete(run())) == [0, 1, 2, 3]
+
+    def test_async_for(self, loop):
+        queues = [ChildQueue(loop=loop) for n in range(2)]
+        queue = CompoundQueue(queues, loop=loop)
+        results = []
+
+        async def run():
+            for n in range(4):
+                await queues[n % 2].put(n)
+
+            async for data in queue:
+                results.append(data)
+
+                if len(results) == 4:
+                    await queue.stop()
+
+        loop.run_until_complete(run())
+
+        assert sorted(results) == [0, 1, 2, 3]
 
     def test_put(self, loop):
         args = (1234,)
@@ -38,10 +82,141 @@ class TestCompoundQueue(IllumeTest):
             "args": args,
             "action_args": args,
             "set_ready": True,
+            "flush": True,
             "loop": loop
         }
         self.run_queue_action("put", "put", options)
 
+    def test_broadcast_reuses_writers(self, loop):
+        queues = [ChildQueue(loop=loop) for n in range(2)]
+        queue = CompoundQueue(queues, loop=loop)
+
+        async def run():
+            await queue.put(0)
+            writers = list(queue.writers)
+            await queue.put_many([1, 2])
+            await queue.flush()
+
+            assert queue.writers == writers
+
+            received = []
+
+            for child in queues:
+                messages = []
+
+                for n in range(3):
+                    messages.append(await child._get_single())
+
+                received.append(messages)
+
+            return received
+
+        assert loop.run_until_complete(run()) == [[0, 1, 2], [0, 1, 2]]
+
+    def test_broadcast_raises_child_error(self, loop):
+        class FailingQueue(ChildQueue):
+            async def put(self, data):
+                raise ValueError(data)
+
+        queues = [ChildQueue(loop=loop), FailingQueue(loop=loop)]
+        queue = CompoundQueue(queues, loop=loop)
+
+        with raises(ValueError):
+            loop.run_until_complete(queue.put(0))
+
+        with raises(ValueError):
+            loop.run_until_complete(queue.put_many([1, 2]))
+
+        # Children that took a message keep it.
+        assert queues[0].qsize() == 3
+
+    def test_broadcast_waits_for_delivery(self, loop):
+        received = []
+
+        class SlowQueue(ChildQueue):
+            async def put(self, data):
+                await sleep(.01, loop=loop)
+                received.append(data)
+
+        queue = CompoundQueue([SlowQueue(loop=loop)], loop=loop)
+
+        loop.run_until_complete(queue.put_many([0, 1]))
+
+        assert received == [0, 1]
+
+    def test_stop_delivers_broadcasts(self, loop):
+        received = []
+
+        class RecordingQueue(ChildQueue):
+            async def put(self, data):
+                received.append(data)
+
+        queues = [RecordingQueue(loop=loop) for n in range(2)]
+        queue = CompoundQueue(queues, loop=loop)
+
+        async def run():
+            await queue.start()
+            put = ensure_future(queue.put_many(list(range(100))), loop=loop)
+            # Stop while the messages are buffered for the writers.
+            await sleep(0, loop=loop)
+            await queue.stop()
+            await put
+
+        loop.run_until_complete(run())
+
+        assert sorted(received) == sorted(list(range(100)) * 2)
+        assert queue.dropped == 0
+
+    def test_stop_counts_dropped(self, loop):
+        class BlockedQueue(ChildQueue):
+            async def put(self, data):
+                await sleep(10, loop=loop)
+
+        queues = [BlockedQueue(loop=loop)]
+        queue = CompoundQueue(queues, loop=loop, feed_size=10,
+                              stop_timeout=.01)
+
+        async def run():
+            await queue.start()
+            put = ensure_future(queue.put_many([0, 1, 2]), loop=loop)
+            await sleep(0, loop=loop)
+            await queue.stop()
+            await put
+
+        loop.run_until_complete(run())
+
+        # The writer was blocked on the first message, two were waiting.
+        assert queue.dropped == 2
+
+    def test_route(self, loop):
+        queues = [ChildQueue(loop=loop) for n in range(4)]
+        queue = CompoundQueue(queues, loop=loop, route="domain")
+        messages = [
+            {"domain": "{}.com".format(n % 3), "id": n}
+            for n in range(30)
+        ]
+
+        async def run():
+            await queue.put_many(messages[:15])
+
+            for message in messages[15:]:
+                await queue.put(message)
+
+        loop.run_until_complete(run())
+
+        domains = {}
+
+        for n, child in enumerate(queues):
+            while child.qsize():
+                message = child._get_buffered()
+                domains.setdefault(message["domain"], set()).add(n)
+
+        # Every domain landed on exactly one child, in a stable way.
+        assert sorted(domains) == ["0.com", "1.com", "2.com"]
+
+        for domain, children in domains.items():
+            assert children == {queue.partition({"domain": domain})}
+
     def test_stop(self, loop):
         self.run_queue_action("stop", "stop")
 
@@ -50,6 +225,7 @@ class TestCompoundQueue(IllumeTest):
         args = options.get("args", ())
         action_args = options.get("action_args", ())
         set_ready = options.get("set_ready", False)
+        flush = options.get("flush", False)
         loop = options.get("loop", new_event_loop())
 
         class MockQueue:
@@ -72,6 +248,9 @@ class TestCompoundQueue(IllumeTest):
 
         loop.run_until_complete(action)
 
+        if flush:
+            loop.run_until_complete(queue.flush())
+
         assert len(results) > 0
         assert len(results) == len(queues)
 
@@ -82,3 +261,11 @@ class TestCompoundQueue(IllumeTest):
                 assert value == True
 
         return results
+
+
+class ChildQueue(AsyncQueue):
+    async def start(self):
+        pass
+
+    async def stop(self):
+        self.close()
@@ -0,0 +1,74 @@
+"""Test Cuckoo Filter."""
+
+
+from illume.error import BloomFilterError, BloomFilterSizeOverflow
+from illume.filter.backends import create_filter
+from illume.filter.cuckoo import CuckooFilter, get_fingerprint_size
+from pytest import raises
+
+
+class TestCuckooFilter:
+    def test_add_and_contains(self):
+        """Assert added items are found and others mostly are not."""
+        p = .01
+        cuckoo_filter = CuckooFilter(10000, p)
+        items = [str(i) for i in range(10000)]
+        others = [str(i) for i in range(10000, 30000)]
+
+        for item in items[:5000]:
+            cuckoo_filter.add(item)
+
+        cuckoo_filter.add_many(items[5000:])
+
+        assert cuckoo_filter.n == len(cuckoo_filter) == len(items)
+        assert all(item in cuckoo_filter for item in items)
+        assert cuckoo_filter.contains_many(items) == [True] * len(items)
+        assert sum(cuckoo_filter.contains_many(others)) / len(others) < p
+        assert cuckoo_filter.current_p_float < p
+        assert cuckoo_filter.full
+
+    def test_overflow(self):
+        """Assert filters don't take more than max_n items."""
+        cuckoo_filter = CuckooFilter(100, .01)
+        cuckoo_filter.add_many([str(i) for i in range(100)])
+
+        with raises(BloomFilterSizeOverflow):
+            cuckoo_filter.add("100")
+
+        with raises(BloomFilterSizeOverflow):
+            CuckooFilter(100, .01).add_many([str(i) for i in range(101)])
+
+    def test_remove(self):
+        """Assert removed items are no longer found."""
+        cuckoo_filter = CuckooFilter(1000, .001)
+        items = [str(i) for i in range(1000)]
+        cuckoo_filter.add_many(items)
+
+        assert cuckoo_filter.remove("42")
+        assert "42" not in cuckoo_filter
+        assert not cuckoo_filter.remove("42")
+        assert cuckoo_filter.n == 999
+        assert all(item in cuckoo_filter for item in items if item != "42")
+
+    def test_size(self):
+        """Assert fingerprints grow with the error rate."""
+        assert get_fingerprint_size(.01) == 10
+        assert get_fingerprint_size(.001) == 13
+        assert get_fingerprint_size(1e-12) == 32
+
+        small = CuckooFilter(100000, .0001)
+        large = create_filter("bloom", 100000, .0001)
+
+        assert small.nbytes < large.nbytes
+        assert small.bits_per_key < 17 / .9
+
+    def test_table(self):
+        """Assert filters can be created from an existing table."""
+        cuckoo_filter = CuckooFilter(1000, .01)
+        cuckoo_filter.add("http://example.com")
+        copy = CuckooFilter(1000, .01, table=bytearray(cuckoo_filter.table))
+
+        assert "http://example.com" in copy
+
+        with raises(BloomFilterError):
+            CuckooFilter(1000, .01, table=bytearray(10))
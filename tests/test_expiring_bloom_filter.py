@@ -0,0 +1,78 @@
+"""Test Expiring Bloom Filter."""
+
+
+from illume.filter.expiring import ExpiringBloomFilter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestExpiringBloomFilter:
+    def test_expire(self):
+        """Assert items are kept for window and dropped after."""
+        clock = Clock()
+        bloom_filter = ExpiringBloomFilter(1000, .01, 30, 4, clock=clock)
+
+        bloom_filter.add("http://example.com")
+        clock.now = 29
+
+        assert "http://example.com" in bloom_filter
+
+        clock.now = 40
+
+        assert "http://example.com" not in bloom_filter
+        assert bloom_filter.n == 0
+
+    def test_renew(self):
+        """Assert adding a present item renews it."""
+        clock = Clock()
+        bloom_filter = ExpiringBloomFilter(1000, .01, 30, 4, clock=clock)
+
+        bloom_filter.add("http://example.com")
+        clock.now = 25
+        bloom_filter.add("http://example.com")
+        clock.now = 50
+
+        assert "http://example.com" in bloom_filter
+
+        clock.now = 70
+
+        assert "http://example.com" not in bloom_filter
+
+    def test_idle(self):
+        """Assert every generation is dropped after a long idle time."""
+        clock = Clock()
+        bloom_filter = ExpiringBloomFilter(1000, .01, 30, 4, clock=clock)
+        items = [str(i) for i in range(100)]
+
+        bloom_filter.add_many(items)
+        clock.now = 1000
+
+        assert bloom_filter.contains_many(items) == [False] * len(items)
+
+        bloom_filter.add_many(items)
+        clock.now = 1029
+
+        assert bloom_filter.contains_many(items) == [True] * len(items)
+
+    def test_bounded(self):
+        """Assert full generations rotate early instead of overflowing."""
+        clock = Clock()
+        bloom_filter = ExpiringBloomFilter(100, .01, 30, 3, clock=clock)
+        items = [str(i) for i in range(1000)]
+        m = sum(g.m for g in bloom_filter.generations)
+
+        for item in items[:500]:
+            bloom_filter.add(item)
+
+        bloom_filter.add_many(items[500:])
+
+        assert len(bloom_filter.generations) == 3
+        assert sum(g.m for g in bloom_filter.generations) == m
+        assert bloom_filter.n <= 300
+        assert bloom_filter.contains_many(items[-200:]) == [True] * 200
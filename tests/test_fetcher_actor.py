@@ -1,12 +1,13 @@
 """Test fetcher actor."""
 
 
-from asyncio import new_event_loop, Queue as AsyncIOQueue
+from asyncio import new_event_loop, sleep, Queue as AsyncIOQueue
 from illume.error import ReadCutoff
 from illume.test.actor import mock_actor
 from illume.test.http import start_http_process, stop_http_process
 from illume.test.http import generate_url, TEST_HTTP_HOST, TEST_HTTP_PORT
-from illume.workers.http_fetcher import HTTPFetcher
+from illume.workers import http_fetcher
+from illume.workers.http_fetcher import HTTPFetcher, PoliteHTTPFetcher
 from os.path import exists
 from pytest import raises, fixture
 from urllib.parse import urlsplit
@@ -53,6 +54,53 @@ class TestFetcherActor:
 
         loop.run_until_complete(perform())
 
+    def test_polite_stop(self, loop):
+        class BlockedFetcher(PoliteHTTPFetcher):
+            async def fetch(self, message):
+                await sleep(10, loop=loop)
+
+        actor = BlockedFetcher(None, None, loop=loop)
+
+        async def perform():
+            await actor.initialize()
+
+            for n in range(3):
+                await actor.on_message({
+                    "url": "http://example.com/{}".format(n),
+                    "domain": "example.com"
+                })
+
+            await sleep(0, loop=loop)
+            await actor.stop()
+            await actor.finalize()
+
+        loop.run_until_complete(perform())
+
+        assert all(worker.done() for worker in actor.workers)
+        assert actor.host_queue.closed
+
+    def test_unexpected_error_removes_body(self, loop, monkeypatch):
+        writers = []
+
+        class BrokenRequest:
+            def __init__(self, url, writer, **kwargs):
+                writers.append(writer)
+
+            async def perform(self):
+                raise ValueError("broken")
+
+        monkeypatch.setattr(http_fetcher, "HTTPRequest", BrokenRequest)
+        actor = HTTPFetcher(None, None, loop=loop)
+
+        with raises(ValueError):
+            loop.run_until_complete(actor.fetch({
+                "url": "http://example.com/",
+                "domain": "example.com"
+            }))
+
+        assert writers[0].closed
+        assert not exists(writers[0].name)
+
     def test_request_fail(self, loop):
         inbox = AsyncIOQueue(loop=loop)
         outbox = AsyncIOQueue(loop=loop)
@@ -3,6 +3,7 @@
 
 from asyncio import new_event_loop, QueueEmpty, Queue as AsyncIOQueue
 from illume import config
+from illume.url_batch import URL_BATCH_KEY, URLBatch
 from illume.util import  remove_or_ignore_file
 from illume.workers.filter import KeyFilter
 from pytest import raises
@@ -99,3 +100,24 @@ class TestActor:
         assert results['known']['url'] == known_url
         assert results['override']['url'] == known_url
         assert results['recrawl']['url'] == known_url
+
+    def test_filter_url_batch(self):
+        loop, inbox, outbox, key_filter = setup_filter(1)
+        batch = URLBatch()
+        batch.add("http://piapro.net/intl/en.html", "piapro.net")
+        batch.add("http://google.com/", "google.com")
+        batch.add("http://piapro.net/intl/en.html", "piapro.net")
+
+        async def run():
+            await inbox.put({URL_BATCH_KEY: batch.serialize()})
+            await key_filter.start()
+
+        loop.run_until_complete(run())
+
+        assert outbox.qsize() == 2
+        assert outbox.get_nowait() == {
+            "url": "http://piapro.net/intl/en.html",
+            "domain": "piapro.net",
+            "fetch_priority": 2
+        }
+        assert outbox.get_nowait()["domain"] == "google.com"
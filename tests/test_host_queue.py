@@ -0,0 +1,108 @@
+"""Test host queue."""
+
+
+from asyncio import ensure_future, sleep
+from illume.queues.host import HostQueue
+from illume.test.base import IllumeTest
+
+
+def message(domain, n, priority=5):
+    return {
+        "url": "http://{}/{}".format(domain, n),
+        "domain": domain,
+        "fetch_priority": priority
+    }
+
+
+class TestHostQueue(IllumeTest):
+    def test_interleaves_hosts(self, loop):
+        queue = HostQueue(delay=10, concurrency=10, loop=loop)
+
+        for n in range(3):
+            loop.run_until_complete(queue.put(message("a.com", n)))
+
+        loop.run_until_complete(queue.put(message("b.com", 0)))
+
+        first = loop.run_until_complete(queue.get())
+        second = loop.run_until_complete(queue.get())
+
+        assert first['domain'] == "a.com"
+        assert second['domain'] == "b.com"
+        assert queue.depths == {"a.com": 2}
+        assert queue.qsize() == 2
+
+    def test_delay(self, loop):
+        delay = .05
+        queue = HostQueue(delay=delay, concurrency=10, loop=loop)
+
+        for n in range(2):
+            loop.run_until_complete(queue.put(message("a.com", n)))
+
+        async def run():
+            await queue.get()
+            start = loop.time()
+            await queue.get()
+
+            return loop.time() - start
+
+        assert loop.run_until_complete(run()) >= delay * .9
+
+    def test_concurrency(self, loop):
+        queue = HostQueue(delay=0, concurrency=1, loop=loop)
+
+        for n in range(2):
+            loop.run_until_complete(queue.put(message("a.com", n)))
+
+        async def run():
+            first = await queue.get()
+            pending = ensure_future(queue.get(), loop=loop)
+            await sleep(.01, loop=loop)
+
+            # The second message waits until the first one is released.
+            assert not pending.done()
+
+            queue.release(first['domain'])
+
+            return await pending
+
+        assert loop.run_until_complete(run())['url'] == "http://a.com/1"
+
+    def test_forgets_idle_hosts(self, loop):
+        queue = HostQueue(delay=0, concurrency=1, loop=loop)
+
+        loop.run_until_complete(queue.put(message("a.com", 0)))
+        data = loop.run_until_complete(queue.get())
+        queue.release(data['domain'])
+
+        assert queue.hosts == {}
+        assert len(queue.active) == 0
+
+    def test_priority_within_host(self, loop):
+        queue = HostQueue(delay=0, concurrency=10, loop=loop)
+
+        for n, priority in enumerate([5, 1, 3]):
+            loop.run_until_complete(queue.put(message("a.com", n, priority)))
+
+        urls = [loop.run_until_complete(queue.get())['url'] for n in range(3)]
+
+        assert urls == ["http://a.com/1", "http://a.com/2", "http://a.com/0"]
+        assert queue.depths == {}
+
+    def test_prunes_expired_delays(self, loop):
+        delay = .01
+        queue = HostQueue(delay=delay, concurrency=1, loop=loop)
+
+        for n in range(10):
+            domain = "{}.com".format(n)
+            loop.run_until_complete(queue.put(message(domain, 0)))
+            data = loop.run_until_complete(queue.get())
+            queue.release(data['domain'])
+
+        # Delays of idle hosts are kept until they expire.
+        assert len(queue.next_allowed) > 0
+
+        loop.run_until_complete(sleep(delay, loop=loop))
+        loop.run_until_complete(queue.put(message("a.com", 0)))
+
+        assert len(queue.next_allowed) == 0
+        assert len(queue.expiring) == 0
@@ -149,6 +149,23 @@ class TestPersistentKeyFilter:
         assert len(secondary_domains) == 0
         assert len(secondary_urls) == 0
 
+    def test_iter_since(self):
+        filter = self.create_filter(key_size)
+        pairs = get_pairs(10, 10)
+
+        assert filter.last_rowid() == 0
+
+        for domain, url in pairs:
+            filter.add(domain, url)
+
+        last_rowid = filter.last_rowid()
+        rows = list(filter.iter_since(0))
+
+        assert [(domain, url) for _, domain, url in rows] == pairs
+        assert rows[-1][0] == last_rowid
+        assert list(filter.iter_since(rows[4][0])) == rows[5:]
+        assert list(filter.iter_since(last_rowid)) == []
+
     def create_filter(self, key_size=8):
         # Create/check test folder.
         path = join(config.get("DATA_DIR"), "keyfilter-{}".format(uuid1()))
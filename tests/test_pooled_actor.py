@@ -1,7 +1,7 @@
 """Test pooled actor."""
 
 
-from asyncio import new_event_loop
+from asyncio import new_event_loop, sleep
 from pytest import fixture, raises, fail
 from illume.actor import Actor
 from illume.error import QueueError
@@ -144,3 +144,93 @@ class TestPooledActor:
             "on_stop",
             "stop"
         ])
+
+    def test_pooled_actor_drops_after_failure(self, loop):
+        result_queue = Queue()
+
+        class TestActor(Actor):
+            max_concurrency = 2
+
+            async def on_message(self, message):
+                if message == "fail":
+                    raise ValueError(message)
+
+                result_queue.put(message)
+
+        class MockPooledQueue(PooledQueue):
+            def start(self):
+                run = loop.run_until_complete
+                run(self.pooled_actor.on_message("fail"))
+                run(sleep(0, loop=loop))
+                run(self.pooled_actor.on_message("dropped"))
+
+            async def stop(self):
+                result_queue.put("stop")
+
+        pooled_queue = MockPooledQueue()
+        pooled_actor = PooledActor(TestActor, pooled_queue, loop)
+        pooled_actor.set_outbox("test-outbox")
+        pooled_actor.start()
+
+        assert not pooled_actor.actor.running
+        check_queue(result_queue, "stop")
+
+    def test_pooled_actor_joins_in_flight(self, loop):
+        result_queue = Queue()
+
+        class TestActor(Actor):
+            max_concurrency = 2
+
+            async def on_message(self, message):
+                try:
+                    await sleep(10, loop=loop)
+                finally:
+                    result_queue.put(message)
+
+            async def on_stop(self):
+                result_queue.put("on_stop")
+
+        class MockPooledQueue(PooledQueue):
+            def start(self):
+                run = loop.run_until_complete
+                run(self.pooled_actor.on_message("in-flight"))
+                run(sleep(0, loop=loop))
+
+            async def stop(self):
+                result_queue.put("stop")
+
+        pooled_queue = MockPooledQueue()
+        pooled_actor = PooledActor(TestActor, pooled_queue, loop)
+        pooled_actor.set_outbox("test-outbox")
+        pooled_actor.start()
+
+        check_queue_multi(result_queue, ["in-flight", "on_stop", "stop"])
+
+    def test_pooled_actor_batches(self, loop):
+        batches = []
+
+        class TestActor(Actor):
+            batch_size = 3
+            batch_linger = .01
+
+            async def on_message_batch(self, messages):
+                batches.append(messages)
+
+        class MockPooledQueue(PooledQueue):
+            def start(self):
+                run = loop.run_until_complete
+
+                for n in range(4):
+                    run(self.pooled_actor.on_message(n))
+
+                # The last message is handed over once the batch lingered.
+                run(sleep(.05, loop=loop))
+                run(self.pooled_actor.on_message(4))
+
+        pooled_queue = MockPooledQueue()
+        pooled_actor = PooledActor(TestActor, pooled_queue, loop)
+        pooled_actor.set_outbox("test-outbox")
+        pooled_actor.start()
+
+        # Stopping flushes the batch that is still lingering.
+        assert batches == [[0, 1, 2], [3], [4]]
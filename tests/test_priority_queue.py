@@ -0,0 +1,84 @@
+"""Test priority queue."""
+
+
+from asyncio import QueueEmpty
+from illume.queues.priority import PriorityAsyncQueue
+from illume.queues.priority import PooledUnixSocketPriorityServerQueue
+from illume.test.base import IllumeTest
+from pytest import raises
+
+
+class TestPriorityAsyncQueue(IllumeTest):
+    def test_priority_order(self, loop):
+        queue = PriorityAsyncQueue(loop=loop)
+        priorities = [5, 3, 1, 4, 2, 5, 1]
+
+        for n, priority in enumerate(priorities):
+            loop.run_until_complete(queue.put({
+                "id": n,
+                "fetch_priority": priority
+            }))
+
+        results = [
+            loop.run_until_complete(queue.get())
+            for n in range(len(priorities))
+        ]
+
+        assert [r['fetch_priority'] for r in results] == sorted(priorities)
+        # Messages of equal priority keep their arrival order.
+        assert [r['id'] for r in results][:2] == [2, 6]
+
+    def test_default_priority(self, loop):
+        queue = PriorityAsyncQueue(loop=loop, default=3)
+
+        loop.run_until_complete(queue.put({"id": "default"}))
+        loop.run_until_complete(queue.put({"id": "low", "fetch_priority": 4}))
+
+        assert queue.get_nowait()['id'] == "default"
+        assert queue.get_nowait()['id'] == "low"
+
+    def test_starvation_protection(self, loop):
+        aging = 10
+        queue = PriorityAsyncQueue(loop=loop, aging=aging)
+
+        loop.run_until_complete(queue.put({"fetch_priority": 2}))
+
+        for n in range(aging * 2):
+            loop.run_until_complete(queue.put({"fetch_priority": 1}))
+
+        # The low priority message ages past later high priority messages.
+        results = [queue.get_nowait()['fetch_priority'] for n in range(aging)]
+
+        assert 2 in results
+
+    def test_depths(self, loop):
+        queue = PriorityAsyncQueue(loop=loop)
+
+        for priority in (1, 1, 2, 5):
+            loop.run_until_complete(queue.put({"fetch_priority": priority}))
+
+        assert queue.depths == {1: 2, 2: 1, 5: 1}
+        assert queue.qsize() == 4
+
+        queue.get_nowait()
+
+        assert queue.depths == {1: 1, 2: 1, 5: 1}
+
+    def test_get_nowait_empty(self, loop):
+        queue = PriorityAsyncQueue(loop=loop)
+
+        with raises(QueueEmpty):
+            queue.get_nowait()
+
+
+class TestPooledUnixSocketPriorityServerQueue(IllumeTest):
+    def test_connection_queues_on_server(self, loop):
+        server = PooledUnixSocketPriorityServerQueue("path", loop)
+        conn = server.get_connection("reader", "writer")
+
+        assert conn.pooled_actor == server
+
+        loop.run_until_complete(server.on_message({"fetch_priority": 2}))
+        loop.run_until_complete(server.on_message({"fetch_priority": 1}))
+
+        assert server.depths == {1: 1, 2: 1}
@@ -1,7 +1,7 @@
 """Test actor."""
 
 
-from asyncio import new_event_loop
+from asyncio import new_event_loop, gather, sleep
 from illume.queues.base import AsyncQueue, QueueClosed
 from pytest import raises
 
@@ -34,3 +34,124 @@ class TestQueue:
 
         with raises(QueueClosed):
             loop.run_until_complete(queue.put(1))
+
+    def test_queue_watermarks(self):
+        loop = new_event_loop()
+        queue = AsyncQueue(1, loop=loop, high_watermark=4, low_watermark=1)
+        producer = MockProducer()
+        queue.add_producer(producer)
+
+        for n in range(3):
+            loop.run_until_complete(queue.put(n))
+
+        assert not producer.paused
+
+        loop.run_until_complete(queue.put(3))
+
+        assert producer.paused
+        assert queue.throttled
+
+        for n in range(2):
+            loop.run_until_complete(queue._get_single())
+
+        assert producer.paused
+
+        loop.run_until_complete(queue._get_single())
+
+        assert not producer.paused
+        assert not queue.throttled
+
+    def test_queue_watermarks_shared_producer(self):
+        loop = new_event_loop()
+        queues = [
+            AsyncQueue(1, loop=loop, high_watermark=2, low_watermark=0)
+            for n in range(2)
+        ]
+        producer = MockProducer()
+
+        for queue in queues:
+            queue.add_producer(producer)
+
+            for n in range(2):
+                loop.run_until_complete(queue.put(n))
+
+        assert producer.paused
+
+        for n in range(2):
+            loop.run_until_complete(queues[0]._get_single())
+
+        # The second queue still wants the producer paused.
+        assert not queues[0].throttled
+        assert producer.paused
+
+        for n in range(2):
+            loop.run_until_complete(queues[1]._get_single())
+
+        assert not producer.paused
+
+    def test_queue_invalid_watermarks(self):
+        with raises(ValueError):
+            AsyncQueue(loop=new_event_loop(), high_watermark=1,
+                       low_watermark=2)
+
+
+class MockProducer:
+    paused = False
+
+    async def pause(self):
+        self.paused = True
+
+    async def resume(self):
+        self.paused = False
+
+
+class TestQueueGetMany:
+    def test_get_many(self):
+        loop = new_event_loop()
+        queue = AsyncQueue(loop=loop)
+
+        for n in range(5):
+            loop.run_until_complete(queue.put(n))
+
+        assert loop.run_until_complete(queue.get_many(3)) == [0, 1, 2]
+        assert loop.run_until_complete(queue.get_many(3)) == [3, 4]
+
+    def test_get_many_timeout(self):
+        loop = new_event_loop()
+        queue = AsyncQueue(loop=loop)
+
+        assert loop.run_until_complete(queue.get_many(3, timeout=.01)) == []
+
+    def test_get_many_waits_for_first(self):
+        loop = new_event_loop()
+        queue = AsyncQueue(loop=loop)
+
+        async def put_later():
+            await sleep(.01, loop=loop)
+            await queue.put(1)
+
+        async def run():
+            results = await gather(queue.get_many(3), put_later(), loop=loop)
+
+            return results[0]
+
+        assert loop.run_until_complete(run()) == [1]
+
+    def test_async_for(self):
+        loop = new_event_loop()
+        queue = AsyncQueue(loop=loop)
+        results = []
+
+        async def run():
+            for n in range(3):
+                await queue.put(n)
+
+            async for data in queue:
+                results.append(data)
+
+                if len(results) == 3:
+                    queue.close()
+
+        loop.run_until_complete(run())
+
+        assert results == [0, 1, 2]
@@ -0,0 +1,230 @@
+"""Test shared memory ring buffer queue."""
+
+
+from asyncio import QueueEmpty, gather
+from illume.error import QueueClosed, QueueError
+from illume.queues.ring import RingBuffer, SharedMemoryQueue
+from illume.queues.ring import PooledSharedMemoryServerQueue
+from illume.test.base import IllumeTest
+from illume.util import get_temp_file_name, remove_or_ignore_file
+from multiprocessing import Process
+from pytest import raises
+
+
+def put_from_process(path, count):
+    ring = RingBuffer.open(path)
+    ring.claim()
+
+    for n in range(count):
+        while not ring.write(str(n).encode()):
+            pass
+
+    ring.close()
+
+
+def create_and_exit(path):
+    RingBuffer.create(path, 1, 64, "json")
+
+
+class TestRingBuffer(IllumeTest):
+    def test_write_and_read_wrap_around(self):
+        path = get_temp_file_name()
+        consumer = RingBuffer.create(path, 1, 64, "json")
+        producer = RingBuffer.open(path)
+        producer.claim()
+        written = []
+        read = []
+
+        for n in range(100):
+            payload = bytes([n]) * (n % producer.max_payload)
+
+            while not producer.write(payload):
+                read.append(consumer.read())
+
+            written.append(payload)
+
+        payload = consumer.read()
+
+        while payload is not None:
+            read.append(payload)
+            payload = consumer.read()
+
+        assert read == written
+
+        producer.close()
+        consumer.close()
+
+    def test_lane_size_alignment(self):
+        path = get_temp_file_name()
+
+        with raises(QueueError):
+            RingBuffer.create(path, 1, 100, "json")
+
+    def test_lanes_are_exclusive(self):
+        path = get_temp_file_name()
+        consumer = RingBuffer.create(path, 2, 64, "json")
+        producers = [RingBuffer.open(path) for n in range(3)]
+
+        assert producers[0].claim() == 0
+        assert producers[1].claim() == 1
+
+        with raises(QueueError):
+            producers[2].claim()
+
+        producers[0].close()
+
+        assert producers[2].claim() == 0
+
+        for ring in producers[1:] + [consumer]:
+            ring.close()
+
+    def test_producer_processes(self):
+        path = get_temp_file_name()
+        count = 1000
+        consumer = RingBuffer.create(path, 4, 1024, "json")
+        processes = [
+            Process(target=put_from_process, args=(path, count))
+            for n in range(2)
+        ]
+
+        for process in processes:
+            process.start()
+
+        results = []
+
+        while len(results) < count * 2:
+            payload = consumer.read()
+
+            if payload is not None:
+                results.append(int(payload))
+
+        for process in processes:
+            process.join()
+
+        assert sorted(results) == sorted(list(range(count)) * 2)
+
+        consumer.close()
+
+
+class TestSharedMemoryQueue(IllumeTest):
+    def test_put_and_get(self, loop):
+        path = get_temp_file_name()
+        consumer = SharedMemoryQueue(path, loop, lanes=2, lane_size=1024)
+        producer = SharedMemoryQueue(path, loop)
+        messages = [{"url": "http://a.com/{}".format(n)} for n in range(50)]
+
+        consumer.create()
+
+        async def consume():
+            results = []
+
+            while len(results) < len(messages):
+                results.extend(await consumer.get_many(len(messages)))
+
+            return results
+
+        async def run():
+            # The messages take more than a lane, so get while putting.
+            results = await gather(
+                producer.put_many(messages),
+                consume(),
+                loop=loop
+            )
+
+            return results[1]
+
+        assert loop.run_until_complete(run()) == messages
+
+        with raises(QueueEmpty):
+            consumer._get_buffered()
+
+        loop.run_until_complete(producer.stop())
+        loop.run_until_complete(consumer.stop())
+
+    def test_put_after_consumer_stopped(self, loop):
+        path = get_temp_file_name()
+        consumer = SharedMemoryQueue(path, loop, lanes=1, lane_size=64)
+        producer = SharedMemoryQueue(path, loop)
+
+        consumer.create()
+
+        async def run():
+            await producer.setup()
+
+            # Fill the lane, then stop the consumer.
+            while producer.ring.write(producer.encode(0)):
+                pass
+
+            await consumer.stop()
+            await producer.put(0)
+
+        with raises(QueueClosed):
+            loop.run_until_complete(run())
+
+        producer.close()
+
+    def test_put_after_consumer_died(self, loop):
+        path = get_temp_file_name()
+        process = Process(target=create_and_exit, args=(path,))
+        process.start()
+        process.join()
+
+        producer = SharedMemoryQueue(path, loop)
+
+        async def run():
+            for n in range(100):
+                await producer.put(n)
+
+        # The file is left behind, but nothing holds its lock.
+        with raises(QueueClosed):
+            loop.run_until_complete(run())
+
+        producer.close()
+        remove_or_ignore_file(path)
+
+    def test_put_too_large(self, loop):
+        path = get_temp_file_name()
+        consumer = SharedMemoryQueue(path, loop, lanes=1, lane_size=64)
+        producer = SharedMemoryQueue(path, loop)
+
+        consumer.create()
+
+        with raises(QueueError):
+            loop.run_until_complete(producer.put("x" * 64))
+
+        consumer.close()
+        producer.close()
+
+    def test_get_returns_none_once_stopped(self, loop):
+        path = get_temp_file_name()
+        consumer = SharedMemoryQueue(path, loop, lanes=1, lane_size=64)
+
+        consumer.create()
+        loop.call_later(0.05, consumer.stop_event.set)
+
+        assert loop.run_until_complete(consumer.get()) is None
+
+        consumer.close()
+
+    def test_pooled_server_run(self, loop):
+        path = get_temp_file_name()
+        results = []
+        server = PooledSharedMemoryServerQueue(path, loop)
+        client = server.get_client(loop)
+
+        class MockPooledActor:
+            async def on_message(self, message):
+                results.append(message)
+
+                if len(results) == 3:
+                    await server.stop()
+
+        server.set_pooled_actor(MockPooledActor())
+        server.queue.create()
+
+        loop.run_until_complete(client.put_many([1, 2, 3]))
+        loop.run_until_complete(server.run())
+
+        assert results == [1, 2, 3]
+
+        client.close()
@@ -0,0 +1,66 @@
+"""Test Scalable Bloom Filter."""
+
+
+from illume.filter.scalable import ScalableBloomFilter
+
+
+class TestScalableBloomFilter:
+    def test_grow(self):
+        """Assert filters are appended instead of overflowing."""
+        p = .01
+        bloom_filter = ScalableBloomFilter(100, p, 2, .5)
+        items = [str(i) for i in range(2000)]
+
+        for item in items:
+            bloom_filter.add(item)
+
+        assert len(bloom_filter.filters) > 1
+        assert bloom_filter.n == len(bloom_filter) <= len(items)
+        # False positives are skipped as already present.
+        assert bloom_filter.n > len(items) * (1 - 2 * p)
+        assert all(item in bloom_filter for item in items)
+
+        for n, sub_filter in enumerate(bloom_filter.filters):
+            assert sub_filter.max_n == 100 * 2 ** n
+            assert sub_filter.p == p * .5 ** (n + 1)
+
+        assert bloom_filter.current_p_float <= p
+
+    def test_error_rate(self):
+        """Assert the measured compound error rate stays below p."""
+        p = .01
+        bloom_filter = ScalableBloomFilter(1000, p)
+        bloom_filter.add_many(str(i) for i in range(50000))
+        others = [str(i) for i in range(50000, 150000)]
+        false_positives = sum(bloom_filter.contains_many(others))
+
+        assert len(bloom_filter.filters) > 3
+        assert false_positives / len(others) < p
+
+    def test_add_many_and_contains_many(self):
+        """Assert batch operations match single item operations."""
+        single = ScalableBloomFilter(100, .01)
+        batch = ScalableBloomFilter(100, .01)
+        items = [str(i) for i in range(1000)]
+        others = [str(i) for i in range(1000, 3000)]
+
+        for item in items:
+            single.add(item)
+
+        batch.add_many(items[:500])
+        batch.add_many(items)
+
+        assert len(batch.filters) == len(single.filters)
+        assert batch.contains_many(items) == [True] * len(items)
+        assert batch.contains_many(others) == [o in batch for o in others]
+        assert batch.contains_many([]) == []
+
+    def test_skip_present(self):
+        """Assert items already present don't use capacity."""
+        bloom_filter = ScalableBloomFilter(10, .01)
+
+        for _ in range(100):
+            bloom_filter.add("http://example.com")
+
+        assert bloom_filter.n == 1
+        assert len(bloom_filter.filters) == 1
@@ -0,0 +1,99 @@
+"""Test Shared Bloom Filter."""
+
+
+from illume.error import BloomFilterError
+from illume.filter.bloom import BloomFilter
+from illume.filter.shared import SharedBloomFilter
+from illume.util import get_temp_file_name
+from multiprocessing import Process
+from pytest import raises
+
+
+def add_items(path, items):
+    bloom_filter = SharedBloomFilter(path, 100000, .01)
+    bloom_filter.wait_ready(timeout=10)
+    bloom_filter.add_many(items)
+
+    for item in items:
+        bloom_filter.add(item)
+
+    bloom_filter.close()
+
+
+class TestSharedBloomFilter:
+    def setup_method(self, method):
+        self.path = get_temp_file_name()
+        self.filters = []
+
+    def teardown_method(self, method):
+        for bloom_filter in self.filters:
+            bloom_filter.close()
+            bloom_filter.unlink()
+
+    def open_filter(self, *args):
+        bloom_filter = SharedBloomFilter(self.path, *args)
+        self.filters.append(bloom_filter)
+
+        return bloom_filter
+
+    def test_create_and_open(self):
+        """Assert processes opening a filter share its bits and n."""
+        first = self.open_filter(10000, .01)
+        second = self.open_filter(10000, .01)
+
+        assert first.created
+        assert not second.created
+        assert not second.ready
+
+        first.add("http://example.com")
+        first.set_ready()
+        second.wait_ready(timeout=1)
+
+        assert "http://example.com" in second
+        assert second.n == first.n == 1
+
+        second.add("http://example.com")
+
+        assert second.n == 1
+
+        with raises(BloomFilterError):
+            SharedBloomFilter(self.path, 20000, .01)
+
+    def test_processes(self):
+        """Assert items added by several processes are all found."""
+        bloom_filter = self.open_filter(100000, .01)
+        groups = [
+            ["{}-{}".format(n, i) for i in range(5000)]
+            for n in range(4)
+        ]
+        bloom_filter.set_ready()
+        workers = [
+            Process(target=add_items, args=(self.path, items))
+            for items in groups
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        items = [item for items in groups for item in items]
+
+        assert bloom_filter.contains_many(items) == [True] * len(items)
+        assert len(items) * .98 < bloom_filter.n <= len(items)
+
+    def test_load(self):
+        """Assert the bits of a BloomFilter can be copied in."""
+        bloom_filter = BloomFilter(10000, .01)
+        items = [str(i) for i in range(1000)]
+        bloom_filter.add_many(items)
+        shared = self.open_filter(10000, .01)
+        shared.load(bloom_filter)
+
+        assert shared.n == bloom_filter.n
+        assert shared.bit_array.tobytes() == bloom_filter.bit_array.tobytes()
+        assert shared.contains_many(items) == [True] * len(items)
+
+        with raises(BloomFilterError):
+            shared.load(BloomFilter(20000, .01))
@@ -0,0 +1,158 @@
+"""Test disk spilling queue."""
+
+
+from asyncio import QueueEmpty
+from illume.queues.spill import OFFSET_RECORD, SpillQueue
+from illume.test.base import IllumeTest
+from illume.util import get_temp_file_name, remove_or_ignore_dir
+from illume.util import remove_or_ignore_file
+from pytest import fixture, raises
+
+
+def drain(queue):
+    results = []
+
+    while True:
+        try:
+            results.append(queue.get_nowait())
+        except QueueEmpty:
+            return results
+
+
+class TestSpillQueue(IllumeTest):
+    @fixture
+    def directory(self):
+        path = get_temp_file_name("spill-")
+
+        yield path
+
+        remove_or_ignore_dir(path)
+
+    def get_queue(self, directory, loop):
+        return SpillQueue(
+            directory,
+            memory_size=4,
+            buckets=3,
+            segment_size=128,
+            commit_interval=5,
+            loop=loop
+        )
+
+    def put_many(self, queue, loop, count, domains=5):
+        for n in range(count):
+            message = {"domain": "d{}.com".format(n % domains), "n": n}
+            loop.run_until_complete(queue.put(message))
+
+    def test_spill_and_refill(self, directory, loop):
+        count = 50
+        queue = self.get_queue(directory, loop)
+
+        self.put_many(queue, loop, count)
+
+        assert len(queue.head) == queue.memory_size
+        assert queue.qsize() == count
+
+        results = drain(queue)
+
+        assert sorted(r['n'] for r in results) == list(range(count))
+        # Messages held in memory come out first.
+        assert [r['n'] for r in results[:4]] == [0, 1, 2, 3]
+
+    def test_refill_mixes_domains(self, directory, loop):
+        queue = self.get_queue(directory, loop)
+
+        self.put_many(queue, loop, 4, domains=1)
+        self.put_many(queue, loop, 30, domains=3)
+
+        for n in range(4):
+            queue.get_nowait()
+
+        refilled = [queue.get_nowait()['domain'] for n in range(2)]
+
+        assert len(set(refilled)) == 2
+
+    def test_survives_restart(self, directory, loop):
+        count = 40
+        queue = self.get_queue(directory, loop)
+
+        self.put_many(queue, loop, count)
+        first = [queue.get_nowait()['n'] for n in range(10)]
+        queue.close()
+
+        queue = self.get_queue(directory, loop)
+        rest = [r['n'] for r in drain(queue)]
+
+        # Spilled messages that were not handed out are read again.
+        assert set(range(4, count)) <= set(rest) | set(first)
+
+    def test_get_waits_for_put(self, directory, loop):
+        queue = self.get_queue(directory, loop)
+
+        async def run():
+            await queue.put({"domain": "a.com"})
+
+            return await queue.get()
+
+        assert loop.run_until_complete(run()) == {"domain": "a.com"}
+
+        with raises(QueueEmpty):
+            queue.get_nowait()
+
+    def test_qsize_after_restart(self, directory, loop):
+        queue = self.get_queue(directory, loop)
+
+        self.put_many(queue, loop, 40)
+
+        for n in range(10):
+            queue.get_nowait()
+
+        queue.close()
+
+        queue = self.get_queue(directory, loop)
+        size = queue.qsize()
+
+        assert size > 0
+        assert size == len(drain(queue))
+
+    def test_truncated_record(self, directory, loop):
+        queue = self.get_queue(directory, loop)
+
+        self.put_many(queue, loop, 10, domains=1)
+        bucket = next(b for b in queue.buckets if b.segments)
+        path = bucket.segment_path(bucket.segments[-1])
+        queue.close()
+
+        # A crash cut the last record short.
+        with open(path, "ab") as f:
+            f.write(b'\x00\x00\x01\x00{"dom')
+
+        queue = self.get_queue(directory, loop)
+
+        assert queue.qsize() == 6
+        assert [r['n'] for r in drain(queue)] == list(range(4, 10))
+
+        self.put_many(queue, loop, 1, domains=1)
+
+        assert drain(queue) == [{"domain": "d0.com", "n": 0}]
+
+    def test_deleted_segment(self, directory, loop):
+        queue = self.get_queue(directory, loop)
+
+        self.put_many(queue, loop, 40, domains=1)
+        bucket = next(b for b in queue.buckets if b.segments)
+        second = bucket.segments[1]
+        queue.close()
+
+        # Reading stopped in a segment that is gone since.
+        with open(bucket.offset_path, "wb") as f:
+            f.write(OFFSET_RECORD.pack(second, 5))
+
+        remove_or_ignore_file(bucket.segment_path(second))
+        queue = self.get_queue(directory, loop)
+        results = drain(queue)
+
+        numbers = [r['n'] for r in results]
+
+        # Reading resumes at the start of the next segment.
+        assert numbers[0] > 4
+        assert numbers == list(range(numbers[0], 40))
@@ -0,0 +1,85 @@
+"""Test task helpers."""
+
+
+from asyncio import Event, TimeoutError, ensure_future, sleep
+from illume.task import StopWatcher, close_stop_watcher, dies_on_stop_event
+from illume.task import timeout
+from illume.test.base import IllumeTest
+from pytest import raises
+
+
+class Stoppable:
+    def __init__(self, loop):
+        self.loop = loop
+        self.stop_event = Event(loop=loop)
+
+    @dies_on_stop_event
+    async def wait_forever(self):
+        await sleep(10, loop=self.loop)
+
+        return True
+
+    @dies_on_stop_event
+    async def nested(self):
+        await self.wait_forever()
+
+        return True
+
+    @dies_on_stop_event
+    async def quick(self):
+        return True
+
+
+class TestStopWatcher(IllumeTest):
+    def test_returns_result(self, loop):
+        obj = Stoppable(loop)
+
+        assert loop.run_until_complete(obj.quick())
+
+    def test_stop_cancels_pending(self, loop):
+        obj = Stoppable(loop)
+
+        async def run():
+            task = ensure_future(obj.nested(), loop=loop)
+            await sleep(.01, loop=loop)
+            obj.stop_event.set()
+
+            return await task
+
+        assert loop.run_until_complete(run()) is None
+        assert len(obj._stop_watcher.pending) == 0
+
+    def test_close(self, loop):
+        obj = Stoppable(loop)
+
+        async def run():
+            task = ensure_future(obj.wait_forever(), loop=loop)
+            await sleep(.01, loop=loop)
+            watcher = obj._stop_watcher.watcher
+            obj.stop_event.set()
+            await close_stop_watcher(obj)
+
+            assert watcher.done()
+            assert obj._stop_watcher.watcher is None
+
+            return await task
+
+        assert loop.run_until_complete(run()) is None
+
+    def test_run_after_stop(self, loop):
+        stop_event = Event(loop=loop)
+        watcher = StopWatcher(stop_event, loop)
+        stop_event.set()
+
+        assert loop.run_until_complete(watcher.run(sleep(10))) is None
+
+
+class TestTimeout(IllumeTest):
+    def test_timeout(self, loop):
+        with raises(TimeoutError):
+            loop.run_until_complete(timeout(sleep(10), .01, loop))
+
+    def test_no_timeout(self, loop):
+        coro = sleep(.01, result=True, loop=loop)
+
+        assert loop.run_until_complete(timeout(coro, 1, loop))
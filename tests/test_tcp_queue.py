@@ -0,0 +1,156 @@
+"""Test TCP socket queues."""
+
+
+from asyncio import StreamReader, StreamWriter, new_event_loop
+from illume.actor import Actor
+from illume.queues.codec import HANDSHAKE_KEY, JSONCodec, MarshalCodec
+from illume.queues.pool import PooledActor
+from illume.queues.tcp import PooledTCPServerQueue, TCPClient, parse_address
+from illume.test.base import IllumeTest
+from multiprocessing import Process
+from pytest import raises
+from queue import Queue
+from socket import create_connection, socket
+from threading import Thread
+from time import monotonic, sleep
+
+
+def get_free_address():
+    with socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+
+        return "127.0.0.1:{}".format(sock.getsockname()[1])
+
+
+def wait_for_server(address, seconds=5):
+    host, port = parse_address(address)
+    deadline = monotonic() + seconds
+
+    while True:
+        try:
+            create_connection((host, port)).close()
+        except ConnectionRefusedError:
+            if monotonic() > deadline:
+                raise
+
+            sleep(.01)
+        else:
+            return
+
+
+def put_from_process(address, messages):
+    loop = new_event_loop()
+    client = TCPClient(address, loop)
+    client.compression = True
+
+    async def run():
+        await client.put_many(messages)
+        await client.stop()
+
+    loop.run_until_complete(run())
+
+
+class TestTCPClient(IllumeTest):
+    def test_parse_address(self):
+        assert parse_address("127.0.0.1:8000") == ("127.0.0.1", 8000)
+        assert parse_address(":8000") == (None, 8000)
+
+    def test_offered_codecs(self, loop):
+        client = TCPClient("127.0.0.1:8000", loop)
+
+        client.compression = False
+        assert client.offered_codecs() == [JSONCodec.name]
+
+        client.compression = True
+        assert client.offered_codecs()[0] == "zlib+json"
+
+    def test_connect_retries(self, loop):
+        client = TCPClient(get_free_address(), loop, connect_retries=2)
+        client.retry_delay = .01
+
+        with raises(ConnectionError):
+            loop.run_until_complete(client.start())
+
+    def test_get_client(self, loop):
+        server = PooledTCPServerQueue("127.0.0.1:8000", new_event_loop())
+        client = server.get_client(loop)
+
+        assert isinstance(client, TCPClient)
+        assert client.path == server.path
+
+
+class TestPooledTCPServerQueue(IllumeTest):
+    def test_refuses_marshal(self, loop):
+        written = []
+        reader = StreamReader(loop=loop)
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+        server = PooledTCPServerQueue("127.0.0.1:8000", loop)
+        conn = server.get_connection(reader, writer)
+        offer = {HANDSHAKE_KEY: [MarshalCodec.name, "zlib+marshal"]}
+
+        reader.feed_data(conn.encode(offer) + b'\n')
+        loop.run_until_complete(conn.accept_codec())
+
+        reply = conn.decode(b''.join(written).rstrip(b'\n'))
+
+        # Network bytes are never handed to marshal.loads.
+        assert reply[HANDSHAKE_KEY] == JSONCodec.name
+        assert conn.codec.name == JSONCodec.name
+
+
+class TestTCPInteraction(IllumeTest):
+    def test_clients_in_processes(self):
+        count = 50
+        address = get_free_address()
+        received = Queue()
+        server_loop = new_event_loop()
+        pooled_queue = PooledTCPServerQueue(address, server_loop)
+
+        class TestServerActor(Actor):
+            async def on_message(self, message):
+                received.put(message["id"])
+
+        def run_server():
+            pooled_actor = PooledActor(TestServerActor, pooled_queue,
+                                       server_loop)
+
+            pooled_actor.start(outbox="outbox")
+
+        server = Thread(target=run_server, daemon=True)
+        server.start()
+        wait_for_server(address)
+
+        processes = [
+            Process(target=put_from_process, args=(
+                address,
+                [{"id": n} for n in range(count)]
+            ))
+            for n in range(2)
+        ]
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join()
+
+        assert [process.exitcode for process in processes] == [0, 0]
+
+        results = [received.get(timeout=5) for n in range(count * 2)]
+
+        assert sorted(results) == sorted(list(range(count)) * 2)
+        assert received.empty()
+
+        # Every client closed its connection, the server forgets them all.
+        deadline = monotonic() + 5
+
+        while pooled_queue.clients and monotonic() < deadline:
+            sleep(.01)
+
+        assert not pooled_queue.clients
+
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        server.join(5)
+
+        assert not server.is_alive()
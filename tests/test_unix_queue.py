@@ -1,5 +1,8 @@
 from asyncio import StreamReader, StreamWriter, gather, new_event_loop
+from asyncio import sleep as async_sleep, start_unix_server, wait_for
 from illume.actor import Actor
+from illume.error import QueueError
+from illume.queues.codec import ACK_KEY, HANDSHAKE_KEY, MarshalCodec
 from illume.queues.pool import PooledActor, PooledQueue
 from illume.queues.unix import UnixSocket, UnixSocketServerConnection
 from illume.queues.unix import PooledUnixSocketServerQueue, UnixSocketClient
@@ -7,12 +10,18 @@ from illume.test.assertions import dict_equals, check_queue, check_queue_multi
 from illume.test.actor import mock_actor
 from illume.test.base import IllumeTest
 from illume.util import get_temp_file_name
+from os.path import exists
 from pytest import raises
 from queue import Queue
 from threading import Thread
 from time import sleep
 
 
+class MockPooledActor:
+    async def on_message(self, message):
+        pass
+
+
 class TestUnixSocket(IllumeTest):
     def test_init(self, loop):
         path = "path"
@@ -73,9 +82,7 @@ class TestUnixSocket(IllumeTest):
 
         def write(data):
             called_write.put(True)
-
-            if data != b'\n':
-                result_queue.put(unix_socket.decode(data))
+            result_queue.put(unix_socket.decode(data))
 
         def write_eof():
             called_write_eof.put(True)
@@ -86,11 +93,136 @@ class TestUnixSocket(IllumeTest):
         async def run():
             unix_socket.ready.set()
             await unix_socket.put(result)
+            await async_sleep(0, loop=loop)
 
         loop.run_until_complete(run())
-        check_queue_multi(called_write, [True] * 2)
+        check_queue(called_write, True)
         check_queue(result_queue, result)
 
+    def test_put_many_coalesces_writes(self, loop):
+        written = []
+        reader = StreamReader(loop=loop)
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+        unix_socket = UnixSocket(None, loop)
+        unix_socket.reader = reader
+        unix_socket.writer = writer
+
+        async def run():
+            unix_socket.ready.set()
+            await unix_socket.put(1)
+            await unix_socket.put_many([2, 3])
+
+            # Nothing is written before the next loop tick.
+            assert not written
+
+            await async_sleep(0, loop=loop)
+
+            assert len(written) == 1
+
+            reader.feed_data(written[0])
+            reader.feed_eof()
+
+            return [await unix_socket.get() for n in range(3)]
+
+        assert loop.run_until_complete(run()) == [1, 2, 3]
+
+    def test_put_flushes_at_threshold(self, loop):
+        written = []
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+        unix_socket = UnixSocket(None, loop)
+        unix_socket.writer = writer
+        unix_socket.flush_bytes = 1
+
+        async def run():
+            unix_socket.ready.set()
+            await unix_socket.put(1)
+
+            assert written == [b'1\n']
+
+        loop.run_until_complete(run())
+
+    def test_framed_put_and_get(self, loop):
+        result = {"urls": [{"url": "http://example.com"}]}
+        written = []
+        reader = StreamReader(loop=loop)
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+        unix_socket = UnixSocket(None, loop)
+        unix_socket.reader = reader
+        unix_socket.writer = writer
+        unix_socket.use_codec(MarshalCodec.name)
+
+        async def run():
+            unix_socket.ready.set()
+            await unix_socket.put(result)
+            await async_sleep(0, loop=loop)
+
+            # A single write carries header and payload.
+            assert len(written) == 1
+
+            reader.feed_data(written[0])
+            reader.feed_eof()
+
+            return await unix_socket.get()
+
+        assert loop.run_until_complete(run()) == result
+
+    def test_acks_are_separate_frames(self, loop):
+        acknowledged = []
+        written = []
+        reader = StreamReader(loop=loop)
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+
+        class TestUnixSocket(UnixSocket):
+            async def on_acknowledge(self, count):
+                acknowledged.append(count)
+
+        unix_socket = TestUnixSocket(None, loop)
+        unix_socket.reader = reader
+        unix_socket.writer = writer
+        unix_socket.use_codec(MarshalCodec.name)
+
+        async def run():
+            unix_socket.ready.set()
+            unix_socket.buffer_ack(3)
+            # A payload using the handshake key is still a message.
+            await unix_socket.put({ACK_KEY: 2})
+            await async_sleep(0, loop=loop)
+
+            reader.feed_data(b''.join(written))
+            reader.feed_eof()
+
+            return await unix_socket.get()
+
+        assert loop.run_until_complete(run()) == {ACK_KEY: 2}
+        assert acknowledged == [3]
+
+    def test_get_many_takes_buffered_frames(self, loop):
+        written = []
+        reader = StreamReader(loop=loop)
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+        unix_socket = UnixSocket(None, loop)
+        unix_socket.reader = reader
+        unix_socket.writer = writer
+        unix_socket.use_codec(MarshalCodec.name)
+
+        async def run():
+            unix_socket.ready.set()
+            await unix_socket.put_many([0, 1, 2])
+            await async_sleep(0, loop=loop)
+
+            # The last frame is incomplete, get_many must not wait for it.
+            data = b''.join(written)
+            reader.feed_data(data[:-1])
+
+            return await unix_socket.get_many(5)
+
+        assert loop.run_until_complete(run()) == [0, 1]
+
     def test_start_and_stop(self, loop):
         called_run = Queue()
         called_on_stop = Queue()
@@ -199,6 +331,39 @@ class TestUnixSocketServerConnection(IllumeTest):
 
         assert len(server.clients) == 0
 
+    def test_handshake_reply_comes_first(self, loop):
+        written = []
+        reader = StreamReader(loop=loop)
+        writer = StreamWriter(None, None, None, None)
+        writer.write = written.append
+        server = PooledUnixSocketServerQueue(None, loop)
+        conn = server.get_connection(reader, writer)
+        offer = {HANDSHAKE_KEY: [MarshalCodec.name]}
+
+        async def run():
+            reader.feed_data(conn.encode(offer) + b'\n')
+            await conn.accept_codec()
+
+            # Not ready nor registered, puts can't go out unframed.
+            assert not conn.ready.is_set()
+            assert conn not in server.clients
+
+            conn.ready.set()
+            await conn.put("message")
+            await async_sleep(0, loop=loop)
+
+        loop.run_until_complete(run())
+
+        reply, frames = b''.join(written).split(b'\n', 1)
+        client = UnixSocket(None, loop)
+
+        assert client.decode(reply)[HANDSHAKE_KEY] == MarshalCodec.name
+
+        client.use_codec(MarshalCodec.name)
+        client.read_buffer += frames
+
+        assert client._pop_frame()[1] == client.encode("message")
+
     def test_start(self, loop):
         result_queue = Queue()
         pooled_queue = PooledQueue()
@@ -213,6 +378,9 @@ class TestUnixSocketServerConnection(IllumeTest):
                 await conn.stop()
 
         class TestConnection(UnixSocketServerConnection):
+            async def accept_codec(self):
+                pass
+
             async def get(self):
                 result_queue.put("get")
                 return (result, self)
@@ -269,6 +437,15 @@ class TestPooledUnixSocketServerQueue(IllumeTest):
         client_thread = Thread(target=run_client, daemon=True)
 
         server_thread.start()
+
+        # The client gives up after three attempts, start it once the
+        # server created its socket.
+        for n in range(100):
+            if exists(path):
+                break
+
+            sleep(.01)
+
         client_thread.start()
         check_queue(result_queue, "on_connect")
         server_loop.stop()
@@ -353,8 +530,179 @@ class TestPooledUnixSocketServerQueue(IllumeTest):
         assert client.loop == loop
         assert client.loop != server_loop
 
+    def test_invalid_dispatch_policy(self, loop):
+        with raises(QueueError):
+            PooledUnixSocketServerQueue(None, loop, "random")
+
+    def test_round_robin_dispatch(self, loop):
+        class MockClient:
+            def __init__(self):
+                self.received = []
+
+            async def put(self, data):
+                self.received.append(data)
+
+        server = PooledUnixSocketServerQueue(None, loop, "round-robin")
+        server.clients = [MockClient() for n in range(3)]
+
+        for n in range(6):
+            loop.run_until_complete(server.put(n))
+
+        assert [c.received for c in server.clients] == [[0, 3], [1, 4], [2, 5]]
+
+    def test_least_outstanding_dispatch(self, loop):
+        class MockClient:
+            def __init__(self):
+                self.received = []
+
+            async def put(self, data):
+                self.received.append(data)
+
+        server = PooledUnixSocketServerQueue(None, loop, "least-outstanding")
+        busy, idle = server.clients = [MockClient(), MockClient()]
+
+        for n in range(4):
+            loop.run_until_complete(server.put(n))
+
+        # Only the idle client acknowledges, so it gets the next messages.
+        loop.run_until_complete(server.acknowledge(idle, 2))
+
+        for n in range(4, 6):
+            loop.run_until_complete(server.put(n))
+
+        assert busy.received == [0, 2]
+        assert idle.received == [1, 3, 4, 5]
+        assert server.in_flight[busy] == 2
+
+    def test_work_stealing_dispatch(self, loop):
+        class MockClient:
+            def __init__(self):
+                self.received = []
+
+            async def put(self, data):
+                self.received.append(data)
+
+        server = PooledUnixSocketServerQueue(None, loop, "work-stealing")
+        server.prefetch = 2
+        first, second = server.clients = [MockClient(), MockClient()]
+
+        for n in range(6):
+            loop.run_until_complete(server.put(n))
+
+        # Each client holds its prefetch, the rest waits in the backlog.
+        assert len(first.received) + len(second.received) == 4
+        assert list(server.backlog) == [4, 5]
+
+        loop.run_until_complete(server.acknowledge(second, 2))
+
+        assert len(second.received) == 4
+        assert not server.backlog
+
+    def test_backlog_without_clients(self, loop):
+        path = get_temp_file_name()
+        server = PooledUnixSocketServerQueue(path, loop, "round-robin")
+        server.set_pooled_actor(MockPooledActor())
+        client = UnixSocketClient(path, loop)
+
+        async def run():
+            listener = await start_unix_server(server.on_connect, path=path,
+                                               loop=loop)
+            await server.put_many([0, 1, 2])
+
+            assert list(server.backlog) == [0, 1, 2]
+
+            # The backlog goes out once the client finished the handshake.
+            results = []
+
+            for n in range(3):
+                results.append(await wait_for(client.get(), 1, loop=loop))
+
+            await client.stop()
+            client.writer.close()
+            listener.close()
+            await server.stop()
+
+            return results
+
+        assert loop.run_until_complete(run()) == [0, 1, 2]
+        assert not server.backlog
+
+    def test_requeue_on_disconnect(self, loop):
+        class MockClient:
+            def __init__(self):
+                self.received = []
+
+            async def put(self, data):
+                self.received.append(data)
+
+        server = PooledUnixSocketServerQueue(None, loop, "least-outstanding")
+        first, second = server.clients = [MockClient(), MockClient()]
+
+        for n in range(4):
+            loop.run_until_complete(server.put(n))
+
+        loop.run_until_complete(server.acknowledge(first, 1))
+        loop.run_until_complete(server.remove_client(first))
+
+        # The message the first client did not finish goes to the second.
+        assert first.received == [0, 2]
+        assert second.received == [1, 3, 2]
+        assert server.in_flight[second] == 3
+        assert not server.backlog
+
 
 class TestSocketInteraction(IllumeTest):
+    def test_acknowledge_and_requeue(self, loop):
+        path = get_temp_file_name()
+        server = PooledUnixSocketServerQueue(path, loop, "least-outstanding")
+        server.set_pooled_actor(MockPooledActor())
+        first = UnixSocketClient(path, loop)
+        second = UnixSocketClient(path, loop)
+
+        async def wait_until(condition):
+            for n in range(100):
+                if condition():
+                    return
+
+                await async_sleep(.01, loop=loop)
+
+        async def get(client):
+            return await wait_for(client.get(), 1, loop=loop)
+
+        async def run():
+            listener = await start_unix_server(server.on_connect, path=path,
+                                               loop=loop)
+
+            # Connect one at a time, so the first gets the first message.
+            await first.setup()
+            await wait_until(lambda: len(server.clients) == 1)
+            await second.setup()
+            await wait_until(lambda: len(server.clients) == 2)
+            await server.put_many([0, 1, 2, 3])
+
+            # The first client dies before acknowledging what it got.
+            assert await get(first) == 0
+            first.writer.close()
+
+            received = [await get(second) for n in range(4)]
+            await wait_until(lambda: len(server.clients) == 1)
+            busy = server.clients[0]
+            # Three messages are acknowledged by the gets that followed.
+            await wait_until(lambda: server.in_flight[busy] == 1)
+            in_flight = server.in_flight[busy]
+
+            await second.stop()
+            second.writer.close()
+            listener.close()
+            await server.stop()
+
+            return received, in_flight
+
+        received, in_flight = loop.run_until_complete(run())
+
+        assert received == [1, 3, 0, 2]
+        assert in_flight == 1
+
     def test_server_client_messaging(self):
         # setup
         count = 100
@@ -395,6 +743,7 @@ class TestSocketInteraction(IllumeTest):
                 client = UnixSocketClient(path, client_loop)
                 actor = TestClientActor(None, client, client_loop)
                 await actor.start()
+                await client.stop()
 
         # start server
         server_thread = Thread(target=run_server, daemon=True)
@@ -408,6 +757,52 @@ class TestSocketInteraction(IllumeTest):
         check_queue_multi(sent_message, [sent] * count)
         check_queue_multi(recv_message, [result] * count)
 
+    def test_sequential_clients(self):
+        # A connection closed by its client must not keep the server busy.
+        path = get_temp_file_name()
+        received = Queue()
+        server_loop = new_event_loop()
+        pooled_queue = PooledUnixSocketServerQueue(path, server_loop)
+
+        class TestServerActor(Actor):
+            async def on_message(self, message):
+                received.put(message)
+
+        def run_server():
+            pooled_actor = PooledActor(TestServerActor, pooled_queue,
+                                       server_loop)
+
+            pooled_actor.start(outbox="outbox")
+
+        async def run_client(message):
+            client = UnixSocketClient(path, client_loop)
+            await client.put(message)
+            await client.stop()
+            client.writer.close()
+
+        server_thread = Thread(target=run_server, daemon=True)
+        server_thread.start()
+        client_loop = new_event_loop()
+
+        for n in range(2):
+            client_loop.run_until_complete(run_client(n))
+            check_queue(received, n)
+
+        # Both connections are dropped once their clients closed them.
+        for n in range(100):
+            if not pooled_queue.clients:
+                break
+
+            sleep(.01)
+
+        assert not pooled_queue.clients
+
+        client_loop.close()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        server_thread.join(timeout=1)
+
+        assert not server_thread.is_alive()
+
     def test_kill_get_after_set_stop_event(self):
         pass
 
@@ -0,0 +1,61 @@
+"""Test columnar URL batch messages."""
+
+
+from illume.queues.codec import CODECS
+from illume.url_batch import URL_BATCH_KEY, URLBatch, count_urls
+from illume.url_batch import get_url_batch, iter_url_maps
+
+
+URL_MAPS = [
+    {"url": "http://a.com/1", "domain": "a.com"},
+    {"url": "http://b.com/", "domain": "b.com"},
+    {"url": "http://a.com/2", "domain": "a.com"},
+]
+
+
+class TestURLBatch:
+    def test_domains_are_deduplicated(self):
+        batch = URLBatch.from_url_maps(URL_MAPS)
+
+        assert batch.domains == ["a.com", "b.com"]
+        assert batch.domain_ids == [0, 1, 0]
+        assert batch.url_domains() == ["a.com", "b.com", "a.com"]
+        assert len(batch) == 3
+
+    def test_round_trip(self):
+        batch = URLBatch.from_url_maps(URL_MAPS)
+
+        for Codec in CODECS.values():
+            codec = Codec()
+            data = codec.decode(codec.encode(batch.serialize()))
+            loaded = URLBatch.deserialize(data)
+
+            assert list(loaded) == [(u["url"], u["domain"]) for u in URL_MAPS]
+
+    def test_empty_batch(self):
+        batch = URLBatch.deserialize(URLBatch().serialize())
+
+        assert len(batch) == 0
+        assert list(batch) == []
+
+    def test_add_after_deserialize(self):
+        data = URLBatch.from_url_maps(URL_MAPS).serialize()
+        batch = URLBatch.deserialize(data)
+        batch.add("http://b.com/2", "b.com")
+
+        assert batch.domain_ids[-1] == 1
+
+    def test_message_helpers(self):
+        columnar = {
+            URL_BATCH_KEY: URLBatch.from_url_maps(URL_MAPS).serialize()
+        }
+        legacy = {"urls": URL_MAPS}
+
+        for message in (columnar, legacy):
+            assert count_urls(message) == 3
+            assert list(iter_url_maps(message)) == URL_MAPS
+            assert list(get_url_batch(message)) == list(
+                URLBatch.from_url_maps(URL_MAPS)
+            )
+
+        assert count_urls({}) == 0
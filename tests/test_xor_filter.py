@@ -0,0 +1,86 @@
+"""Test Xor Filter."""
+
+
+from illume.error import BloomFilterError
+from illume.filter.backends import create_filter
+from illume.filter.cuckoo import CuckooFilter
+from illume.filter.xor import FrozenFilter, XorFilter, build_xor_filter
+from pytest import raises
+
+
+class TestXorFilter:
+    def test_build(self):
+        """Assert built filters hold their items and duplicates once."""
+        p = .01
+        items = [str(i) for i in range(20000)]
+        others = [str(i) for i in range(20000, 60000)]
+        xor_filter = build_xor_filter(items + items[:100], p)
+
+        assert xor_filter.n == len(items)
+        assert all(item in xor_filter for item in items[:1000])
+        assert xor_filter.contains_many(items) == [True] * len(items)
+        assert sum(xor_filter.contains_many(others)) / len(others) < p
+        assert xor_filter.bits_per_key < 9
+
+    def test_empty(self):
+        """Assert empty filters can be built."""
+        xor_filter = build_xor_filter([], .01)
+
+        assert xor_filter.n == 0
+        assert sum(xor_filter.contains_many(str(i) for i in range(1000))) < 30
+
+    def test_static(self):
+        """Assert items can't be added."""
+        xor_filter = build_xor_filter(["a", "b"], .01)
+
+        with raises(BloomFilterError):
+            xor_filter.add("c")
+
+        with raises(BloomFilterError):
+            xor_filter.add_many(["c"])
+
+    def test_table(self):
+        """Assert filters can be created from an existing table."""
+        items = [str(i) for i in range(1000)]
+        xor_filter = build_xor_filter(items, .001)
+        copy = XorFilter(
+            xor_filter.n,
+            xor_filter.p,
+            seed=xor_filter.seed,
+            table=bytearray(xor_filter.table)
+        )
+
+        assert copy.contains_many(items) == [True] * len(items)
+
+
+class TestFrozenFilter:
+    def test_frozen_and_delta(self):
+        """Assert items are found in either filter."""
+        items = [str(i) for i in range(2000)]
+        frozen_filter = FrozenFilter(
+            build_xor_filter(items[:1000], .005),
+            CuckooFilter(1000, .005)
+        )
+        frozen_filter.add_many(items[1000:1500])
+
+        for item in items[1500:]:
+            frozen_filter.add(item)
+
+        assert frozen_filter.n == len(items)
+        assert frozen_filter.max_n == 2000
+        assert frozen_filter.p == .01
+        assert frozen_filter.full
+        assert all(item in frozen_filter for item in items)
+        assert frozen_filter.contains_many(items) == [True] * len(items)
+
+    def test_backend(self):
+        """Assert the xor backend creates an empty frozen filter."""
+        frozen_filter = create_filter("xor", 10000, .01)
+
+        assert isinstance(frozen_filter, FrozenFilter)
+        assert frozen_filter.frozen.n == 0
+        assert frozen_filter.delta.max_n == 1000
+        assert frozen_filter.p == .01
+
+        with raises(BloomFilterError):
+            create_filter("unknown", 10000, .01)